@@ -20,10 +20,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # See https://docs.djangoproject.com/en/2.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "hvow!r-ye3839e78n85zelgbral&ly_rrcvyr74-l5l)gz&18)"
+SECRET_KEY = os.environ.get(
+    "APSI_SECRET_KEY", "hvow!r-ye3839e78n85zelgbral&ly_rrcvyr74-l5l)gz&18)"
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("APSI_DEBUG", "1") == "1"
 
 ALLOWED_HOSTS = [
     "www.apsi.kszymczyk.me",
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "projects.instrumentation.RequestStatsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,11 +85,66 @@ WSGI_APPLICATION = "apsi.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+# Database is chosen by APSI_DB_ENGINE. PostgreSQL needs psycopg2, which is
+# not required by the SQLite default.
+DB_ENGINE = os.environ.get("APSI_DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("APSI_DB_NAME", "apsi"),
+            "USER": os.environ.get("APSI_DB_USER", "apsi"),
+            "PASSWORD": os.environ.get("APSI_DB_PASSWORD", ""),
+            "HOST": os.environ.get("APSI_DB_HOST", "localhost"),
+            "PORT": os.environ.get("APSI_DB_PORT", "5432"),
+            # Seconds a connection is kept open between requests.
+            "CONN_MAX_AGE": int(os.environ.get("APSI_DB_CONN_MAX_AGE", 60)),
+        }
     }
+
+    # Connections go through PgBouncer in transaction pooling mode, which
+    # does not keep server side cursors between transactions.
+    if os.environ.get("APSI_DB_POOLER") == "pgbouncer":
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+    # Reports and bills read from the replica when its host is given.
+    if os.environ.get("APSI_DB_REPLICA_HOST"):
+        DATABASES["replica"] = dict(
+            DATABASES["default"],
+            HOST=os.environ["APSI_DB_REPLICA_HOST"],
+            PORT=os.environ.get(
+                "APSI_DB_REPLICA_PORT", DATABASES["default"]["PORT"]
+            ),
+            TEST={"MIRROR": "default"},
+        )
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get(
+                "APSI_DB_NAME", os.path.join(BASE_DIR, "db.sqlite3")
+            ),
+        }
+    }
+
+DATABASE_ROUTERS = ["projects.routers.ReplicaRouter"]
+
+# Pragmas set on every new SQLite connection, each can be changed with
+# APSI_SQLITE_<NAME>. In WAL mode readers do not block the writer and the
+# writer does not block readers, with synchronous NORMAL commits do not
+# wait for the disk until a checkpoint. Cache size is in KiB when negative.
+SQLITE_PRAGMAS = {
+    name: os.environ.get(f"APSI_SQLITE_{name.upper()}", default)
+    for name, default in [
+        ("journal_mode", "wal"),
+        ("synchronous", "normal"),
+        ("mmap_size", 256 * 1024 * 1024),
+        ("cache_size", -64 * 1024),
+        # Milliseconds a write waits for the lock of another connection.
+        ("busy_timeout", 20000),
+        ("temp_store", "memory"),
+    ]
 }
 
 
@@ -132,3 +190,76 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 LOGIN_REDIRECT_URL = "project-home"
 LOGIN_URL = "login"
+
+# Seconds for which role and project memberships of the user are cached.
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Number of threads rendering bills in the background. With 0 bills are
+# rendered only by the `runbillworker` command.
+BILL_WORKERS = 2
+
+# Seconds after which a running bill job is taken as abandoned by a worker
+# which died and is queued again.
+BILL_JOB_LEASE = 300
+
+# Number of latest requests per url name kept by `RequestStatsMiddleware`.
+REQUEST_STATS_BUFFER_SIZE = 500
+
+# Number of datepoints fetched at once by the csv export.
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of datepoints on a single page of the datepoint tables.
+DATEPOINT_PAGE_SIZE = 100
+
+# Memberships and fragments are invalidated by bumping their versions in
+# the cache, so every process serving requests has to share it. Local memory
+# cache is shared only by threads of one process, it is the default of the
+# single process SQLite setup. PostgreSQL setups run several processes and
+# default to the database cache, whose table is made by `createcachetable`.
+# Memcached is used with APSI_CACHE_BACKEND=memcached. Local memory and
+# database caches evict entries over MAX_ENTRIES.
+CACHE_BACKEND = os.environ.get(
+    "APSI_CACHE_BACKEND", "database" if DB_ENGINE == "postgresql" else "locmem"
+)
+
+if CACHE_BACKEND == "memcached":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+            "LOCATION": os.environ.get(
+                "APSI_CACHE_LOCATION", "127.0.0.1:11211"
+            ),
+        }
+    }
+elif CACHE_BACKEND == "database":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.environ.get("APSI_CACHE_LOCATION", "apsi_cache"),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "apsi",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# Seconds for which rendered fragments of phase pages are cached. Fragments
+# are invalidated earlier whenever datepoints, tasks or the phase change.
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# Number of threads rendering bills of a billing period at once.
+BILL_THREADS = 4
+
+# Most datepoints created by a single bulk request of the json api.
+API_BULK_LIMIT = 1000
+
+# Number of imported datepoints inserted at once.
+IMPORT_CHUNK_SIZE = 2000
+
+# Number of rejected rows of an uploaded timesheet listed on the page.
+IMPORT_ERRORS_SHOWN = 100
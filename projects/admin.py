@@ -1,9 +1,97 @@
-from django.contrib import admin
+import datetime
+
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth.models import User
+from django.db.models import Max, Min, QuerySet
+from django.template.response import TemplateResponse
 
+from . import approvals, closing, rollups, writes
+from .forms import MoveDatePointsForm
 from .models import DatePoint, Project, Task, ClientDetail, ProjectPhase
 
 
+class YearsQuerySet(QuerySet):
+    """ Queryset finding years of the date hierarchy by index lookups.
+
+    Admin lists the years by truncating the date of every row, which scans
+    the whole table. Here each year between the first and the last date is
+    checked with a range lookup instead.
+    """
+
+    def dates(self, field_name, kind, order="ASC"):
+        if kind != "year":
+            return super().dates(field_name, kind, order)
+
+        # Separate queries, SQLite reads only a lone MIN or MAX from index.
+        dates = self.order_by().values_list(field_name, flat=True)
+        first = dates.aggregate(first=Min(field_name))["first"]
+        if first is None:
+            return []
+        last = dates.aggregate(last=Max(field_name))["last"]
+        years = [
+            datetime.date(year, 1, 1)
+            for year in range(first.year, last.year + 1)
+            if self.filter(**{f"{field_name}__year": year}).exists()
+        ]
+        return years if order == "ASC" else years[::-1]
+
+
+def approval_action(field, approve, description):
+    """ Returns admin action setting the approval of selected datepoints.
+
+    Datepoints are changed by one UPDATE, those of ended phases and those
+    already in the state are left unchanged.
+    """
+
+    def action(modeladmin, request, queryset):
+        datepoints_pks = approvals.set_approval(
+            queryset.exclude(**{field: approve}), field, approve
+        )
+        modeladmin.message_user(
+            request, f"{description}: changed {len(datepoints_pks)}."
+        )
+
+    action.__name__ = f"{'approve' if approve else 'unapprove'}_{field}"
+    action.short_description = description
+    action.allowed_permissions = ("change",)
+    return action
+
+
+class ProjectListFilter(admin.SimpleListFilter):
+    """ Filter datepoints by project without a query per project title. """
+
+    title = "project"
+    parameter_name = "project"
+
+    def lookups(self, request, model_admin):
+        return Project.objects.order_by("title").values_list("id", "title")
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(task__project__project_id=self.value())
+        return queryset
+
+
+class WorkerListFilter(admin.SimpleListFilter):
+    """ Filter datepoints by worker, listing only users of the group. """
+
+    title = "worker"
+    parameter_name = "worker"
+
+    def lookups(self, request, model_admin):
+        return (
+            User.objects.filter(groups__name="Worker")
+            .order_by("username")
+            .values_list("id", "username")
+        )
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(worker_id=self.value())
+        return queryset
+
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     fields = (
@@ -24,6 +112,11 @@ class ProjectAdmin(admin.ModelAdmin):
         "description",
     )
     readonly_fields = ("title", "description", "worker")
+    raw_id_fields = ("manager", "client")
+    list_select_related = ("manager", "client_detail")
+    list_filter = ("ongoing",)
+    show_full_result_count = False
+    actions = ["close_projects"]
 
     # filter_horizontal = ("worker", "client")
 
@@ -43,22 +136,53 @@ class ProjectAdmin(admin.ModelAdmin):
     def has_add_permission(self, request, obj=None):
         return False
 
+    def close_projects(self, request, queryset):
+        projects, projectphases = closing.close_projects(queryset)
+        self.message_user(
+            request, f"Ended {projects} projects and {projectphases} phases."
+        )
+
+    close_projects.short_description = "End selected projects"
+
 
 @admin.register(ProjectPhase)
-class ProjectPhase(admin.ModelAdmin):
+class ProjectPhaseAdmin(admin.ModelAdmin):
     fields = ("title", "project", "ongoing")
     list_display = ("title", "project", "ongoing")
-    readonly_fields = ("dates",)
+    # Title of the project is shown with its manager.
+    list_select_related = ("project__manager",)
+    list_filter = ("ongoing",)
+    show_full_result_count = False
+    actions = ["close_phases", "recompute_hours"]
 
     def has_add_permission(self, request, obj=None):
         return False
 
+    def close_phases(self, request, queryset):
+        projectphases = closing.close_phases(queryset)
+        self.message_user(request, f"Ended {projectphases} phases.")
+
+    close_phases.short_description = "End selected phases"
+
+    def recompute_hours(self, request, queryset):
+        projectphase_ids = list(queryset.values_list("id", flat=True))
+        count = rollups.rebuild(projectphase_ids)
+        self.message_user(
+            request,
+            f"Recomputed {count} monthly hours rows of "
+            f"{len(projectphase_ids)} phases.",
+        )
+
+    recompute_hours.short_description = "Recompute monthly hours of phases"
+
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     fields = ("title", "description", "project")
     readonly_fields = ("title", "description", "project")
     list_display = ("title", "project", "description")
+    list_select_related = ("project__project",)
+    show_full_result_count = False
 
     def has_add_permission(self, request, obj=None):
         return False
@@ -77,6 +201,24 @@ class DatePointAdmin(admin.ModelAdmin):
         "description",
         "url",
     )
+    list_select_related = ("task", "worker")
+    list_filter = (
+        ProjectListFilter,
+        WorkerListFilter,
+        "approved_manager",
+        "approved_client",
+    )
+    date_hierarchy = "worked_date"
+    # Served by the indexes on worked date, counting millions of rows is not.
+    ordering = ("-worked_date", "-id")
+    show_full_result_count = False
+    actions = [
+        approval_action("approved_manager", True, "Approve for manager"),
+        approval_action("approved_manager", False, "Unapprove for manager"),
+        approval_action("approved_client", True, "Approve for client"),
+        approval_action("approved_client", False, "Unapprove for client"),
+        "move_to_task",
+    ]
 
     readonly_fields = (
         "task",
@@ -93,6 +235,57 @@ class DatePointAdmin(admin.ModelAdmin):
     def has_add_permission(self, request, obj=None):
         return False
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return YearsQuerySet(
+            model=queryset.model, query=queryset.query, using=queryset._db
+        )
+
+    def move_to_task(self, request, queryset):
+        projectphase_ids = list(
+            queryset.order_by()
+            .values_list("task__project_id", flat=True)
+            .distinct()[:2]
+        )
+        if len(projectphase_ids) != 1:
+            self.message_user(
+                request, "Select datepoints of a single phase.", messages.ERROR
+            )
+            return None
+
+        form = MoveDatePointsForm(
+            request.POST if "apply" in request.POST else None,
+            projectphase_id=projectphase_ids[0],
+        )
+        if form.is_valid():
+            task = form.cleaned_data["task"]
+            datepoints_pks = writes.update(
+                queryset.exclude(task=task), task=task
+            )
+            self.message_user(
+                request,
+                f"Moved {len(datepoints_pks)} datepoints to {task.title}.",
+            )
+            return None
+
+        return TemplateResponse(
+            request,
+            "admin/projects/datepoint/move_to_task.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "projectphase": ProjectPhase.objects.get(
+                    id=projectphase_ids[0]
+                ),
+                "selected": request.POST.getlist(ACTION_CHECKBOX_NAME),
+                "select_across": request.POST.get("select_across", "0"),
+            },
+        )
+
+    move_to_task.short_description = "Move to a task of the same phase"
+    move_to_task.allowed_permissions = ("change",)
+
 
 @admin.register(ClientDetail)
 class ClientDetail(admin.ModelAdmin):
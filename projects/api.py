@@ -0,0 +1,320 @@
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+
+from users.models import ApiToken
+
+from . import approvals, tables, writes
+from .forms import BulkApproveForm, DatePointApiFilterForm, DatePointApiForm
+from .membership import get_membership
+from .models import DatePoint, PhaseEndedError, Task
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def token_user(request):
+    """ Returns active user of the token in the Authorization header. """
+
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, key = header.partition(" ")
+    if scheme != "Token" or not key:
+        return None
+
+    token = (
+        ApiToken.objects.select_related("user")
+        .filter(digest=ApiToken.hash(key.strip()))
+        .first()
+    )
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+def read_json(request):
+    try:
+        return json.loads(request.body.decode())
+    except ValueError:
+        raise ApiError(400, "Request body is not valid json.")
+
+
+def serialize(datepoint):
+    return {
+        "id": datepoint.id,
+        "task": datepoint.task_id,
+        "worker": datepoint.worker_id,
+        "title": datepoint.title,
+        "description": datepoint.description,
+        "url": datepoint.url,
+        "worked_time": datepoint.worked_time,
+        "worked_date": datepoint.worked_date.isoformat(),
+        "approved_manager": datepoint.approved_manager,
+        "approved_client": datepoint.approved_client,
+    }
+
+
+def visible_datepoints(request):
+    """ Returns datepoints of the user's projects, only own for workers. """
+
+    membership = get_membership(request)
+    queryset = DatePoint.objects.filter(
+        task__project__project_id__in=membership.project_ids
+    )
+    if membership.role == "Worker":
+        queryset = queryset.filter(worker=request.user)
+    return queryset
+
+
+def writable_tasks(user, task_ids):
+    """ Returns ids of tasks of ongoing phases of the worker's projects. """
+
+    return set(
+        Task.objects.filter(
+            id__in=task_ids,
+            project__project__worker=user,
+            project__ongoing=True,
+        ).values_list("id", flat=True)
+    )
+
+
+def validate_datepoints(user, items):
+    """ Returns unsaved datepoints of the worker and errors by item index.
+
+    Tasks of all the items are checked with a single query.
+    """
+
+    forms = {}
+    errors = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {"__all__": ["Expected an object."]}
+            continue
+        form = DatePointApiForm(item)
+        if form.is_valid():
+            forms[index] = form
+        else:
+            errors[index] = form.errors
+
+    task_ids = writable_tasks(
+        user, {form.cleaned_data["task"] for form in forms.values()}
+    )
+
+    datepoints = []
+    for index, form in forms.items():
+        data = form.cleaned_data
+        if data["task"] not in task_ids:
+            errors[index] = {
+                "task": ["Select a task of an ongoing phase of your project."]
+            }
+            continue
+        datepoints.append(
+            DatePoint(
+                task_id=data["task"],
+                worker=user,
+                title=data["title"],
+                description=data["description"],
+                url=data["url"],
+                worked_time=data["worked_time"],
+                worked_date=data["worked_date"],
+            )
+        )
+
+    return datepoints, errors
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ApiView(View):
+    """ View of the json api authenticated by `Authorization: Token <key>`.
+
+    Session of the browser is not used, so requests are not checked for
+    csrf tokens. """
+
+    def dispatch(self, request, *args, **kwargs):
+        user = token_user(request)
+        if user is None:
+            return JsonResponse(
+                {"error": "Invalid or missing token."}, status=401
+            )
+        request.user = user
+
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({"error": error.message}, status=error.status)
+
+    def require(self, permission, role=None):
+        if not self.request.user.has_perm(permission):
+            raise ApiError(403, "Permission denied.")
+        if role is not None and get_membership(self.request).role != role:
+            raise ApiError(403, f"Only for {role.lower()}s.")
+
+
+class DatePointListApi(ApiView):
+    """ List datepoints page by page or create a single datepoint. """
+
+    def get(self, request, *args, **kwargs):
+        self.require("projects.view_datepoint")
+
+        form = DatePointApiFilterForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        data = form.cleaned_data
+
+        queryset = tables.filter_datepoints(visible_datepoints(request), data)
+        if data["projectphase"]:
+            queryset = queryset.filter(projectphase_id=data["projectphase"])
+
+        datepoints, next_cursor = tables.datepoint_page(
+            queryset, after=data["after"], descending=data["order"] != "asc"
+        )
+        return JsonResponse(
+            {
+                "datepoints": [serialize(item) for item in datepoints],
+                "next": next_cursor,
+            }
+        )
+
+    def post(self, request, *args, **kwargs):
+        self.require("projects.add_datepoint", "Worker")
+
+        datepoints, errors = validate_datepoints(
+            request.user, [read_json(request)]
+        )
+        if errors:
+            return JsonResponse({"errors": errors[0]}, status=400)
+
+        datepoint = datepoints[0]
+        try:
+            writes.save(datepoint)
+        except PhaseEndedError as error:
+            raise ApiError(409, str(error))
+        return JsonResponse(serialize(datepoint), status=201)
+
+
+class DatePointBulkApi(ApiView):
+    """ Create many datepoints of the worker at once.
+
+    Either all the datepoints are created in a single transaction or none
+    of them and errors are returned by index of the datepoint. """
+
+    def post(self, request, *args, **kwargs):
+        self.require("projects.add_datepoint", "Worker")
+
+        items = read_json(request)
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, "Expected a list of datepoints.")
+        if len(items) > settings.API_BULK_LIMIT:
+            raise ApiError(
+                400, f"Send at most {settings.API_BULK_LIMIT} datepoints."
+            )
+
+        datepoints, errors = validate_datepoints(request.user, items)
+        if errors:
+            return JsonResponse({"errors": errors}, status=400)
+
+        try:
+            created = writes.create(datepoints)
+        except PhaseEndedError as error:
+            raise ApiError(409, str(error))
+
+        return JsonResponse({"created": created}, status=201)
+
+
+class DatePointApi(ApiView):
+    """ Read or change a single datepoint. """
+
+    def get_datepoint(self):
+        datepoint = (
+            visible_datepoints(self.request)
+            .filter(id=self.kwargs["datepoint_pk"])
+            .first()
+        )
+        if datepoint is None:
+            raise ApiError(404, "Datepoint not found.")
+        return datepoint
+
+    def get(self, request, *args, **kwargs):
+        self.require("projects.view_datepoint")
+        return JsonResponse(serialize(self.get_datepoint()))
+
+    def patch(self, request, *args, **kwargs):
+        self.require("projects.change_datepoint", "Worker")
+
+        datepoint = self.get_datepoint()
+        if datepoint.approved_client:
+            raise ApiError(451, "Approved by client, cannot change.")
+
+        changes = read_json(request)
+        if not isinstance(changes, dict):
+            raise ApiError(400, "Expected an object.")
+
+        datepoints, errors = validate_datepoints(
+            request.user, [{**serialize(datepoint), **changes}]
+        )
+        if errors:
+            return JsonResponse({"errors": errors[0]}, status=400)
+
+        for field in DatePointApiForm.base_fields:
+            field = "task_id" if field == "task" else field
+            setattr(datepoint, field, getattr(datepoints[0], field))
+        # Changed datepoint has to be approved by the manager again.
+        datepoint.approved_manager = False
+        try:
+            writes.save(datepoint)
+        except PhaseEndedError as error:
+            raise ApiError(409, str(error))
+
+        return JsonResponse(serialize(datepoint))
+
+
+class ApproveDatePointsApi(ApiView):
+    """ Approve or disapprove many datepoints like `ApproveDatePointsView`.
+
+    Datepoints are given as a list of ids, approve as a boolean. """
+
+    def post(self, request, *args, **kwargs):
+        self.require("projects.change_datepoint")
+
+        membership = get_membership(request)
+        field = approvals.approval_field(membership.role)
+        if field is None:
+            raise ApiError(403, "Only for managers and clients.")
+
+        body = read_json(request)
+        if not isinstance(body, dict):
+            raise ApiError(400, "Expected an object.")
+        datepoints = body.get("datepoints") or []
+        if not isinstance(datepoints, list):
+            raise ApiError(400, "Expected a list of datepoint ids.")
+        if not isinstance(body.get("approve"), bool):
+            raise ApiError(400, "Expected approve to be true or false.")
+
+        form = BulkApproveForm(
+            {
+                "datepoints": ",".join(str(pk) for pk in datepoints),
+                "projectphase": body.get("projectphase"),
+                "worker": body.get("worker"),
+                "month": body.get("month"),
+                "approve": "true" if body["approve"] else "false",
+            }
+        )
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        data = form.cleaned_data
+        datepoints_pks = approvals.set_approval(
+            approvals.approvable_datepoints(membership, data),
+            field,
+            data["approve"],
+        )
+        return JsonResponse(
+            {"approved": data["approve"], "datepoints": datepoints_pks}
+        )
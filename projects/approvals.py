@@ -0,0 +1,45 @@
+from . import rollups, writes
+from .models import DatePoint
+
+
+def approval_field(role):
+    """ Returns approval field changed by the role, None if it has none. """
+
+    if role == "Manager":
+        return "approved_manager"
+    if role == "Client":
+        return "approved_client"
+    return None
+
+
+def approvable_datepoints(membership, data):
+    """ Returns datepoints selected by cleaned data of `BulkApproveForm`.
+
+    Only datepoints of ongoing phases of the user's projects are selected.
+    """
+
+    queryset = DatePoint.objects.filter(
+        task__project__project_id__in=membership.project_ids,
+        task__project__ongoing=True,
+    )
+    if data["datepoints"]:
+        queryset = queryset.filter(id__in=data["datepoints"])
+    if data["projectphase"]:
+        queryset = queryset.filter(task__project_id=data["projectphase"])
+    if data["worker"]:
+        queryset = queryset.filter(worker_id=data["worker"])
+    if data["month"]:
+        queryset = queryset.filter(
+            **rollups.month_range(data["month"][:4], data["month"][5:7])
+        )
+    return queryset
+
+
+def set_approval(queryset, field, approve):
+    """ Change approval of the datepoints with a single update.
+
+    Returns ids of the changed datepoints. Queryset must not filter on the
+    changed field.
+    """
+
+    return writes.update(queryset, **{field: approve})
@@ -0,0 +1,424 @@
+import datetime
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import render
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.text import slugify
+from wkhtmltopdf.utils import render_pdf_from_template
+from wkhtmltopdf.views import PDFResponse
+
+from . import snapshots
+from .models import BillJob, ProjectPhase, Task
+
+
+def money(value):
+    return f"{value:.2f}".replace(".", ",")
+
+
+def client_detail_context(project):
+    return {
+        "name": project.client_detail.name,
+        "street": project.client_detail.street,
+        "postal_code": project.client_detail.postal_code,
+        "city": project.client_detail.city,
+        "nip": project.client_detail.nip,
+    }
+
+
+def services_context(items, hours_dict, prices):
+    """ Returns bill services of items with any approved hours and total.
+
+    Prices per hour are given by item id, closed phases keep the price
+    frozen in their snapshot.
+    """
+
+    services = []
+    total = 0
+
+    for item in items:
+        hours = hours_dict.get(item.id, 0)
+
+        if hours != 0:
+            price_per_hour = prices[item.id]
+            total += price_per_hour * hours
+            services.append(
+                {
+                    "title": item.title,
+                    "count": hours,
+                    "price": money(price_per_hour),
+                    "brutto": money(price_per_hour * hours),
+                    "netto": money(price_per_hour * hours),
+                }
+            )
+
+    return services, total
+
+
+def projectphase_bill_context(projectphase):
+    """ Returns context of the bill for the phase, one service per task. """
+
+    snapshot = snapshots.get(projectphase)
+    if snapshot is None:
+        price_per_hour = projectphase.project.price_per_hour
+    else:
+        price_per_hour = snapshot.price_per_hour
+    client_detail = client_detail_context(projectphase.project)
+
+    if price_per_hour is None:
+        raise Http404("Price is not set, please contact the administrator.")
+
+    tasks_dict = snapshots.hours_by(
+        "hours_approved", "task_id", projectphase=projectphase
+    )
+    services, total = services_context(
+        Task.objects.filter(project=projectphase),
+        tasks_dict,
+        dict.fromkeys(tasks_dict, price_per_hour),
+    )
+
+    return {
+        "client_detail": client_detail,
+        "services": services,
+        "total": money(total),
+    }
+
+
+def project_bill_context(project):
+    """ Returns context of the bill for the project, one service per phase. """
+
+    projectphases = project.projectphase_set.all()
+    prices = snapshots.prices(projectphases)
+    client_detail = client_detail_context(project)
+
+    if None in prices.values():
+        raise Http404("Price is not set, please contact the administrator.")
+
+    projectphases_dict = snapshots.hours_by(
+        "hours_approved", "projectphase_id", projectphase__project=project
+    )
+    services, total = services_context(
+        projectphases, projectphases_dict, prices
+    )
+
+    return {
+        "client_detail": client_detail,
+        "services": services,
+        "total": money(total),
+    }
+
+
+def period_bill_contexts(first_month, last_month, projects):
+    """ Returns contexts of bills of the projects for a range of months.
+
+    Approved hours of all the projects are summed by one aggregate query of
+    rollups and one of snapshots of closed phases. Projects without
+    approved hours in the months, price or client details are left out.
+    Returns list of (project, context) pairs.
+    """
+
+    projects = {
+        project.id: project
+        for project in projects.select_related("client_detail")
+    }
+
+    hours_dict = {
+        pk: hours
+        for pk, hours in snapshots.hours_by(
+            "hours_approved",
+            "projectphase_id",
+            projectphase__project_id__in=projects,
+            month__gte=first_month,
+            month__lte=last_month,
+        ).items()
+        if hours
+    }
+
+    projectphases = {}
+    queryset = ProjectPhase.objects.filter(id__in=hours_dict).order_by("id")
+    for projectphase in queryset:
+        projectphases.setdefault(projectphase.project_id, []).append(
+            projectphase
+        )
+    prices = snapshots.prices(queryset)
+
+    period = f"{first_month:%Y-%m} - {last_month:%Y-%m}"
+
+    contexts = []
+    for project_id, items in sorted(projectphases.items()):
+        project = projects[project_id]
+        if project.client_detail is None:
+            continue
+        if any(prices[item.id] is None for item in items):
+            continue
+
+        services, total = services_context(items, hours_dict, prices)
+        contexts.append(
+            (
+                project,
+                {
+                    "client_detail": client_detail_context(project),
+                    "services": services,
+                    "total": money(total),
+                    "period": period,
+                },
+            )
+        )
+
+    return contexts
+
+
+def bill_key(kind, pk, context):
+    """ Returns hash of the billed object and its approved hours snapshot. """
+
+    data = json.dumps([kind, pk, context], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def request_bill(projectphase=None, project=None):
+    """ Returns bill job of the phase or project, queueing it if needed.
+
+    Jobs are identified by the snapshot of the bill, so a finished job is
+    reused until approved hours, prices or client details change. Failed
+    jobs and jobs running longer than `BILL_JOB_LEASE` are queued again.
+    """
+
+    if projectphase is not None:
+        context = projectphase_bill_context(projectphase)
+        key = bill_key("projectphase", projectphase.id, context)
+    else:
+        context = project_bill_context(project)
+        key = bill_key("project", project.id, context)
+
+    job, created = BillJob.objects.get_or_create(
+        key=key,
+        defaults={
+            "projectphase": projectphase,
+            "project": project,
+            "context": json.dumps(context),
+        },
+    )
+
+    if job.status == BillJob.FAILED:
+        BillJob.objects.filter(id=job.id, status=BillJob.FAILED).update(
+            status=BillJob.QUEUED, error=""
+        )
+        job.status = BillJob.QUEUED
+
+    if (
+        job.status == BillJob.RUNNING
+        and BillJob.objects.filter(stale_jobs(), id=job.id).update(
+            status=BillJob.QUEUED, started_at=None
+        )
+    ):
+        job.status = BillJob.QUEUED
+
+    if job.status == BillJob.QUEUED:
+        start_workers()
+
+    return job
+
+
+def bill_response(request, job):
+    """ Returns the PDF of a finished job or a page waiting for it. """
+
+    if job.status == BillJob.DONE:
+        return PDFResponse(bytes(job.pdf), filename="bill.pdf")
+
+    return render(
+        request, "projects/bill_pending.html", context={"job": job}, status=202
+    )
+
+
+def render_bill(context):
+    context = dict(context, data=datetime.datetime.today())
+
+    return render_pdf_from_template(
+        get_template("projects/bill.html"),
+        None,
+        None,
+        context,
+        cmd_options=getattr(settings, "WKHTMLTOPDF_CMD_OPTIONS", None),
+    )
+
+
+def try_render_bill(context):
+    """ Returns (pdf, None) or (None, error) of rendering the bill. """
+
+    try:
+        return render_bill(context), None
+    except Exception as error:
+        return None, str(error)
+
+
+def render_bills(contexts, threads):
+    """ Returns (pdf, error) pairs of the contexts.
+
+    Bills are rendered concurrently by at most `threads` threads, each
+    waiting for its wkhtmltopdf process. With 0 or 1 they are rendered one
+    by one.
+    """
+
+    if threads <= 1 or len(contexts) <= 1:
+        return [try_render_bill(context) for context in contexts]
+
+    with ThreadPoolExecutor(
+        max_workers=threads, thread_name_prefix="period-bill"
+    ) as pool:
+        return list(pool.map(try_render_bill, contexts))
+
+
+def period_bills(first_month, last_month, projects, threads=None):
+    """ Returns ZIP archive with bills of the projects for the months.
+
+    Bills rendered before for the same snapshot are reused from finished
+    bill jobs, newly rendered ones are saved as finished jobs. Returns
+    (archive bytes, number of bills, list of errors).
+    """
+
+    if threads is None:
+        threads = settings.BILL_THREADS
+
+    contexts = period_bill_contexts(first_month, last_month, projects)
+    keys = [
+        bill_key("project-period", project.id, context)
+        for project, context in contexts
+    ]
+
+    pdfs = {
+        job.key: bytes(job.pdf)
+        for job in BillJob.objects.filter(key__in=keys, status=BillJob.DONE)
+    }
+    missing = [
+        (key, project, context)
+        for key, (project, context) in zip(keys, contexts)
+        if key not in pdfs
+    ]
+    results = render_bills([item[2] for item in missing], threads)
+
+    errors = []
+    jobs = []
+    for (key, project, context), (pdf, error) in zip(missing, results):
+        if error is not None:
+            errors.append(f"{project.title}: {error}")
+            continue
+        pdfs[key] = pdf
+        jobs.append(
+            BillJob(
+                key=key,
+                project=project,
+                context=json.dumps(context),
+                status=BillJob.DONE,
+                pdf=pdf,
+            )
+        )
+    # Other request may have rendered the same bills in the meantime.
+    BillJob.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    archive = io.BytesIO()
+    count = 0
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as f:
+        for key, (project, context) in zip(keys, contexts):
+            if key in pdfs:
+                name = f"bill-{project.id}-{slugify(project.title)}.pdf"
+                f.writestr(name, pdfs[key])
+                count += 1
+        if errors:
+            f.writestr("errors.txt", "\n".join(errors))
+
+    return archive.getvalue(), count, errors
+
+
+def stale_jobs():
+    """ Returns filter of jobs running longer than `BILL_JOB_LEASE`.
+
+    Worker which died while rendering never finishes its job, such jobs are
+    taken again.
+    """
+
+    return Q(
+        status=BillJob.RUNNING,
+        started_at__lt=timezone.now()
+        - datetime.timedelta(seconds=settings.BILL_JOB_LEASE),
+    )
+
+
+def process_next_job():
+    """ Render the oldest waiting job. Returns False if there is none.
+
+    Waiting are queued jobs and stale jobs of dead workers.
+    """
+
+    waiting = Q(status=BillJob.QUEUED) | stale_jobs()
+    job = BillJob.objects.filter(waiting).order_by("date_created").first()
+    if job is None:
+        return False
+
+    # Claim the job, other workers may be trying to take it as well.
+    started_at = timezone.now()
+    claimed = BillJob.objects.filter(waiting, id=job.id).update(
+        status=BillJob.RUNNING, started_at=started_at
+    )
+    if not claimed:
+        return True
+
+    # Job taken over by another worker after the lease ran out is left to it.
+    claim = BillJob.objects.filter(id=job.id, started_at=started_at)
+    try:
+        pdf = render_bill(json.loads(job.context))
+    except Exception as error:
+        claim.update(status=BillJob.FAILED, error=str(error))
+    else:
+        claim.update(status=BillJob.DONE, pdf=pdf)
+
+    return True
+
+
+def run_jobs():
+    try:
+        while process_next_job():
+            pass
+    finally:
+        connection.close()
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def start_workers():
+    """ Process queued jobs in the local pool of `BILL_WORKERS` threads.
+
+    With `BILL_WORKERS = 0` jobs are left for the `runbillworker` command.
+    """
+
+    global executor
+
+    if settings.BILL_WORKERS == 0:
+        return
+
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.BILL_WORKERS, thread_name_prefix="bill"
+            )
+
+    executor.submit(run_jobs)
+
+
+def invalidate(task_ids):
+    """ Delete bill jobs of phases and projects of the tasks. """
+
+    BillJob.objects.filter(projectphase__task__id__in=task_ids).delete()
+    BillJob.objects.filter(
+        project__projectphase__task__id__in=task_ids
+    ).delete()
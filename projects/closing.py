@@ -0,0 +1,61 @@
+from django.db import transaction
+
+from . import bills, fragments, snapshots
+from .models import Project, ProjectPhase, Task
+
+
+def close_phases(projectphases):
+    """ End the ongoing phases of the queryset. Returns number of phases.
+
+    Phases are ended by one update and their hours, rates and totals are
+    frozen into a snapshot within the same transaction. Datepoints cannot
+    be written once the phase has ended, so the snapshot stays equal to
+    the datepoints. Cached pages and bills are dropped once the outermost
+    transaction commits, so they are not cached again from the data before
+    the close.
+    """
+
+    ids = list(projectphases.filter(ongoing=True).values_list("id", flat=True))
+    if not ids:
+        return 0
+
+    # Update comes first, SQLite transactions reading before writing fail
+    # at once when another connection is writing.
+    with transaction.atomic():
+        closed = ProjectPhase.objects.filter(id__in=ids, ongoing=True).update(
+            ongoing=False
+        )
+        snapshots.take(ids)
+
+    transaction.on_commit(lambda: invalidate(ids))
+    return closed
+
+
+def close_projects(projects):
+    """ End the ongoing projects of the queryset together with their phases.
+
+    Returns (number of projects, number of phases).
+    """
+
+    ids = list(projects.filter(ongoing=True).values_list("id", flat=True))
+    if not ids:
+        return 0, 0
+
+    with transaction.atomic():
+        closed = Project.objects.filter(id__in=ids, ongoing=True).update(
+            ongoing=False
+        )
+        closed_phases = close_phases(
+            ProjectPhase.objects.filter(project_id__in=ids)
+        )
+
+    return closed, closed_phases
+
+
+def invalidate(projectphase_ids):
+    """ Drop cached pages and bills of the phases. """
+
+    fragments.invalidate(projectphase_ids)
+    bills.invalidate(
+        Task.objects.filter(project_id__in=projectphase_ids).values("id")
+    )
@@ -0,0 +1,77 @@
+import csv
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .rollups import month_range
+
+HEADER = [
+    "task",
+    "worker",
+    "date",
+    "hours",
+    "approved_manager",
+    "approved_client",
+    "amount",
+]
+
+
+class Echo:
+    """ File-like object returning written value instead of buffering it. """
+
+    def write(self, value):
+        return value
+
+
+def filter_datepoints(queryset, worker=None, month=None):
+    """ Narrow down datepoints to the worker id and month in format 'Y-m'. """
+
+    if worker:
+        queryset = queryset.filter(worker_id=worker)
+    if month:
+        queryset = queryset.filter(**month_range(month[:4], month[5:7]))
+    return queryset
+
+
+def datepoint_rows(queryset):
+    """ Yields export rows of datepoints, fetched in chunks. """
+
+    rows = (
+        queryset.order_by("worked_date", "id")
+        .values_list(
+            "task__title",
+            "worker__username",
+            "worked_date",
+            "worked_time",
+            "approved_manager",
+            "approved_client",
+            "task__project__project__price_per_hour",
+        )
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+    for row in rows:
+        price_per_hour = row[6]
+        amount = "" if price_per_hour is None else row[3] * price_per_hour
+        yield row[:6] + (amount,)
+
+
+def stream_csv(header, rows, filename):
+    """ Returns response streaming the header and rows as csv. """
+
+    writer = csv.writer(Echo())
+
+    def content():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(content(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(queryset, filename):
+    """ Returns response streaming datepoints as csv. """
+
+    return stream_csv(HEADER, datepoint_rows(queryset), filename)
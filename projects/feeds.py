@@ -0,0 +1,61 @@
+import datetime
+
+from django.urls import reverse
+
+# Longest window of days returned by a single feed request.
+MAX_DAYS = 100
+
+
+def parse_date(value):
+    """ Returns date of ISO 8601 date or datetime sent by fullcalendar. """
+
+    return datetime.date.fromisoformat(value[:10])
+
+
+def url_template(name, kwarg):
+    """ Returns url of the view with `{}` in place of the integer kwarg. """
+
+    prefix, suffix = reverse(name, kwargs={kwarg: 0}).rsplit("0", 1)
+    return prefix + "{}" + suffix
+
+
+def calendar_events(queryset, role):
+    """ Returns fullcalendar events of datepoints and their last change.
+
+    Managers and clients see their approval as the color of the event.
+    """
+
+    if role == "Manager":
+        approved_field = "approved_manager"
+    elif role == "Client":
+        approved_field = "approved_client"
+    else:
+        approved_field = None
+
+    url = url_template("datepoint-detail", "datepoint_pk")
+    fields = [
+        "id",
+        "task__title",
+        "worked_time",
+        "worked_date",
+        "date_created",
+    ]
+    if approved_field is not None:
+        fields.append(approved_field)
+
+    events = []
+    last_modified = None
+    for row in queryset.order_by("worked_date", "id").values_list(*fields):
+        event = {
+            "title": f"{row[1]} | {row[2]}h",
+            "start": row[3].strftime("%Y-%m-%d"),
+            "url": url.format(row[0]),
+        }
+        if approved_field is not None:
+            event["color"] = "green" if row[5] else "red"
+        events.append(event)
+
+        if last_modified is None or row[4] > last_modified:
+            last_modified = row[4]
+
+    return events, last_modified
@@ -5,6 +5,9 @@ from django import forms
 from django.contrib.auth.models import User
 
 from .models import DatePoint, Project, Task
+from .feeds import MAX_DAYS, parse_date
+from .payroll import parse_month
+from .tables import decode_cursor
 
 
 class ProjectCreateForm(forms.ModelForm):
@@ -72,7 +75,6 @@ class QueryDatepointsForm(forms.Form):
 
         dates = kwargs.pop("dates")
         initial = kwargs.pop("initial")
-        print(initial)
         super(QueryDatepointsForm, self).__init__(*args, **kwargs)
 
         self.fields["dates"].choices = dates
@@ -96,3 +98,216 @@ class WorkerMonthForm(forms.Form):
 
         self.helper = FormHelper()
         self.helper.form_show_labels = False
+
+
+def validate_month(value):
+    """ Raise ValidationError unless the value is a month in format 'Y-m'. """
+
+    try:
+        parse_month(value)
+    except ValueError:
+        raise forms.ValidationError("Enter a valid month.")
+
+
+class BulkApproveForm(forms.Form):
+    """ Form selecting datepoints to approve or disapprove at once.
+
+    Datepoints are given either as comma separated ids or by the phase,
+    optionally narrowed down to a worker and a month in format 'Y-m'. """
+
+    datepoints = forms.CharField(required=False)
+    projectphase = forms.IntegerField(required=False)
+    worker = forms.IntegerField(required=False)
+    month = forms.RegexField(
+        regex=r"^\d{4}-\d{2}$", required=False, validators=[validate_month]
+    )
+
+    approve = forms.TypedChoiceField(
+        choices=[("true", "approve"), ("false", "disapprove")],
+        coerce=lambda value: value == "true",
+        required=True,
+    )
+
+    def clean_datepoints(self):
+        datepoints = self.cleaned_data["datepoints"]
+        try:
+            return [int(pk) for pk in datepoints.split(",") if pk.strip()]
+        except ValueError:
+            raise forms.ValidationError("Enter comma separated ids.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("datepoints") and not cleaned_data.get(
+            "projectphase"
+        ):
+            raise forms.ValidationError("Select datepoints or a phase.")
+        return cleaned_data
+
+
+class MoveDatePointsForm(forms.Form):
+    """ Form of the admin action moving datepoints to a task of the phase. """
+
+    task = forms.ModelChoiceField(queryset=Task.objects.none())
+
+    def __init__(self, *args, **kwargs):
+        projectphase_id = kwargs.pop("projectphase_id")
+        super().__init__(*args, **kwargs)
+
+        self.fields["task"].queryset = Task.objects.filter(
+            project_id=projectphase_id
+        ).order_by("title")
+
+
+class ExportForm(forms.Form):
+    """ Optional filters of exported datepoints, month in format 'Y-m'. """
+
+    worker = forms.IntegerField(required=False)
+    month = forms.RegexField(
+        regex=r"^\d{4}-\d{2}$", required=False, validators=[validate_month]
+    )
+
+
+class DatePointTableForm(forms.Form):
+    """ Filters, order and cursor of the datepoint table of the phase. """
+
+    worker = forms.ModelChoiceField(
+        queryset=User.objects.none(), required=False
+    )
+    task = forms.ModelChoiceField(queryset=Task.objects.none(), required=False)
+    approved_manager = forms.NullBooleanField(required=False)
+    approved_client = forms.NullBooleanField(required=False)
+    order = forms.ChoiceField(
+        choices=[("desc", "newest first"), ("asc", "oldest first")],
+        required=False,
+    )
+    after = forms.CharField(required=False, widget=forms.HiddenInput())
+
+    def __init__(self, *args, **kwargs):
+        projectphase = kwargs.pop("projectphase")
+        super(DatePointTableForm, self).__init__(*args, **kwargs)
+
+        self.fields["worker"].queryset = projectphase.project.worker.all()
+        self.fields["task"].queryset = Task.objects.filter(
+            project=projectphase
+        )
+
+        self.helper = FormHelper()
+        self.helper.form_method = "GET"
+        self.helper.form_tag = False
+
+    def clean_after(self):
+        after = self.cleaned_data["after"]
+        if not after:
+            return None
+        try:
+            return decode_cursor(after)
+        except ValueError:
+            raise forms.ValidationError("Invalid cursor.")
+
+
+class DatePointApiForm(forms.Form):
+    """ Datepoint sent to the json api.
+
+    Task is only checked to be an id, tasks of all the sent datepoints are
+    checked at once by the api. """
+
+    task = forms.IntegerField()
+    title = forms.CharField(max_length=100)
+    description = forms.CharField(max_length=100, required=False)
+    url = forms.URLField(required=False)
+    worked_time = forms.IntegerField(max_value=12, min_value=1)
+    worked_date = forms.DateField()
+
+
+class DatePointApiFilterForm(forms.Form):
+    """ Filters, order and cursor of datepoints listed by the json api. """
+
+    projectphase = forms.IntegerField(required=False)
+    worker = forms.IntegerField(required=False)
+    task = forms.IntegerField(required=False)
+    approved_manager = forms.NullBooleanField(required=False)
+    approved_client = forms.NullBooleanField(required=False)
+    order = forms.ChoiceField(
+        choices=[("desc", "newest first"), ("asc", "oldest first")],
+        required=False,
+    )
+    after = forms.CharField(required=False)
+
+    def clean_after(self):
+        after = self.cleaned_data["after"]
+        if not after:
+            return None
+        try:
+            return decode_cursor(after)
+        except ValueError:
+            raise forms.ValidationError("Invalid cursor.")
+
+
+class TimesheetImportForm(forms.Form):
+    """ Timesheet file, csv or iCalendar by its extension. """
+
+    file = forms.FileField()
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if file.name.lower().endswith((".ics", ".ical")):
+            self.cleaned_data["format"] = "ics"
+        else:
+            self.cleaned_data["format"] = "csv"
+        return file
+
+
+class CalendarRangeForm(forms.Form):
+    """ Visible window of the calendar sent by fullcalendar, end excluded. """
+
+    start = forms.CharField()
+    end = forms.CharField()
+
+    def clean_start(self):
+        return self.clean_date("start")
+
+    def clean_end(self):
+        return self.clean_date("end")
+
+    def clean_date(self, name):
+        try:
+            return parse_date(self.cleaned_data[name])
+        except ValueError:
+            raise forms.ValidationError("Enter a valid date.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("start")
+        end = cleaned_data.get("end")
+        if start and end and not 0 < (end - start).days <= MAX_DAYS:
+            raise forms.ValidationError(
+                f"End has to be within {MAX_DAYS} days after start."
+            )
+        return cleaned_data
+
+
+class MonthRangeForm(forms.Form):
+    """ Range of months in format 'Y-m', both included. """
+
+    start = forms.RegexField(regex=r"^\d{4}-\d{2}$")
+    end = forms.RegexField(regex=r"^\d{4}-\d{2}$")
+
+    def clean_start(self):
+        return self.clean_month("start")
+
+    def clean_end(self):
+        return self.clean_month("end")
+
+    def clean_month(self, name):
+        try:
+            return parse_month(self.cleaned_data[name])
+        except ValueError:
+            raise forms.ValidationError("Enter a valid month.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("start")
+        end = cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("Start has to be before end.")
+        return cleaned_data
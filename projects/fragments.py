@@ -0,0 +1,80 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Task
+from .routers import reading_replica
+
+# Returned by the cache for missing keys, values may be None.
+MISSING = object()
+
+
+def version_key(projectphase_id):
+    return f"fragments:{projectphase_id}:version"
+
+
+def get_version(projectphase_id):
+    """ Returns current version of cached fragments of the phase.
+
+    Versions are random, so a version evicted from the cache is never
+    reused and fragments cached under it are not served again.
+    """
+
+    key = version_key(projectphase_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(projectphase_ids):
+    """ Invalidate cached fragments of the phases. """
+
+    cache.set_many(
+        {version_key(pk): uuid.uuid4().hex for pk in projectphase_ids}, None
+    )
+
+
+def invalidate_tasks(task_ids):
+    """ Invalidate cached fragments of phases of the tasks. """
+
+    invalidate(
+        set(
+            Task.objects.filter(id__in=task_ids).values_list(
+                "project_id", flat=True
+            )
+        )
+    )
+
+
+def cached(projectphase_id, name, parts, compute):
+    """ Returns value of the phase fragment, computing it when missing.
+
+    Fragment is identified by the name and json serializable parts, e.g.
+    role of the user and filters. Fragments of older versions of the phase
+    are not read anymore and are left for the cache to evict.
+
+    Values computed from the replica are not cached. The replica may still
+    miss changes which already bumped the version.
+    """
+
+    if reading_replica():
+        return compute()
+
+    digest = hashlib.md5(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    key = (
+        f"fragments:{projectphase_id}:{get_version(projectphase_id)}:"
+        f"{name}:{digest}"
+    )
+
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        value = compute()
+        cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
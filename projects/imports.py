@@ -0,0 +1,275 @@
+import csv
+import datetime
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from . import rollups, writes
+from .models import DatePoint, Task, month_start
+
+# Columns of imported csv files, the first three are required. Files
+# exported as csv can be imported back.
+HEADER = ["task", "worker", "date", "hours", "title", "description", "url"]
+REQUIRED = ["task", "date", "hours"]
+
+# Limits of DatePointCreateForm2.
+MIN_HOURS = 1
+MAX_HOURS = 12
+
+# Days, hours and minutes of iCalendar DURATION, e.g. PT2H30M.
+DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:\d+S)?)?$")
+
+
+def csv_rows(f):
+    """ Yields (line number, row) of the csv file with a header.
+
+    Raises ValueError if the file is not a valid csv file.
+    """
+
+    reader = csv.DictReader(f)
+    try:
+        fieldnames = reader.fieldnames or []
+        missing = [name for name in REQUIRED if name not in fieldnames]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}.")
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as error:
+        raise ValueError(f"Invalid csv file: {error}.")
+
+
+def unfold(f):
+    """ Yields (line number, content line) of iCalendar file.
+
+    Long content lines are folded into lines starting with whitespace.
+    """
+
+    number, current = 0, None
+    for index, line in enumerate(f, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield number, current
+        number, current = index, line
+    if current is not None:
+        yield number, current
+
+
+def unescape(value):
+    return (
+        value.replace("\\n", "\n")
+        .replace("\\N", "\n")
+        .replace("\\,", ",")
+        .replace("\\;", ";")
+        .replace("\\\\", "\\")
+    )
+
+
+def parse_ical_datetime(value):
+    """ Returns date or naive datetime of DATE or DATE-TIME value. """
+
+    if "T" in value:
+        return datetime.datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    return datetime.datetime.strptime(value[:8], "%Y%m%d").date()
+
+
+def event_hours(event):
+    """ Returns worked hours of the event from DURATION or DTEND. """
+
+    if "DURATION" in event:
+        match = DURATION.match(event["DURATION"])
+        if match is None:
+            return ""
+        days, hours, minutes = (int(value or 0) for value in match.groups())
+        return str(round(days * 24 + hours + minutes / 60))
+
+    try:
+        start = parse_ical_datetime(event["DTSTART"])
+        end = parse_ical_datetime(event["DTEND"])
+    except (KeyError, ValueError):
+        return ""
+    if not isinstance(start, datetime.datetime):
+        return ""
+    return str(round((end - start).total_seconds() / 3600))
+
+
+def event_row(event):
+    """ Returns row of the VEVENT, task is the first of its CATEGORIES. """
+
+    try:
+        worked_date = parse_ical_datetime(event.get("DTSTART", ""))
+    except ValueError:
+        worked_date = None
+    if isinstance(worked_date, datetime.datetime):
+        worked_date = worked_date.date()
+
+    return {
+        "task": event.get("CATEGORIES", "").split(",")[0],
+        "worker": "",
+        "date": worked_date.isoformat() if worked_date else "",
+        "hours": event_hours(event),
+        "title": event.get("SUMMARY", ""),
+        "description": event.get("DESCRIPTION", ""),
+        "url": event.get("URL", ""),
+    }
+
+
+def ical_rows(f):
+    """ Yields (line number, row) of VEVENTs of the iCalendar file. """
+
+    event = None
+    start = 0
+    for number, line in unfold(f):
+        name, _, value = line.partition(":")
+        name = name.split(";")[0].upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event, start = {}, number
+        elif name == "END" and value.upper() == "VEVENT":
+            if event is not None:
+                yield start, event_row(event)
+            event = None
+        elif event is not None:
+            event[name] = unescape(value)
+
+
+def file_rows(f, format):
+    if format == "ics":
+        return ical_rows(f)
+    return csv_rows(f)
+
+
+class Importer:
+    """ Imports timesheet rows as datepoints of the phase.
+
+    Tasks and workers are resolved through maps built once per import, so
+    rules of `DatePointCreateForm2` are checked without a query per row.
+    With a worker given, all rows belong to them and rows of other workers
+    are rejected. Valid rows are inserted in chunks within one transaction,
+    invalid rows are passed to `on_error` with their line and reason.
+    """
+
+    def __init__(self, projectphase, worker=None):
+        if not projectphase.ongoing:
+            raise ValueError(
+                f"{projectphase.title} has ended. Unable to import data."
+            )
+
+        self.projectphase = projectphase
+        self.worker = worker
+
+        # Tasks by title and id, None for titles shared by tasks.
+        self.tasks = {}
+        tasks = Task.objects.filter(project=projectphase)
+        for pk, title in tasks.values_list("id", "title"):
+            self.tasks[title] = None if title in self.tasks else (pk, title)
+            self.tasks[str(pk)] = (pk, title)
+
+        self.workers = dict(
+            projectphase.project.worker.values_list("username", "id")
+        )
+        if worker is not None and worker.username not in self.workers:
+            raise ValueError(
+                f"{worker.username} is not a worker of the project."
+            )
+
+        self.validate_url = URLValidator()
+
+    def resolve_worker(self, username):
+        if self.worker is not None:
+            if username and username != self.worker.username:
+                raise ValueError("Rows of other workers cannot be imported.")
+            return self.worker.id
+        if not username:
+            raise ValueError("Worker is missing.")
+        if username not in self.workers:
+            raise ValueError(f"{username} is not a worker of the project.")
+        return self.workers[username]
+
+    def build(self, row):
+        """ Returns unsaved datepoint of the row, raises ValueError. """
+
+        task = self.tasks.get((row.get("task") or "").strip(), False)
+        if task is None:
+            raise ValueError(f"Task {row['task']} is ambiguous, use its id.")
+        if task is False:
+            raise ValueError(f"Task {row.get('task')} is not in the phase.")
+        task_id, task_title = task
+
+        worker_id = self.resolve_worker((row.get("worker") or "").strip())
+
+        try:
+            worked_date = datetime.date.fromisoformat(row.get("date") or "")
+        except ValueError:
+            raise ValueError("Enter date in format Y-m-d.")
+
+        try:
+            worked_time = int(row.get("hours") or "")
+        except ValueError:
+            raise ValueError("Enter whole hours.")
+        if not MIN_HOURS <= worked_time <= MAX_HOURS:
+            raise ValueError(
+                f"Hours have to be between {MIN_HOURS} and {MAX_HOURS}."
+            )
+
+        title = row.get("title") or task_title
+        description = row.get("description") or ""
+        if len(title) > 100 or len(description) > 100:
+            raise ValueError(
+                "Title and description have at most 100 characters."
+            )
+
+        url = row.get("url") or ""
+        if url:
+            try:
+                self.validate_url(url)
+            except ValidationError:
+                raise ValueError("Enter a valid url.")
+
+        return DatePoint(
+            task_id=task_id,
+            worker_id=worker_id,
+            title=title,
+            description=description,
+            url=url,
+            worked_time=worked_time,
+            worked_date=worked_date,
+        )
+
+    def run(self, rows, on_error):
+        """ Imports (line number, row) pairs, returns number of datepoints. """
+
+        created = 0
+        keys = set()
+        batch = []
+
+        with transaction.atomic():
+            for number, row in rows:
+                try:
+                    datepoint = self.build(row)
+                except ValueError as error:
+                    on_error(number, str(error), row)
+                    continue
+
+                batch.append(datepoint)
+                keys.add(
+                    (
+                        datepoint.task_id,
+                        datepoint.worker_id,
+                        month_start(datepoint.worked_date),
+                    )
+                )
+                if len(batch) == settings.IMPORT_CHUNK_SIZE:
+                    created += writes.create(batch, refresh=False)
+                    batch = []
+
+            if batch:
+                created += writes.create(batch, refresh=False)
+
+            rollups.refresh(keys)
+
+        return created
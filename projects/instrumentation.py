@@ -0,0 +1,219 @@
+import collections
+import functools
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+# Collapses lists of placeholders, so `IN (%s, %s)` and `IN (%s)` match.
+PLACEHOLDERS_RE = re.compile(r"%s(?:\s*,\s*%s)+")
+
+# Number of duplicated query fingerprints kept per request.
+MAX_DUPLICATES = 5
+
+
+def fingerprint(sql):
+    return PLACEHOLDERS_RE.sub("%s", sql)
+
+
+class QueryRecorder:
+    """ Database execute wrapper counting queries and their time. """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.fingerprints = collections.Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return [
+            (sql, count)
+            for sql, count in self.fingerprints.most_common(MAX_DUPLICATES)
+            if count > 1
+        ]
+
+
+# Recording of the request handled by the current thread.
+current = threading.local()
+
+
+class Recording:
+    """ Queries and template render time of a request. """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = QueryRecorder()
+        self.render_time = 0.0
+        self.rendering = False
+
+    @contextmanager
+    def active(self):
+        """ Record queries and rendering of the current thread. """
+
+        previous = getattr(current, "recording", None)
+        current.recording = self
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.queries)
+                    )
+                yield
+        finally:
+            current.recording = previous
+
+    def sample(self):
+        return {
+            "total_ms": (time.perf_counter() - self.start) * 1000,
+            "queries": self.queries.count,
+            "sql_ms": self.queries.time * 1000,
+            "render_ms": self.render_time * 1000,
+            "duplicates": self.queries.duplicates(),
+        }
+
+
+def timed_render(render):
+    """ Wraps `Template.render` to add its time to the active recording.
+
+    Templates included or extended by a rendered template are timed only
+    as part of it.
+    """
+
+    @functools.wraps(render)
+    def wrapper(template, context):
+        recording = getattr(current, "recording", None)
+        if recording is None or recording.rendering:
+            return render(template, context)
+
+        recording.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            recording.render_time += time.perf_counter() - start
+            recording.rendering = False
+
+    wrapper.timed = True
+    return wrapper
+
+
+class RequestStats:
+    """ Bounded buffers of the latest request samples per url name. """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, sample):
+        with self.lock:
+            try:
+                buffer = self.samples[name]
+            except KeyError:
+                buffer = self.samples[name] = collections.deque(
+                    maxlen=self.size
+                )
+            buffer.append(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def report(self):
+        """ Returns percentiles of the samples of every url name. """
+
+        with self.lock:
+            samples = {
+                name: list(buffer) for name, buffer in self.samples.items()
+            }
+
+        report = {}
+        for name, items in samples.items():
+            duplicates = collections.Counter()
+            for item in items:
+                for sql, count in item["duplicates"]:
+                    duplicates[sql] = max(duplicates[sql], count)
+
+            report[name] = {
+                "requests": len(items),
+                "total_ms": percentiles(item["total_ms"] for item in items),
+                "queries": percentiles(item["queries"] for item in items),
+                "sql_ms": percentiles(item["sql_ms"] for item in items),
+                "render_ms": percentiles(item["render_ms"] for item in items),
+                "duplicates": [
+                    {"sql": sql, "count": count}
+                    for sql, count in duplicates.most_common(MAX_DUPLICATES)
+                ],
+            }
+        return report
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(percent):
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    return {"p50": at(50), "p90": at(90), "p99": at(99), "max": values[-1]}
+
+
+stats = RequestStats(settings.REQUEST_STATS_BUFFER_SIZE)
+
+
+class RequestStatsMiddleware:
+    """ Records queries, SQL time and render time of every request.
+
+    Queries are recorded with database execute wrappers, so it works with
+    `DEBUG = False`. Render time covers all templates rendered by Django
+    templates, also by `render()` and `render_to_string`. Streamed
+    responses are recorded until their content is consumed. Samples are
+    kept in `stats` under the url name.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if not getattr(Template.render, "timed", False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        recording = Recording()
+        with recording.active():
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, recording, response.streaming_content
+            )
+        else:
+            self.add(request, recording)
+
+        return response
+
+    def stream(self, request, recording, content):
+        """ Yields streamed content while recording its queries. """
+
+        try:
+            with recording.active():
+                yield from content
+        finally:
+            self.add(request, recording)
+
+    def add(self, request, recording):
+        match = getattr(request, "resolver_match", None)
+        if match is not None and match.url_name:
+            stats.add(match.url_name, recording.sample())
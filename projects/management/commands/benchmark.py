@@ -0,0 +1,207 @@
+import json
+import logging
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from projects.membership import Membership
+from projects.models import DatePoint
+from projects.urls import urlpatterns
+
+ROLES = ["Worker", "Manager", "Client"]
+
+
+def sample_user(role):
+    """ Returns user of the role with a logged datepoint in their project. """
+
+    for user in User.objects.filter(groups__name=role).order_by("id"):
+        membership = Membership(user)
+        queryset = DatePoint.objects.filter(
+            task__project__project_id__in=membership.project_ids
+        )
+        if role == "Worker":
+            queryset = queryset.filter(worker=user)
+
+        datepoint = queryset.select_related("task__project").first()
+        if datepoint is not None:
+            return user, datepoint
+
+    return None, None
+
+
+def handles_get(pattern):
+    """ Whether the view of the url pattern responds to GET requests.
+
+    Views that only accept POST would answer 405 and are not measured.
+    """
+
+    view_class = getattr(pattern.callback, "view_class", None)
+    if view_class is None:
+        return True
+    return "get" in view_class.http_method_names and hasattr(view_class, "get")
+
+
+def fetch(client, url):
+    """ Requests the url and reads the whole response.
+
+    Streamed content is generated while it is read, so it is consumed
+    before the request is considered finished. """
+
+    response = client.get(url)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def sample_kwargs(datepoint):
+    return {
+        "project_pk": datepoint.task.project.project_id,
+        "projectphase_pk": datepoint.task.project_id,
+        "task_pk": datepoint.task_id,
+        "datepoint_pk": datepoint.id,
+        "worker_pk": datepoint.worker_id,
+        "month": datepoint.worked_date.month,
+        "year": datepoint.worked_date.year,
+        "date": datepoint.worked_date.isoformat(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every url of the projects app as each role and writes "
+        "wall time, query count and peak memory per endpoint to json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of timed requests, median is reported.",
+        )
+        parser.add_argument(
+            "--compare", help="Report of an earlier run to compare with."
+        )
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Host header, has to be in ALLOWED_HOSTS.",
+        )
+
+    def handle(self, *args, **options):
+        # Denied requests are expected, do not log them.
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        results = []
+
+        for role in ROLES:
+            user, datepoint = sample_user(role)
+            if user is None:
+                self.stderr.write(f"No {role} with datepoints, skipping.")
+                continue
+
+            client = Client(HTTP_HOST=options["host"])
+            client.force_login(user)
+            kwargs = sample_kwargs(datepoint)
+
+            for pattern in urlpatterns:
+                if not handles_get(pattern):
+                    continue
+                url = reverse(
+                    pattern.name,
+                    kwargs={
+                        name: kwargs[name]
+                        for name in pattern.pattern.converters
+                    },
+                )
+                try:
+                    result = self.measure(client, url, options["repeat"])
+                except Exception as error:
+                    self.stderr.write(f"{role} {pattern.name}: {error!r}")
+                    continue
+                result.update({"role": role, "name": pattern.name})
+                results.append(result)
+
+                self.stdout.write(
+                    f"{role:8} {pattern.name:32} {result['status']} "
+                    f"{result['time_ms']:9.1f} ms "
+                    f"{result['queries']:5} queries "
+                    f"{result['peak_memory_kb']:9.1f} KiB"
+                )
+
+        report = {"commit": git_commit(), "results": results}
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {options['output']}.")
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def measure(self, client, url, repeat):
+        # Warm up caches and count queries. Log of queries is limited,
+        # so it is emptied first.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = fetch(client, url)
+
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fetch(client, url)
+            times.append((time.perf_counter() - start) * 1000)
+
+        # Memory is traced in a separate request, tracing slows it down.
+        tracemalloc.start()
+        fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "url": url,
+            "status": response.status_code,
+            "time_ms": statistics.median(times) if times else 0.0,
+            "queries": len(queries),
+            "peak_memory_kb": peak / 1024,
+        }
+
+    def compare(self, path, results):
+        try:
+            with open(path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Cannot read {path}: {error}")
+
+        before = {
+            (item["role"], item["name"]): item for item in previous["results"]
+        }
+
+        self.stdout.write(f"Compared with {previous.get('commit')}:")
+        for result in results:
+            item = before.get((result["role"], result["name"]))
+            if item is None:
+                continue
+            self.stdout.write(
+                f"{result['role']:8} {result['name']:32} "
+                f"{result['time_ms'] - item['time_ms']:+9.1f} ms "
+                f"{result['queries'] - item['queries']:+5} queries "
+                f"{result['peak_memory_kb'] - item['peak_memory_kb']:+9.1f} "
+                f"KiB"
+            )
@@ -0,0 +1,178 @@
+import datetime
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+from django.db.utils import OperationalError
+from django.test.utils import override_settings
+
+from projects import approvals, rollups
+from projects.models import DatePoint, HoursRollup, Task
+
+# Title of datepoints written by the benchmark, they are deleted at the end.
+TITLE = "concurrencybenchmark"
+
+# Pragmas of a connection opened by Django without the tuning layer.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "delete",
+    "synchronous": "full",
+    "mmap_size": 0,
+    "cache_size": -2000,
+    "busy_timeout": 5000,
+    "temp_store": "default",
+}
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Inserts and approves datepoints in writer threads while reader "
+        "threads read reports, first with default SQLite pragmas, then with "
+        "SQLITE_PRAGMAS, and reports throughput of both runs. Datepoints "
+        "written by the benchmark are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument(
+            "--seconds", type=float, default=5, help="Duration of each run."
+        )
+        parser.add_argument(
+            "--approvals",
+            type=float,
+            default=0.2,
+            help="Share of writes approving instead of inserting.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Database is not SQLite.")
+
+        # Tasks of ongoing phases with workers who can log time in them.
+        targets = list(
+            Task.objects.filter(
+                project__ongoing=True,
+                project__project__worker__isnull=False,
+            ).values_list("id", "project_id", "project__project__worker")[:50]
+        )
+        if not targets:
+            raise CommandError("No ongoing phase with workers, seed data.")
+
+        try:
+            for name, pragmas in (
+                ("default", DEFAULT_PRAGMAS),
+                ("tuned", settings.SQLITE_PRAGMAS),
+            ):
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    counts, elapsed = self.run(targets, options)
+                self.report(name, counts, elapsed)
+        finally:
+            connections.close_all()
+            self.clean_up()
+
+    def run(self, targets, options):
+        # Journal mode can only change without other connections, so it is
+        # set by this connection before the threads connect.
+        connections.close_all()
+        connection.ensure_connection()
+
+        counter = Counter()
+        stop = time.perf_counter() + options["seconds"]
+        threads = [
+            threading.Thread(
+                target=self.write,
+                args=(targets, options["approvals"], stop, counter),
+            )
+            for _ in range(options["writers"])
+        ] + [
+            threading.Thread(target=self.read, args=(targets, stop, counter))
+            for _ in range(options["readers"])
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counter.counts, time.perf_counter() - start
+
+    def write(self, targets, approval_share, stop, counter):
+        try:
+            while time.perf_counter() < stop:
+                task_id, projectphase_id, worker_id = random.choice(targets)
+                try:
+                    if random.random() < approval_share:
+                        approvals.set_approval(
+                            DatePoint.objects.filter(
+                                title=TITLE,
+                                task_id=task_id,
+                                worker_id=worker_id,
+                            ),
+                            "approved_manager",
+                            random.random() < 0.5,
+                        )
+                        counter.add("approvals")
+                    else:
+                        DatePoint.objects.create(
+                            task_id=task_id,
+                            worker_id=worker_id,
+                            title=TITLE,
+                            worked_time=random.randint(1, 8),
+                            worked_date=datetime.date.today()
+                            - datetime.timedelta(days=random.randint(0, 60)),
+                        )
+                        counter.add("inserts")
+                except OperationalError:
+                    counter.add("locked")
+        finally:
+            connection.close()
+
+    def read(self, targets, stop, counter):
+        try:
+            while time.perf_counter() < stop:
+                task_id, projectphase_id, worker_id = random.choice(targets)
+                try:
+                    HoursRollup.objects.filter(
+                        projectphase_id=projectphase_id
+                    ).aggregate(Sum("hours"), Sum("hours_approved"))
+                    list(
+                        DatePoint.objects.filter(task_id=task_id).order_by(
+                            "-worked_date", "-id"
+                        )[:100]
+                    )
+                    counter.add("reads")
+                except OperationalError:
+                    counter.add("locked")
+        finally:
+            connection.close()
+
+    def report(self, name, counts, elapsed):
+        self.stdout.write(
+            f"{name:8} "
+            + " ".join(
+                f"{key} {counts.get(key, 0) / elapsed:8.1f}/s"
+                for key in ("inserts", "approvals", "reads")
+            )
+            + f" locked {counts.get('locked', 0)}"
+        )
+
+    def clean_up(self):
+        queryset = DatePoint.objects.filter(title=TITLE)
+        keys = rollups.datepoint_keys(queryset)
+        # Skip signals sent per row, rollups are refreshed once below.
+        queryset._raw_delete(queryset.db)
+        rollups.refresh(keys)
@@ -0,0 +1,89 @@
+import csv
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import imports
+from projects.models import ProjectPhase
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports datepoints of the phase from a csv file or VEVENTs of an "
+        "iCalendar file. Rows which cannot be imported are reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--projectphase", type=int, required=True)
+        parser.add_argument(
+            "--worker",
+            help="Username of the worker all rows belong to. Required for "
+            "iCalendar files.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ics"],
+            help="Format of the file, by default from its extension.",
+        )
+        parser.add_argument(
+            "--errors", help="Csv file of rejected rows, stderr by default."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            projectphase = ProjectPhase.objects.select_related("project").get(
+                id=options["projectphase"]
+            )
+        except ProjectPhase.DoesNotExist:
+            raise CommandError("Phase does not exist.")
+
+        worker = None
+        if options["worker"]:
+            try:
+                worker = User.objects.get(username=options["worker"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['worker']} does not exist.")
+
+        format = options["format"]
+        if format is None:
+            extension = os.path.splitext(options["path"])[1].lower()
+            format = "ics" if extension in (".ics", ".ical") else "csv"
+
+        try:
+            importer = imports.Importer(projectphase, worker)
+        except ValueError as error:
+            raise CommandError(error)
+
+        errors_file = None
+        if options["errors"]:
+            errors_file = open(options["errors"], "w", newline="")
+            writer = csv.writer(errors_file)
+            writer.writerow(["line", "error"] + imports.HEADER)
+
+        rejected = 0
+
+        def on_error(number, message, row):
+            nonlocal rejected
+            rejected += 1
+            if errors_file is None:
+                self.stderr.write(f"Line {number}: {message}")
+            else:
+                writer.writerow(
+                    [number, message]
+                    + [row.get(name, "") for name in imports.HEADER]
+                )
+
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as f:
+                created = importer.run(imports.file_rows(f, format), on_error)
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if errors_file is not None:
+                errors_file.close()
+
+        self.stdout.write(
+            f"Imported {created} datepoints, rejected {rejected} rows."
+        )
@@ -0,0 +1,48 @@
+import csv
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import payroll
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes approved hours and pay of all workers per month and "
+        "project as csv. Defaults to the year to date."
+    )
+
+    def add_arguments(self, parser):
+        today = datetime.date.today()
+        parser.add_argument(
+            "--start", default=f"{today:%Y}-01", help="First month, Y-m."
+        )
+        parser.add_argument(
+            "--end", default=f"{today:%Y-%m}", help="Last month, Y-m."
+        )
+        parser.add_argument("--output", help="File, stdout by default.")
+
+    def handle(self, *args, **options):
+        try:
+            start = payroll.parse_month(options["start"])
+            end = payroll.parse_month(options["end"])
+        except ValueError as error:
+            raise CommandError(error)
+        if start > end:
+            raise CommandError("Start has to be before end.")
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                count = self.write(f, start, end)
+            self.stderr.write(f"Wrote {count} rows to {options['output']}.")
+        else:
+            self.write(self.stdout, start, end)
+
+    def write(self, f, start, end):
+        writer = csv.writer(f)
+        writer.writerow(payroll.HEADER)
+        count = 0
+        for row in payroll.payroll_rows(start, end):
+            writer.writerow(row)
+            count += 1
+        return count
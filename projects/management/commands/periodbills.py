@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import bills
+from projects.models import Project
+from projects.payroll import parse_month
+
+
+class Command(BaseCommand):
+    help = "Writes ZIP with bills of all projects for a range of months."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", required=True, help="First month, Y-m.")
+        parser.add_argument("--end", required=True, help="Last month, Y-m.")
+        parser.add_argument("--output", default="bills.zip")
+        parser.add_argument(
+            "--threads",
+            type=int,
+            help="Number of rendering threads, BILL_THREADS by default.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_month(options["start"])
+            end = parse_month(options["end"])
+        except ValueError as error:
+            raise CommandError(error)
+        if start > end:
+            raise CommandError("Start has to be before end.")
+
+        archive, count, errors = bills.period_bills(
+            start, end, Project.objects.all(), options["threads"]
+        )
+
+        with open(options["output"], "wb") as f:
+            f.write(archive)
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(f"Wrote {count} bills to {options['output']}.")
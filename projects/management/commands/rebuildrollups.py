@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from projects import rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes worked hours rollup table from all datepoints."
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(f"Rebuilt {count} rollup rows.")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects import bills
+
+
+class Command(BaseCommand):
+    help = "Renders queued bills."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait for new jobs when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            while bills.process_next_job():
+                pass
+
+            if options["once"]:
+                return
+
+            time.sleep(options["interval"])
@@ -0,0 +1,205 @@
+import datetime
+import io
+import random
+from contextlib import redirect_stdout
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects import rollups
+from projects.models import (
+    ClientDetail,
+    DatePoint,
+    Project,
+    ProjectPhase,
+    Task,
+)
+from users.models import Profile
+
+# Number of datepoints generated and inserted at once.
+CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = "Seeds the database with synthetic projects and datepoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=10)
+        parser.add_argument("--managers", type=int, default=5)
+        parser.add_argument("--workers", type=int, default=50)
+        parser.add_argument("--projects", type=int, default=20)
+        parser.add_argument(
+            "--phases", type=int, default=3, help="Phases per project."
+        )
+        parser.add_argument(
+            "--tasks", type=int, default=5, help="Tasks per phase."
+        )
+        parser.add_argument(
+            "--workers-per-project", type=int, default=10, dest="team"
+        )
+        parser.add_argument("--datepoints", type=int, default=100000)
+        parser.add_argument(
+            "--years",
+            type=int,
+            default=2,
+            help="Datepoints are spread over this many last years.",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix of usernames and titles of created objects.",
+        )
+        parser.add_argument(
+            "--password", default="qazxcdews", help="Password of all users."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        prefix = options["prefix"]
+
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(
+                f"Users with prefix '{prefix}' exist, choose other --prefix."
+            )
+
+        if Group.objects.filter(
+            name__in=["Worker", "Manager", "Client"]
+        ).count() != 3:
+            with redirect_stdout(io.StringIO()):
+                call_command("createroles")
+
+        password = make_password(options["password"])
+
+        clients = self.create_users(
+            f"{prefix}_client", options["clients"], "Client", password
+        )
+        managers = self.create_users(
+            f"{prefix}_manager", options["managers"], "Manager", password
+        )
+        workers = self.create_users(
+            f"{prefix}_worker", options["workers"], "Worker", password
+        )
+        self.stdout.write(
+            f"Created {len(clients)} clients, {len(managers)} managers "
+            f"and {len(workers)} workers."
+        )
+
+        tasks = self.create_projects(options, clients, managers, workers)
+        self.stdout.write(f"Created {options['projects']} projects.")
+
+        count = self.create_datepoints(options, tasks)
+        self.stdout.write(f"Created {count} datepoints.")
+
+        count = rollups.rebuild()
+        self.stdout.write(f"Rebuilt {count} rollup rows.")
+
+    def create_users(self, prefix, count, group_name, password):
+        User.objects.bulk_create(
+            User(username=f"{prefix}{i}", password=password)
+            for i in range(count)
+        )
+        users = list(
+            User.objects.filter(username__startswith=prefix).order_by("id")
+        )
+
+        group = Group.objects.get(name=group_name)
+        User.groups.through.objects.bulk_create(
+            User.groups.through(user_id=user.id, group_id=group.id)
+            for user in users
+        )
+
+        # Profiles are otherwise created by post_save of the user.
+        Profile.objects.bulk_create(
+            Profile(
+                user=user,
+                price_per_hour=random.randint(20, 100)
+                if group_name == "Worker"
+                else None,
+            )
+            for user in users
+        )
+        return users
+
+    @transaction.atomic
+    def create_projects(self, options, clients, managers, workers):
+        """ Returns list of (task, workers of its project) pairs. """
+
+        tasks = []
+
+        for i in range(options["projects"]):
+            client = random.choice(clients) if clients else None
+
+            client_detail = None
+            if client is not None:
+                client_detail = ClientDetail.objects.create(
+                    name=client.username,
+                    street="Street 1",
+                    postal_code="00-000",
+                    city="Warszawa",
+                    nip=f"{i:010d}",
+                )
+
+            project = Project.objects.create(
+                title=f"{options['prefix']} project {i}",
+                description="Synthetic project.",
+                manager=random.choice(managers) if managers else None,
+                price_per_hour=random.randint(50, 200),
+                client_detail=client_detail,
+            )
+
+            team = random.sample(workers, min(options["team"], len(workers)))
+            project.worker.add(*team)
+            # Some projects are approved by manager only.
+            if client is not None and random.random() < 0.8:
+                project.client.add(client)
+
+            for j in range(options["phases"]):
+                projectphase = ProjectPhase.objects.create(
+                    title=f"Phase {j}", project=project
+                )
+                for k in range(options["tasks"]):
+                    task = Task.objects.create(
+                        title=f"Task {k}", project=projectphase
+                    )
+                    tasks.append((task, team))
+
+        return tasks
+
+    def create_datepoints(self, options, tasks):
+        if not tasks:
+            return 0
+
+        today = datetime.date.today()
+        days = 365 * options["years"]
+
+        count = created = 0
+        while count < options["datepoints"]:
+            size = min(CHUNK_SIZE, options["datepoints"] - count)
+            batch = []
+            for _ in range(size):
+                task, team = random.choice(tasks)
+                if not team:
+                    continue
+                approved_manager = random.random() < 0.7
+                batch.append(
+                    DatePoint(
+                        task_id=task.id,
+                        worker_id=random.choice(team).id,
+                        title="Work",
+                        worked_time=random.randint(1, 8),
+                        worked_date=today
+                        - datetime.timedelta(days=random.randrange(days)),
+                        approved_manager=approved_manager,
+                        approved_client=approved_manager
+                        and random.random() < 0.8,
+                    )
+                )
+            DatePoint.objects.bulk_create(batch)
+            count += size
+            created += len(batch)
+
+        return created
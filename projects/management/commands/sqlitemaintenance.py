@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from projects import sqlite
+
+
+def size(value):
+    return f"{value / 1024 / 1024:9.2f} MiB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates statistics of the SQLite query planner and reports sizes "
+        "of the database, its tables and indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Rebuild the file to reclaim free pages. Blocks all writes.",
+        )
+        parser.add_argument(
+            "--report-only",
+            action="store_true",
+            help="Only report sizes, do not run any maintenance.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("Database is not SQLite.")
+
+        if not options["report_only"]:
+            sqlite.maintain(connection, vacuum=options["vacuum"])
+            done = "ANALYZE, VACUUM" if options["vacuum"] else "ANALYZE"
+            self.stdout.write(f"Ran {done} and PRAGMA optimize.")
+
+        pragmas = sqlite.get_pragmas(
+            connection, list(settings.SQLITE_PRAGMAS) + ["freelist_count"]
+        )
+        self.stdout.write(
+            ", ".join(f"{name}={value}" for name, value in pragmas.items())
+        )
+
+        files = sqlite.file_sizes(connection)
+        self.stdout.write(f"{size(files['database'])}  file   database")
+        self.stdout.write(f"{size(files['wal'])}  file   wal")
+
+        objects = sqlite.object_sizes(connection)
+        if objects is None:
+            self.stderr.write("SQLite was built without dbstat, no sizes.")
+            return
+        for name, kind, table, pgsize in objects:
+            self.stdout.write(f"{size(pgsize)}  {kind:6} {table:24} {name}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes snapshots of closed phases from their datepoints and "
+        "reports every difference. Fails if any snapshot has drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "projectphases",
+            nargs="*",
+            type=int,
+            help="Ids of phases to verify, all closed phases by default.",
+        )
+
+    def handle(self, *args, **options):
+        drift = 0
+        for message in snapshots.verify(options["projectphases"] or None):
+            self.stdout.write(message)
+            drift += 1
+
+        if drift:
+            raise CommandError(f"Found {drift} differences in snapshots.")
+        self.stdout.write("Snapshots match their datepoints.")
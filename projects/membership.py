@@ -0,0 +1,124 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Project, ProjectPhase, Task
+from .routers import primary
+
+# Cache key of the global membership version. Bumping it invalidates
+# memberships of all users at once, in every process sharing the cache.
+VERSION_KEY = "membership:version"
+
+
+def get_version():
+    """ Returns current version of cached memberships.
+
+    Versions are random, so a version evicted from the cache is never
+    reused and memberships cached under it are not served again.
+    """
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """ Invalidate cached memberships of all users. """
+
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class Membership:
+    """ Role of the user and ids of the objects user belongs to.
+
+    Worker belongs to projects they are assigned to, manager to projects
+    they manage and client to projects they are a client of. The data is
+    built with a few queries and kept in the cache until relations of any
+    project change.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+        data = None
+        if user.is_authenticated:
+            key = f"membership:{get_version()}:{user.id}"
+            data = cache.get(key)
+            if data is None:
+                # Memberships cached from the replica could outlive their
+                # invalidation, they are always built from the primary.
+                with primary():
+                    data = self.build(user)
+                cache.set(key, data, settings.MEMBERSHIP_CACHE_TIMEOUT)
+
+        if data is None:
+            data = {
+                "role": None,
+                "project_ids": frozenset(),
+                "projectphase_ids": frozenset(),
+                "task_ids": frozenset(),
+            }
+
+        self.role = data["role"]
+        self.project_ids = data["project_ids"]
+        self.projectphase_ids = data["projectphase_ids"]
+        self.task_ids = data["task_ids"]
+
+    @staticmethod
+    def build(user):
+        role = user.groups.values_list("name", flat=True).first()
+
+        if role == "Worker":
+            projects = Project.objects.filter(worker=user)
+        elif role == "Manager":
+            projects = Project.objects.filter(manager=user)
+        elif role == "Client":
+            projects = Project.objects.filter(client=user)
+        else:
+            projects = Project.objects.none()
+
+        project_ids = frozenset(projects.values_list("id", flat=True))
+        projectphase_ids = frozenset(
+            ProjectPhase.objects.filter(
+                project_id__in=project_ids
+            ).values_list("id", flat=True)
+        )
+        task_ids = frozenset(
+            Task.objects.filter(project_id__in=projectphase_ids).values_list(
+                "id", flat=True
+            )
+        )
+
+        return {
+            "role": role,
+            "project_ids": project_ids,
+            "projectphase_ids": projectphase_ids,
+            "task_ids": task_ids,
+        }
+
+    def has_project(self, project_pk):
+        return int(project_pk) in self.project_ids
+
+    def has_projectphase(self, projectphase_pk):
+        return int(projectphase_pk) in self.projectphase_ids
+
+    def has_task(self, task_pk):
+        return int(task_pk) in self.task_ids
+
+    def has_datepoint(self, datepoint):
+        """ Checks the loaded datepoint, through the task it belongs to. """
+
+        return datepoint.task_id in self.task_ids
+
+
+def get_membership(request):
+    """ Returns membership of the current user, resolved once per request. """
+
+    try:
+        return request._membership
+    except AttributeError:
+        request._membership = Membership(request.user)
+        return request._membership
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_rollups(apps, schema_editor):
+    DatePoint = apps.get_model("projects", "DatePoint")
+    HoursRollup = apps.get_model("projects", "HoursRollup")
+
+    rows = {}
+    for datepoint in DatePoint.objects.select_related("task").iterator():
+        key = (
+            datepoint.task_id,
+            datepoint.worker_id,
+            datepoint.worked_date.replace(day=1),
+        )
+        if key not in rows:
+            rows[key] = HoursRollup(
+                projectphase_id=datepoint.task.project_id,
+                task_id=key[0],
+                worker_id=key[1],
+                month=key[2],
+            )
+        row = rows[key]
+        row.hours += datepoint.worked_time
+        if datepoint.approved_manager:
+            row.hours_manager += datepoint.worked_time
+        if datepoint.approved_client:
+            row.hours_client += datepoint.worked_time
+        if datepoint.approved_manager and datepoint.approved_client:
+            row.hours_approved += datepoint.worked_time
+
+    HoursRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoursRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('hours', models.PositiveIntegerField(default=0)),
+                ('hours_manager', models.PositiveIntegerField(default=0)),
+                ('hours_client', models.PositiveIntegerField(default=0)),
+                ('hours_approved', models.PositiveIntegerField(default=0)),
+                ('projectphase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.ProjectPhase')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.Task')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('task', 'worker', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_hoursrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='projectphase',
+            name='dates',
+        ),
+        migrations.AddIndex(
+            model_name='hoursrollup',
+            index=models.Index(fields=['projectphase', 'month'], name='projects_ho_project_afcecd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hoursrollup',
+            index=models.Index(fields=['worker', 'month'], name='projects_ho_worker__b25054_idx'),
+        ),
+    ]
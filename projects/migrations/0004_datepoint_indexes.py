@@ -0,0 +1,37 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_month_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='datepoint',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='projects.Task'),
+        ),
+        migrations.AlterField(
+            model_name='datepoint',
+            name='worker',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['task', 'worked_date'], name='projects_da_task_id_01b05b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['task', 'worker', 'worked_date'], name='projects_da_task_id_c069ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['worker', 'worked_date'], name='projects_da_worker__a72d45_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_datepoint_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('context', models.TextField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='projects.Project')),
+                ('projectphase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='projects.ProjectPhase')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='billjob',
+            index=models.Index(fields=['status', 'date_created'], name='projects_bi_status_2cce40_idx'),
+        ),
+    ]
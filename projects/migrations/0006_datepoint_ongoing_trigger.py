@@ -0,0 +1,104 @@
+from django.db import migrations
+
+# SQLite drops the triggers when a migration rebuilds the datepoint table,
+# such migrations have to create them again.
+
+# Task of the datepoint belongs to an ongoing phase.
+SQLITE_ONGOING = """
+EXISTS (
+    SELECT 1 FROM projects_task AS t
+    JOIN projects_projectphase AS p ON p.id = t.project_id
+    WHERE t.id = {row}.task_id AND p.ongoing
+)
+"""
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER projects_datepoint_ongoing_insert
+    BEFORE INSERT ON projects_datepoint
+    WHEN NOT {SQLITE_ONGOING.format(row="NEW")}
+    BEGIN
+        SELECT RAISE(ABORT, 'Phase of the task has ended.');
+    END
+    """,
+    f"""
+    CREATE TRIGGER projects_datepoint_ongoing_update
+    BEFORE UPDATE ON projects_datepoint
+    WHEN NOT {SQLITE_ONGOING.format(row="NEW")}
+        OR NOT {SQLITE_ONGOING.format(row="OLD")}
+    BEGIN
+        SELECT RAISE(ABORT, 'Phase of the task has ended.');
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_datepoint_ongoing_insert",
+    "DROP TRIGGER IF EXISTS projects_datepoint_ongoing_update",
+]
+
+# The phase row is locked for share, so a phase cannot end while a datepoint
+# is being written and a datepoint written after the end sees it ended.
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION projects_datepoint_check_ongoing() RETURNS trigger AS $$
+    BEGIN
+        PERFORM 1 FROM projects_projectphase AS p
+        JOIN projects_task AS t ON t.project_id = p.id
+        WHERE t.id = NEW.task_id AND p.ongoing
+        FOR SHARE OF p;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Phase of the task has ended.'
+                USING ERRCODE = 'check_violation';
+        END IF;
+
+        IF TG_OP = 'UPDATE' AND OLD.task_id <> NEW.task_id THEN
+            PERFORM 1 FROM projects_projectphase AS p
+            JOIN projects_task AS t ON t.project_id = p.id
+            WHERE t.id = OLD.task_id AND p.ongoing
+            FOR SHARE OF p;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Phase of the task has ended.'
+                    USING ERRCODE = 'check_violation';
+            END IF;
+        END IF;
+
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_datepoint_ongoing
+    BEFORE INSERT OR UPDATE ON projects_datepoint
+    FOR EACH ROW EXECUTE PROCEDURE projects_datepoint_check_ongoing()
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_datepoint_ongoing ON projects_datepoint",
+    "DROP FUNCTION IF EXISTS projects_datepoint_check_ongoing()",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        # Other databases rely on the checks of `projects.writes`.
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("projects", "0005_billjob")]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            run(
+                {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}
+            ),
+        )
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_closed_phases(apps, schema_editor):
+    HoursRollup = apps.get_model("projects", "HoursRollup")
+    HoursSnapshot = apps.get_model("projects", "HoursSnapshot")
+
+    # Rollups of closed phases are current, their datepoints cannot change.
+    rows = HoursRollup.objects.filter(projectphase__ongoing=False).values(
+        "projectphase_id",
+        "task_id",
+        "worker_id",
+        "month",
+        "hours",
+        "hours_manager",
+        "hours_client",
+        "hours_approved",
+    )
+    HoursSnapshot.objects.bulk_create(
+        (HoursSnapshot(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0006_datepoint_ongoing_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoursSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('hours', models.PositiveIntegerField(default=0)),
+                ('hours_manager', models.PositiveIntegerField(default=0)),
+                ('hours_client', models.PositiveIntegerField(default=0)),
+                ('hours_approved', models.PositiveIntegerField(default=0)),
+                ('projectphase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.ProjectPhase')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.Task')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hourssnapshot',
+            index=models.Index(fields=['projectphase', 'month'], name='projects_ho_project_f08058_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourssnapshot',
+            unique_together={('task', 'worker', 'month')},
+        ),
+        migrations.RunPython(
+            snapshot_closed_phases, migrations.RunPython.noop
+        ),
+    ]
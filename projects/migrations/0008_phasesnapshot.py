@@ -0,0 +1,140 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+import django.db.models.deletion
+
+# SQLite drops the triggers when a migration rebuilds the snapshot tables,
+# such migrations have to create them again.
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER {table}_immutable
+    BEFORE UPDATE ON {table}
+    BEGIN
+        SELECT RAISE(ABORT, 'Snapshots cannot be changed.');
+    END
+    """
+    for table in ("projects_phasesnapshot", "projects_hourssnapshot")
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_phasesnapshot_immutable",
+    "DROP TRIGGER IF EXISTS projects_hourssnapshot_immutable",
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION projects_snapshot_immutable() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'Snapshots cannot be changed.'
+            USING ERRCODE = 'check_violation';
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    f"""
+    CREATE TRIGGER {table}_immutable
+    BEFORE UPDATE ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE projects_snapshot_immutable()
+    """
+    for table in ("projects_phasesnapshot", "projects_hourssnapshot")
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_phasesnapshot_immutable "
+    "ON projects_phasesnapshot",
+    "DROP TRIGGER IF EXISTS projects_hourssnapshot_immutable "
+    "ON projects_hourssnapshot",
+    "DROP FUNCTION IF EXISTS projects_snapshot_immutable()",
+]
+
+
+def fill_snapshots(apps, schema_editor):
+    HoursSnapshot = apps.get_model("projects", "HoursSnapshot")
+    PhaseSnapshot = apps.get_model("projects", "PhaseSnapshot")
+    ProjectPhase = apps.get_model("projects", "ProjectPhase")
+    Profile = apps.get_model("users", "Profile")
+
+    HoursSnapshot.objects.update(
+        price_per_hour=Subquery(
+            Profile.objects.filter(user_id=OuterRef("worker_id")).values(
+                "price_per_hour"
+            )[:1]
+        )
+    )
+
+    snapshots = []
+    for projectphase in ProjectPhase.objects.filter(
+        ongoing=False
+    ).select_related("project"):
+        totals = HoursSnapshot.objects.filter(
+            projectphase=projectphase
+        ).aggregate(hours=Sum("hours"), hours_approved=Sum("hours_approved"))
+        price_per_hour = projectphase.project.price_per_hour
+        hours_approved = totals["hours_approved"] or 0
+        snapshots.append(
+            PhaseSnapshot(
+                projectphase=projectphase,
+                has_client=projectphase.project.client.exists(),
+                price_per_hour=price_per_hour,
+                hours=totals["hours"] or 0,
+                hours_approved=hours_approved,
+                amount=None
+                if price_per_hour is None
+                else hours_approved * price_per_hour,
+            )
+        )
+    PhaseSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_hourssnapshot'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('has_client', models.BooleanField()),
+                ('price_per_hour', models.PositiveIntegerField(null=True)),
+                ('hours', models.PositiveIntegerField(default=0)),
+                ('hours_approved', models.PositiveIntegerField(default=0)),
+                ('amount', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='hourssnapshot',
+            name='price_per_hour',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='hourssnapshot',
+            index=models.Index(fields=['worker', 'month'], name='projects_ho_worker__6d35f9_idx'),
+        ),
+        migrations.AddField(
+            model_name='phasesnapshot',
+            name='projectphase',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='projects.ProjectPhase'),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            run(
+                {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}
+            ),
+        ),
+    ]
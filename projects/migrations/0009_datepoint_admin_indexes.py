@@ -0,0 +1,25 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_phasesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['worked_date'], name='projects_da_worked__9dcd12_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['approved_manager', 'worked_date'], name='projects_da_approve_8c2109_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datepoint',
+            index=models.Index(fields=['approved_client', 'worked_date'], name='projects_da_approve_6740f0_idx'),
+        ),
+    ]
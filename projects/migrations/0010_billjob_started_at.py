@@ -0,0 +1,18 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_datepoint_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
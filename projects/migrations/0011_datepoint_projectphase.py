@@ -0,0 +1,157 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:42
+
+import importlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+ongoing_trigger = importlib.import_module(
+    "projects.migrations.0006_datepoint_ongoing_trigger"
+)
+
+# SQLite drops the triggers when a migration rebuilds the datepoint table,
+# such migrations have to create them again.
+
+# Phase of the task of the datepoint.
+PROJECTPHASE = """
+(SELECT project_id FROM projects_task WHERE id = {row}.task_id)
+"""
+
+BACKFILL = f"""
+UPDATE projects_datepoint
+SET projectphase_id = {PROJECTPHASE.format(row="projects_datepoint")}
+"""
+
+# Datepoints written with any phase, usually none, get the phase of their
+# task right after the write. Updates of other columns, e.g. approvals,
+# do not fire the triggers.
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER projects_datepoint_projectphase_insert
+    AFTER INSERT ON projects_datepoint
+    WHEN NEW.projectphase_id IS NOT {PROJECTPHASE.format(row="NEW")}
+    BEGIN
+        UPDATE projects_datepoint
+        SET projectphase_id = {PROJECTPHASE.format(row="NEW")}
+        WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER projects_datepoint_projectphase_update
+    AFTER UPDATE OF task_id, projectphase_id ON projects_datepoint
+    WHEN NEW.projectphase_id IS NOT {PROJECTPHASE.format(row="NEW")}
+    BEGIN
+        UPDATE projects_datepoint
+        SET projectphase_id = {PROJECTPHASE.format(row="NEW")}
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER projects_task_projectphase_update
+    AFTER UPDATE OF project_id ON projects_task
+    WHEN NEW.project_id IS NOT OLD.project_id
+    BEGIN
+        UPDATE projects_datepoint
+        SET projectphase_id = NEW.project_id
+        WHERE task_id = NEW.id;
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_datepoint_projectphase_insert",
+    "DROP TRIGGER IF EXISTS projects_datepoint_projectphase_update",
+    "DROP TRIGGER IF EXISTS projects_task_projectphase_update",
+]
+
+# Datepoints of ended phases cannot be updated, their phase is filled in
+# with the check of migration 0006 disabled.
+POSTGRESQL_FORWARD = [
+    "ALTER TABLE projects_datepoint "
+    "DISABLE TRIGGER projects_datepoint_ongoing",
+    BACKFILL,
+    "ALTER TABLE projects_datepoint "
+    "ENABLE TRIGGER projects_datepoint_ongoing",
+    """
+    CREATE FUNCTION projects_datepoint_set_projectphase() RETURNS trigger AS $$
+    BEGIN
+        SELECT project_id INTO NEW.projectphase_id FROM projects_task
+        WHERE id = NEW.task_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_datepoint_projectphase
+    BEFORE INSERT OR UPDATE OF task_id, projectphase_id
+    ON projects_datepoint
+    FOR EACH ROW EXECUTE PROCEDURE projects_datepoint_set_projectphase()
+    """,
+    """
+    CREATE FUNCTION projects_task_move_datepoints() RETURNS trigger AS $$
+    BEGIN
+        UPDATE projects_datepoint SET projectphase_id = NEW.project_id
+        WHERE task_id = NEW.id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_task_projectphase
+    AFTER UPDATE OF project_id ON projects_task
+    FOR EACH ROW WHEN (NEW.project_id IS DISTINCT FROM OLD.project_id)
+    EXECUTE PROCEDURE projects_task_move_datepoints()
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS projects_task_projectphase ON projects_task",
+    "DROP FUNCTION IF EXISTS projects_task_move_datepoints()",
+    "DROP TRIGGER IF EXISTS projects_datepoint_projectphase "
+    "ON projects_datepoint",
+    "DROP FUNCTION IF EXISTS projects_datepoint_set_projectphase()",
+]
+
+# The table is rebuilt without triggers, it is filled in before the checks
+# of ended phases are created again.
+SQLITE_REBUILT = [BACKFILL] + ongoing_trigger.SQLITE_FORWARD + SQLITE_FORWARD
+
+# Removing the column rebuilds the table again.
+SQLITE_REMOVED = ongoing_trigger.SQLITE_FORWARD
+
+run = ongoing_trigger.run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("projects", "0010_billjob_started_at")]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, run({"sqlite": SQLITE_REMOVED})
+        ),
+        migrations.AddField(
+            model_name="datepoint",
+            name="projectphase",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="projects.ProjectPhase",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="datepoint",
+            index=models.Index(
+                fields=["projectphase", "worked_date", "id"],
+                name="projects_da_project_3e14ac_idx",
+            ),
+        ),
+        migrations.RunPython(
+            run({"sqlite": SQLITE_REBUILT, "postgresql": POSTGRESQL_FORWARD}),
+            run(
+                {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}
+            ),
+        ),
+    ]
@@ -1,6 +1,26 @@
+import functools
+
 from django.contrib.auth.mixins import UserPassesTestMixin
 
-from .models import Project, Task, DatePoint, ProjectPhase
+from .membership import get_membership
+from .models import DatePoint
+from .routers import replica
+
+
+def url_datepoint(view):
+    """ Returns datepoint of the url of the view, None if there is none.
+
+    Datepoint is loaded once per request, by the permission check, and
+    reused by the view.
+    """
+
+    try:
+        return view._datepoint
+    except AttributeError:
+        view._datepoint = DatePoint.objects.filter(
+            id=view.kwargs["datepoint_pk"]
+        ).first()
+        return view._datepoint
 
 
 class UserBelongsToProjectMixin(UserPassesTestMixin):
@@ -32,121 +52,34 @@ class UserBelongsToProjectMixin(UserPassesTestMixin):
         return False
 
     def check_user_datepoint(self, user, datepoint_pk):
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Worker":
-                queryset = DatePoint.objects.filter(
-                    id=datepoint_pk, task__project__project__worker=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Manager":
-                queryset = DatePoint.objects.filter(
-                    id=datepoint_pk, task__project__project__manager=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Client":
-                queryset = DatePoint.objects.filter(
-                    id=datepoint_pk, task__project__project__client=user
-                )
-                if queryset.exists():
-                    return True
-        else:
-            return False
+        datepoint = url_datepoint(self)
+        return datepoint is not None and get_membership(
+            self.request
+        ).has_datepoint(datepoint)
 
     def check_user_projectphase(self, user, projectphase_pk):
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Worker":
-                queryset = ProjectPhase.objects.filter(
-                    id=projectphase_pk, project__worker=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Manager":
-                queryset = ProjectPhase.objects.filter(
-                    id=projectphase_pk, project__manager=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Client":
-                queryset = ProjectPhase.objects.filter(
-                    id=projectphase_pk, project__client=user
-                )
-                if queryset.exists():
-                    return True
-        else:
-            return False
+        return get_membership(self.request).has_projectphase(projectphase_pk)
 
     def check_user_project(self, user, project_pk):
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Worker":
-                queryset = Project.objects.filter(id=project_pk, worker=user)
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Manager":
-                queryset = Project.objects.filter(id=project_pk, manager=user)
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Client":
-                queryset = Project.objects.filter(id=project_pk, client=user)
-                if queryset.exists():
-                    return True
-        else:
-            return False
+        return get_membership(self.request).has_project(project_pk)
 
 
 class UserBelongsToTaskMixin(UserPassesTestMixin):
     """ Check wheter user belongs to the Task. """
 
     def test_func(self):
-        user = self.request.user
-        task_pk = self.kwargs["task_pk"]
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Worker":
-                queryset = Task.objects.filter(
-                    id=task_pk, project__project__worker=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Manager":
-                queryset = Task.objects.filter(
-                    id=task_pk, project__project__manager=user
-                )
-                if queryset.exists():
-                    return True
-            elif user.groups.all()[0].name == "Client":
-                queryset = Task.objects.filter(
-                    id=task_pk, project__project__client=user
-                )
-                if queryset.exists():
-                    return True
-        else:
-            return False
+        return get_membership(self.request).has_task(self.kwargs["task_pk"])
 
 
 class ManagerCanEditDatepoint(UserPassesTestMixin):
     """ Check wheter user is manager and can edit a datepoint. """
 
     def test_func(self):
-        user = self.request.user
-        datepoint_pk = self.kwargs["datepoint_pk"]
-        project_pk = DatePoint.objects.filter(id=datepoint_pk)[
-            0
-        ].task.project.id
-        return self.check_user_project(user, project_pk)
-
-    def check_user_project(self, user, project_pk):
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Manager":
-                queryset = Project.objects.filter(id=project_pk, manager=user)
-                if queryset.exists():
-                    return True
-            if user.groups.all()[0].name == "Client":
-                queryset = Project.objects.filter(id=project_pk, client=user)
-                if queryset.exists():
-                    return True
-        else:
+        membership = get_membership(self.request)
+        if membership.role not in ("Manager", "Client"):
             return False
+        datepoint = url_datepoint(self)
+        return datepoint is not None and membership.has_datepoint(datepoint)
 
 
 class UserCanViewDatePointDetail(
@@ -159,13 +92,9 @@ class UserCanViewDatePointDetail(
 
     def test_func(self):
         datepoint_pk = self.kwargs["datepoint_pk"]
-        project_pk = DatePoint.objects.filter(id=datepoint_pk)[
-            0
-        ].task.project.id
-
         user = self.request.user
 
-        return super().check_user_project(user, project_pk)
+        return super().check_user_datepoint(user, datepoint_pk)
 
 
 class WorkerCanChangeDatePointDetail(UserPassesTestMixin):
@@ -174,3 +103,41 @@ class WorkerCanChangeDatePointDetail(UserPassesTestMixin):
         user = self.request.user
 
         return DatePoint.objects.filter(id=datepoint_pk, worker=user).exists()
+
+
+class ReplicaMixin:
+    """ Read from the replica while handling the request.
+
+    For reports and bills, which may show data a moment out of date. Only
+    the handler of the method reads from the replica, permission checks
+    of the other mixins run on the default database. """
+
+    def dispatch(self, request, *args, **kwargs):
+        name = request.method.lower()
+        handler = getattr(self, name, None)
+        if name in self.http_method_names and handler is not None:
+            setattr(self, name, read_from_replica(handler))
+        return super().dispatch(request, *args, **kwargs)
+
+
+def read_from_replica(handler):
+    """ Wraps the handler to read from the replica, also while streaming. """
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with replica():
+            response = handler(*args, **kwargs)
+        if response.streaming:
+            response.streaming_content = stream_from_replica(
+                response.streaming_content
+            )
+        return response
+
+    return wrapper
+
+
+def stream_from_replica(content):
+    """ Yields streamed content, generated after the view has returned. """
+
+    with replica():
+        yield from content
@@ -1,10 +1,54 @@
-import json
+import datetime
 
 from django.contrib.auth.models import User
 from django.db import models
 from django.urls import reverse
 
 
+def month_start(date):
+    """ Returns first day of the month of the date. """
+    return datetime.date(date.year, date.month, 1)
+
+
+def rollup_key(datepoint):
+    """ Returns (task id, worker id, month) the datepoint is summed under.
+
+    Returns None if any of the fields was not loaded.
+    """
+    values = datepoint.__dict__
+    worked_date = values.get("worked_date")
+    if None in (values.get("task_id"), values.get("worker_id"), worked_date):
+        return None
+    if type(worked_date) is str:
+        worked_date = datetime.datetime.strptime(worked_date, "%Y-%m-%d")
+    return (values["task_id"], values["worker_id"], month_start(worked_date))
+
+
+# Message of the database triggers refusing datepoints of ended phases.
+ENDED_MESSAGE = "Phase of the task has ended."
+
+
+class PhaseEndedError(ValueError):
+    """ Raised when writing datepoints of an ended phase. """
+
+
+def check_ongoing(task_ids):
+    """ Raise PhaseEndedError if a phase of any of the tasks has ended.
+
+    Phases of all the tasks are checked with a single query.
+    """
+
+    title = (
+        Task.objects.filter(id__in=set(task_ids), project__ongoing=False)
+        .values_list("project__title", flat=True)
+        .first()
+    )
+    if title is not None:
+        raise PhaseEndedError(
+            f"{title} has ended. Unable to update/insert new data."
+        )
+
+
 class ClientDetail(models.Model):
     name = models.CharField(max_length=100)
     street = models.CharField(max_length=200)
@@ -62,14 +106,15 @@ class ProjectPhase(models.Model):
 
     ongoing = models.BooleanField(default=True)
 
-    # Dates in format '[("m-Y", "m-Y"), ("m-Y", "m-Y")]'
-    dates = models.TextField(default="[]")
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
 
-    def set_dates(self, dates):
-        self.dates = json.dumps(dates)
+        # Remember whether the phase was open, so its snapshot is only
+        # changed when the phase is closed or reopened.
+        instance._loaded_ongoing = instance.__dict__.get("ongoing")
 
-    def get_dates(self):
-        return json.loads(self.dates)
+        return instance
 
     def get_absolute_url(self):
         return reverse(
@@ -108,11 +153,25 @@ class Task(models.Model):
 
 
 class DatePoint(models.Model):
-    # ForeignKey to Task.
-    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    # ForeignKey to Task. Indexed by composite indexes in Meta.
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, db_index=False
+    )
 
-    # ForeignKey to Worker.
-    worker = models.ForeignKey(User, on_delete=models.CASCADE)
+    # ForeignKey to Worker. Indexed by composite indexes in Meta.
+    worker = models.ForeignKey(
+        User, on_delete=models.CASCADE, db_index=False
+    )
+
+    # Phase of the task, so tables of the phase are paged in the order of
+    # an index. Kept by triggers of migration 0011, whatever writes the row.
+    projectphase = models.ForeignKey(
+        ProjectPhase,
+        on_delete=models.CASCADE,
+        null=True,
+        editable=False,
+        db_index=False,
+    )
 
     # Title of the datepoint.
     title = models.CharField(max_length=100)
@@ -138,42 +197,37 @@ class DatePoint(models.Model):
     # Wheter approved by client.
     approved_client = models.BooleanField(default=False)
 
-    def save(self, *args, **kwargs):
-        if not self.task.project.ongoing:
-            raise ValueError(
-                f"{self.task.project.title} has ended. Unable to update/insert new data."
-            )
+    class Meta:
+        indexes = [
+            # Datepoints of the phase (through its tasks) by date.
+            models.Index(fields=["task", "worked_date"]),
+            # Pages of datepoints of the phase, ordered by date and id.
+            models.Index(fields=["projectphase", "worked_date", "id"]),
+            # Datepoints of the worker in the phase by date.
+            models.Index(fields=["task", "worker", "worked_date"]),
+            # Datepoints of the worker by date.
+            models.Index(fields=["worker", "worked_date"]),
+            # Admin changelist of all datepoints and its filters of
+            # approvals, newest first.
+            models.Index(fields=["worked_date"]),
+            models.Index(fields=["approved_manager", "worked_date"]),
+            models.Index(fields=["approved_client", "worked_date"]),
+        ]
 
-        if type(self.worked_date) is str:
-            projectphase = self.task.project
-            worker = self.worker
-            dates = projectphase.get_dates()
-            dates_worker = worker.profile.get_dates()
-            tmp = self.worked_date[:7]
-
-            tmp_in_dates = False
-            for sublist in dates:
-                if tmp in sublist:
-                    tmp_in_dates = True
-                    break
-
-            if not tmp_in_dates:
-                dates.append((tmp, tmp))
-                projectphase.dates = json.dumps(dates)
-                projectphase.save(update_fields=["dates"])
-
-            tmp_in_dates_worker = False
-            for sublist in dates_worker:
-                if tmp in sublist:
-                    tmp_in_dates_worker = True
-                    break
-
-            if not tmp_in_dates_worker:
-                dates_worker.append((tmp, tmp))
-                worker.profile.dates = json.dumps(dates_worker)
-                worker.profile.save(update_fields=["dates"])
+    def save(self, *args, **kwargs):
+        check_ongoing([self.task_id])
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        # Remember where the datepoint was counted, so the rollup can be
+        # refreshed when task or date changes.
+        instance._loaded_rollup_key = rollup_key(instance)
+
+        return instance
+
     def __str__(self):
         return f"Worker: {self.worker}, Task: {self.task}"
 
@@ -183,3 +237,179 @@ class DatePoint(models.Model):
             "worker-projectphase-detail",
             kwargs={"projectphase_pk": self.task.project.pk},
         )
+
+
+class HoursRollup(models.Model):
+    """ Worked hours summed per task, worker and month.
+
+    Rows are derived from DatePoints and kept current by `projects.rollups`,
+    so summaries and bills do not have to scan every DatePoint.
+    """
+
+    projectphase = models.ForeignKey(ProjectPhase, on_delete=models.CASCADE)
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+
+    worker = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    # First day of the month.
+    month = models.DateField()
+
+    # All worked hours.
+    hours = models.PositiveIntegerField(default=0)
+
+    # Hours approved by manager.
+    hours_manager = models.PositiveIntegerField(default=0)
+
+    # Hours approved by client.
+    hours_client = models.PositiveIntegerField(default=0)
+
+    # Hours approved by both manager and client.
+    hours_approved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("task", "worker", "month")
+        indexes = [
+            # Months with work in the phase and months worked by the worker.
+            models.Index(fields=["projectphase", "month"]),
+            models.Index(fields=["worker", "month"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task}, {self.worker}, {self.month:%Y-%m}"
+
+
+SNAPSHOT_MESSAGE = "Snapshots cannot be changed."
+
+
+class PhaseSnapshot(models.Model):
+    """ Rates and totals of a closed phase, taken when the phase closes.
+
+    Together with its `HoursSnapshot` rows it serves bills and summaries of
+    the phase. Snapshots are never updated, a reopened phase drops its
+    snapshot and takes a new one when it closes again.
+    """
+
+    projectphase = models.OneToOneField(
+        ProjectPhase, on_delete=models.CASCADE, related_name="snapshot"
+    )
+
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    # Whether hours had to be approved by clients.
+    has_client = models.BooleanField()
+
+    # Price per hour of the project.
+    price_per_hour = models.PositiveIntegerField(null=True)
+
+    hours = models.PositiveIntegerField(default=0)
+
+    # Billed hours approved by both manager and client.
+    hours_approved = models.PositiveIntegerField(default=0)
+
+    # Billed amount, None without price.
+    amount = models.PositiveIntegerField(null=True)
+
+    def __str__(self):
+        return str(self.projectphase)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError(SNAPSHOT_MESSAGE)
+        super().save(*args, **kwargs)
+
+
+class HoursSnapshot(models.Model):
+    """ Worked hours of a closed phase per task, worker and month.
+
+    Rows are taken from DatePoints with the `PhaseSnapshot` of the phase.
+    """
+
+    projectphase = models.ForeignKey(ProjectPhase, on_delete=models.CASCADE)
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+
+    worker = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    # First day of the month.
+    month = models.DateField()
+
+    hours = models.PositiveIntegerField(default=0)
+
+    hours_manager = models.PositiveIntegerField(default=0)
+
+    hours_client = models.PositiveIntegerField(default=0)
+
+    hours_approved = models.PositiveIntegerField(default=0)
+
+    # Price per hour of the worker.
+    price_per_hour = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        unique_together = ("task", "worker", "month")
+        indexes = [
+            models.Index(fields=["projectphase", "month"]),
+            models.Index(fields=["worker", "month"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task}, {self.worker}, {self.month:%Y-%m}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError(SNAPSHOT_MESSAGE)
+        super().save(*args, **kwargs)
+
+
+class BillJob(models.Model):
+    """ Bill of a phase or a project rendered to PDF in the background.
+
+    `key` is a hash of the billed object and its approved hours snapshot,
+    so a finished job serves repeated downloads of the same bill.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)
+
+    projectphase = models.ForeignKey(
+        ProjectPhase, on_delete=models.CASCADE, blank=True, null=True
+    )
+
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, blank=True, null=True
+    )
+
+    # Bill context in json.
+    context = models.TextField()
+
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+
+    # Rendered bill.
+    pdf = models.BinaryField(blank=True, null=True)
+
+    # Error of the failed job.
+    error = models.TextField(blank=True)
+
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    # Time the running job was claimed by a worker.
+    started_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "date_created"])]
+
+    def __str__(self):
+        return f"{self.projectphase or self.project}, {self.status}"
@@ -0,0 +1,136 @@
+import datetime
+
+from . import snapshots
+
+HEADER = [
+    "worker",
+    "month",
+    "project_id",
+    "project",
+    "hours",
+    "price_per_hour",
+    "pay",
+]
+
+
+def parse_month(value):
+    """ Returns first day of the month in format 'Y-m'. """
+
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def payroll_rows(first_month, last_month):
+    """ Returns approved hours per worker, month and project.
+
+    Rows are read from rollups and snapshots of closed phases in two grouped
+    queries, ordered by worker, month and project. Hours are approved by
+    everyone who has to approve them, client only if the project has
+    clients. Closed phases are paid with the price of the worker at their
+    close, so a project may have a row per price. Rows are tuples of
+    `HEADER`, pay is None if the worker has no price per hour.
+    """
+
+    totals = {}
+    for row in snapshots.approved_hours(
+        [
+            "worker__username",
+            "month",
+            "projectphase__project_id",
+            "projectphase__project__title",
+        ],
+        month__gte=first_month,
+        month__lte=last_month,
+    ):
+        if not row["hours"]:
+            continue
+        key = (
+            row["worker__username"],
+            row["month"],
+            row["projectphase__project__title"],
+            row["projectphase__project_id"],
+            # Rows without price go last.
+            row["rate"] is None,
+            row["rate"] or 0,
+        )
+        totals[key] = totals.get(key, 0) + row["hours"]
+
+    for key in sorted(totals):
+        username, month, title, project_id, no_price, price_per_hour = key
+        hours = totals[key]
+        if no_price:
+            price_per_hour = None
+        yield (
+            username,
+            f"{month:%Y-%m}",
+            project_id,
+            title,
+            hours,
+            price_per_hour,
+            None if price_per_hour is None else hours * price_per_hour,
+        )
+
+
+def payroll_matrix(rows):
+    """ Group payroll rows into a month x project table per worker.
+
+    Hours of a cell may be paid with several prices per hour, e.g. when a
+    phase of the project closed before the price changed. Pay of the
+    worker is None as soon as any of their hours has no price per hour.
+    Projects are told apart by id, they may share a title.
+    """
+
+    workers = []
+    for row in rows:
+        username, month, project_id, title, hours, price_per_hour, pay = row
+        if not workers or workers[-1]["username"] != username:
+            workers.append(
+                {
+                    "username": username,
+                    "cells": {},
+                    "months": [],
+                    "projects": [],
+                    "hours": 0,
+                    "pay": 0,
+                }
+            )
+        worker = workers[-1]
+
+        cell = worker["cells"].setdefault(
+            (month, project_id), {"hours": 0, "prices": []}
+        )
+        cell["hours"] += hours
+        if price_per_hour not in cell["prices"]:
+            cell["prices"].append(price_per_hour)
+        if month not in worker["months"]:
+            worker["months"].append(month)
+        project = {"id": project_id, "title": title}
+        if project not in worker["projects"]:
+            worker["projects"].append(project)
+        worker["hours"] += hours
+        if pay is None or worker["pay"] is None:
+            worker["pay"] = None
+        else:
+            worker["pay"] += pay
+
+    empty = {"hours": 0, "prices": []}
+    for worker in workers:
+        worker["projects"].sort(
+            key=lambda project: (project["title"], project["id"])
+        )
+        cells = worker.pop("cells")
+        worker["rows"] = [
+            {
+                "month": month,
+                "cells": [
+                    cells.get((month, project["id"]), empty)
+                    for project in worker["projects"]
+                ],
+                "total": sum(
+                    cells.get((month, project["id"]), empty)["hours"]
+                    for project in worker["projects"]
+                ),
+            }
+            for month in worker["months"]
+        ]
+
+    return workers
@@ -0,0 +1,105 @@
+import datetime
+
+from django.urls import reverse
+
+from .models import DatePoint
+from .rollups import month_range
+
+
+def datepoint_popover(datepoint, group_name, client_exists):
+    """ Returns html shown in the jira popover for a single datepoint. """
+
+    content = f"<a href='{reverse('datepoint-detail', kwargs={'datepoint_pk': datepoint.id})}'>"
+    content += f"<p> {datepoint.title} | {datepoint.worked_time}h "
+    content += "</a>"
+    if datepoint.approved_manager:
+        content += f"| M: <span id='approved_manager_{datepoint.id}'>✓</span>"
+    else:
+        content += f"| M: <span id='approved_manager_{datepoint.id}'>❌</span>"
+    if client_exists and datepoint.approved_client:
+        content += f"| C: <span id='approved_client_{datepoint.id}'>✓</span>"
+    elif client_exists and not datepoint.approved_client:
+        content += f"| C: <span id='approved_client_{datepoint.id}'>❌</span>"
+
+    if group_name == "Manager":
+        approved = datepoint.approved_manager
+    elif group_name == "Client":
+        approved = datepoint.approved_client
+    else:
+        return content
+
+    if approved:
+        content += f"<button class='btn btn-danger btn-sm ml-1' id='btn_{datepoint.id}'>-</button></p>"
+    else:
+        content += f"<button class='btn btn-success btn-sm ml-1' id='btn_{datepoint.id}'>+</button></p>"
+
+    return content
+
+
+def jira_grid(projectphase_pk, month, year, group_name, client_exists):
+    """ Pivot datepoints of the phase into worker x day grid.
+
+    All datepoints of the month are fetched with a single query and grouped
+    in memory, so the number of queries does not depend on the number of
+    workers and days.
+
+    Returns dictionary with `worked_dates`, `workers`, `workers_list` and
+    `td_list_js` (list, not yet serialized to json).
+    """
+
+    queryset = (
+        DatePoint.objects.filter(
+            task__project_id=projectphase_pk, **month_range(year, month)
+        )
+        .select_related("worker", "task")
+        .order_by("worked_date", "id")
+    )
+
+    # (username, "Y-m-d") -> list of datepoints.
+    cells = {}
+    worked_dates = set()
+    workers = set()
+
+    for datepoint in queryset:
+        worked_date = datetime.datetime.strftime(
+            datepoint.worked_date, "%Y-%m-%d"
+        )
+        username = datepoint.worker.username
+
+        worked_dates.add(worked_date)
+        workers.add(username)
+        cells.setdefault((username, worked_date), []).append(datepoint)
+
+    worked_dates = sorted(worked_dates)
+    workers = sorted(workers)
+
+    workers_list = []
+    td_list_js = []
+
+    i = 0
+    for worker in workers:
+        td_list = []
+        for worked_date in worked_dates:
+            datepoints = cells.get((worker, worked_date), [])
+
+            hours = sum(datepoint.worked_time for datepoint in datepoints)
+            content = "".join(
+                datepoint_popover(datepoint, group_name, client_exists)
+                for datepoint in datepoints
+            )
+            j_change = [datepoint.id for datepoint in datepoints]
+
+            td_list.append({"id": f"td_{i}", "hours": hours})
+            td_list_js.append(
+                {"id": f"td_{i}", "content": content, "jds": j_change}
+            )
+            i += 1
+
+        workers_list.append({"username": worker, "td": td_list})
+
+    return {
+        "worked_dates": [item[8:10] for item in worked_dates],
+        "workers": workers,
+        "workers_list": workers_list,
+        "td_list_js": td_list_js,
+    }
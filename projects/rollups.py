@@ -0,0 +1,238 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.dispatch import Signal
+
+from .models import DatePoint, HoursRollup, Task, month_start
+
+# Number of rollup rows inserted at once.
+BATCH_SIZE = 1000
+
+# Summed fields of rollup rows.
+HOURS_FIELDS = ["hours", "hours_manager", "hours_client", "hours_approved"]
+
+# Sent after hours of the tasks were recomputed.
+hours_changed = Signal(providing_args=["task_ids"])
+
+
+def next_month(month):
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def month_range(year, month):
+    """ Returns filter of worked dates in the month.
+
+    Range on `worked_date` can be served by an index, unlike
+    `worked_date__month` and `worked_date__year` lookups.
+    """
+
+    first = datetime.date(int(year), int(month), 1)
+    return {"worked_date__gte": first, "worked_date__lt": next_month(first)}
+
+
+def aggregate(queryset):
+    """ Sum worked hours of datepoints per task, worker and month. """
+
+    return (
+        queryset.annotate(month=TruncMonth("worked_date"))
+        .order_by()
+        .values("task_id", "task__project_id", "worker_id", "month")
+        .annotate(
+            hours=Sum("worked_time"),
+            hours_manager=Sum("worked_time", filter=Q(approved_manager=True)),
+            hours_client=Sum("worked_time", filter=Q(approved_client=True)),
+            hours_approved=Sum(
+                "worked_time",
+                filter=Q(approved_manager=True, approved_client=True),
+            ),
+        )
+    )
+
+
+def rollup_rows(rows, model=HoursRollup):
+    for row in rows:
+        yield model(
+            projectphase_id=row["task__project_id"],
+            task_id=row["task_id"],
+            worker_id=row["worker_id"],
+            month=month_start(row["month"]),
+            hours=row["hours"] or 0,
+            hours_manager=row["hours_manager"] or 0,
+            hours_client=row["hours_client"] or 0,
+            hours_approved=row["hours_approved"] or 0,
+        )
+
+
+def bulk_insert(rows, model=HoursRollup):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def refresh(keys):
+    """ Recompute rollup rows for (task id, worker id, month) keys.
+
+    Rows of every combination of the given tasks, workers and months are
+    recomputed from datepoints in one aggregate query.
+
+    Rows of the keys are inserted when missing and locked before the hours
+    are summed. Concurrent refreshes of the same rows wait for each other
+    instead of inserting the same row twice, and sum the datepoints the
+    other one committed.
+    """
+
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+
+    task_ids = {key[0] for key in keys}
+    worker_ids = {key[1] for key in keys}
+    months = {key[2] for key in keys}
+    first, last = min(months), next_month(max(months))
+
+    datepoints = DatePoint.objects.filter(
+        task_id__in=task_ids,
+        worker_id__in=worker_ids,
+        worked_date__gte=first,
+        worked_date__lt=last,
+    )
+    rows = HoursRollup.objects.filter(
+        task_id__in=task_ids,
+        worker_id__in=worker_ids,
+        month__gte=first,
+        month__lt=last,
+    )
+    projectphase_ids = dict(
+        Task.objects.filter(id__in=task_ids).values_list("id", "project_id")
+    )
+
+    with transaction.atomic():
+        HoursRollup.objects.bulk_create(
+            [
+                HoursRollup(
+                    projectphase_id=projectphase_ids[task_id],
+                    task_id=task_id,
+                    worker_id=worker_id,
+                    month=month,
+                )
+                for task_id, worker_id, month in keys
+                if task_id in projectphase_ids
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        ids = {
+            (task_id, worker_id, month): pk
+            for pk, task_id, worker_id, month in rows.select_for_update()
+            .order_by("id")
+            .values_list("id", "task_id", "worker_id", "month")
+        }
+
+        updated, created = [], []
+        for row in rollup_rows(aggregate(datepoints)):
+            row.id = ids.pop((row.task_id, row.worker_id, row.month), None)
+            (created if row.id is None else updated).append(row)
+
+        HoursRollup.objects.bulk_update(
+            updated, HOURS_FIELDS, batch_size=BATCH_SIZE
+        )
+        # Only rows of tasks deleted meanwhile are not inserted above.
+        HoursRollup.objects.bulk_create(
+            created, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        if ids:
+            HoursRollup.objects.filter(id__in=ids.values()).delete()
+
+    hours_changed.send(sender=HoursRollup, task_ids=task_ids)
+
+
+def datepoint_keys(queryset):
+    """ Returns rollup keys of all the datepoints in the queryset. """
+
+    return [
+        (row["task_id"], row["worker_id"], row["month"])
+        for row in queryset.annotate(month=TruncMonth("worked_date"))
+        .order_by()
+        .values("task_id", "worker_id", "month")
+        .distinct()
+    ]
+
+
+def refresh_datepoints(queryset):
+    """ Recompute rollup rows of all the datepoints in the queryset. """
+
+    refresh(datepoint_keys(queryset))
+
+
+def rebuild(projectphase_ids=None):
+    """ Recompute rollup rows from scratch. Returns number of rows.
+
+    With phase ids only rows of the phases are recomputed. Bills and
+    fragments of the recomputed phases are invalidated.
+    """
+
+    rows = HoursRollup.objects.all()
+    datepoints = DatePoint.objects.all()
+    if projectphase_ids is not None:
+        projectphase_ids = list(projectphase_ids)
+        rows = rows.filter(projectphase_id__in=projectphase_ids)
+        datepoints = datepoints.filter(task__project_id__in=projectphase_ids)
+
+    with transaction.atomic():
+        rows.delete()
+        bulk_insert(
+            rollup_rows(aggregate(datepoints).iterator(chunk_size=BATCH_SIZE))
+        )
+        count = rows.count()
+
+    tasks = Task.objects.all()
+    if projectphase_ids is not None:
+        tasks = tasks.filter(project_id__in=projectphase_ids)
+    # Ids are sent as a subquery, the full rebuild covers every task.
+    hours_changed.send(sender=HoursRollup, task_ids=tasks.values("id"))
+    return count
+
+
+def approved_field(client_exists):
+    """ Returns field with hours approved by everyone who has to approve.
+
+    Hours need approval of client only if the project has clients.
+    """
+
+    return "hours_approved" if client_exists else "hours_manager"
+
+
+def hours_by(queryset, field, group_by):
+    """ Returns dictionary of summed rollup `field` grouped by `group_by`. """
+
+    return {
+        row[group_by]: row["total"]
+        for row in queryset.order_by()
+        .values(group_by)
+        .annotate(total=Sum(field))
+    }
+
+
+def month_choices(**filters):
+    """ Returns choices of months in format 'Y-m' with any worked hours.
+
+    Filters are applied to rollup rows, e.g. `projectphase_id` or `worker`.
+    """
+
+    months = (
+        HoursRollup.objects.filter(**filters)
+        .order_by("month")
+        .values_list("month", flat=True)
+        .distinct()
+    )
+
+    return [(f"{month:%Y-%m}", f"{month:%Y-%m}") for month in months]
@@ -0,0 +1,75 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+REPLICA = "replica"
+
+# Models always read from the default database. Bill jobs are queued and
+# read back by the same request and cache entries hold versions of cached
+# data, which must not be read before their bump reaches the replica.
+PRIMARY_MODELS = {"projects.billjob", "django_cache.cacheentry"}
+
+# Whether reads of the current thread go to the replica.
+state = threading.local()
+
+
+@contextmanager
+def replica():
+    """ Send reads within the block to the replica, if there is one.
+
+    Blocks may be nested. Writes always go to the default database.
+    """
+
+    depth = getattr(state, "depth", 0)
+    state.depth = depth + 1
+    try:
+        yield
+    finally:
+        state.depth = depth
+
+
+@contextmanager
+def primary():
+    """ Send reads within the block to the default database.
+
+    For data kept in the cache under versions bumped on the default
+    database, which must not be rebuilt from a lagging replica.
+    """
+
+    depth = getattr(state, "depth", 0)
+    state.depth = 0
+    try:
+        yield
+    finally:
+        state.depth = depth
+
+
+def reading_replica():
+    """ Returns whether reads of the current thread go to the replica. """
+
+    return bool(getattr(state, "depth", 0)) and REPLICA in settings.DATABASES
+
+
+class ReplicaRouter:
+    """ Routes reads within `replica()` to the replica database.
+
+    Models of `PRIMARY_MODELS` are always read from the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Model of the database cache has only these fields of the options.
+        label = f"{model._meta.app_label}.{model._meta.model_name}"
+        if reading_replica() and label not in PRIMARY_MODELS:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import bills, fragments, membership, rollups, snapshots, sqlite
+from .models import DatePoint, Project, ProjectPhase, Task, rollup_key
+
+
+@receiver(m2m_changed, sender=Project.worker.through)
+@receiver(m2m_changed, sender=Project.client.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_membership_m2m(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        membership.invalidate()
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=ProjectPhase)
+@receiver(post_delete, sender=Task)
+def invalidate_membership(sender, **kwargs):
+    membership.invalidate()
+
+
+@receiver(post_save, sender=ProjectPhase)
+@receiver(post_save, sender=Task)
+def invalidate_membership_on_save(sender, created, update_fields, **kwargs):
+    # Saving only some other fields does not change who the object belongs to.
+    if created or update_fields is None or "project" in update_fields:
+        membership.invalidate()
+
+
+@receiver(m2m_changed, sender=Project.client.through)
+def invalidate_fragments_of_clients(
+    sender, instance, action, pk_set, **kwargs
+):
+    # Pages show client approvals only if the project has clients.
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, Project):
+        projects = [instance.id]
+    else:
+        projects = pk_set or []
+    fragments.invalidate(
+        ProjectPhase.objects.filter(project_id__in=projects).values_list(
+            "id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=ProjectPhase)
+@receiver(post_delete, sender=ProjectPhase)
+def invalidate_fragments_of_projectphase(sender, instance, **kwargs):
+    fragments.invalidate([instance.id])
+
+
+# Phases are closed by `projects.closing`, this covers phases saved by the
+# admin. Snapshot of a reopened phase is dropped and taken again on close.
+# Saves that do not close or reopen the phase leave the snapshot alone.
+@receiver(post_save, sender=ProjectPhase)
+def sync_snapshot(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None and "ongoing" not in update_fields:
+        return
+    loaded = None if created else getattr(instance, "_loaded_ongoing", None)
+    instance._loaded_ongoing = instance.ongoing
+    if loaded == instance.ongoing:
+        return
+    if instance.ongoing:
+        if not created:
+            snapshots.drop([instance.id])
+    elif snapshots.get(instance) is None:
+        snapshots.take([instance.id])
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_fragments_of_task(sender, instance, **kwargs):
+    fragments.invalidate([instance.project_id])
+
+
+@receiver(post_save, sender=DatePoint)
+def refresh_rollup_on_save(sender, instance, **kwargs):
+    key = rollup_key(instance)
+    rollups.refresh({getattr(instance, "_loaded_rollup_key", None), key})
+    instance._loaded_rollup_key = key
+
+
+@receiver(post_delete, sender=DatePoint)
+def refresh_rollup_on_delete(sender, instance, **kwargs):
+    rollups.refresh({rollup_key(instance)})
+
+
+@receiver(rollups.hours_changed)
+def invalidate_bills(sender, task_ids, **kwargs):
+    bills.invalidate(task_ids)
+
+
+# Rollups are refreshed by every save and delete of a datepoint and by the
+# bulk approval, so fragments of their phases are invalidated here.
+@receiver(rollups.hours_changed)
+def invalidate_fragments(sender, task_ids, **kwargs):
+    fragments.invalidate_tasks(task_ids)
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        sqlite.set_pragmas(connection, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,256 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum
+
+from users.models import Profile
+
+from . import rollups
+from .models import (
+    DatePoint,
+    HoursRollup,
+    HoursSnapshot,
+    PhaseSnapshot,
+    Project,
+    ProjectPhase,
+)
+
+
+def take(projectphase_ids):
+    """ Take snapshots of the closed phases from their datepoints.
+
+    Hours are summed per task, worker and month with the worker's price,
+    totals and price of the project are kept per phase. Snapshots taken
+    before are replaced as a whole. Returns number of hours rows.
+    """
+
+    projectphase_ids = list(projectphase_ids)
+    rows = list(
+        rollups.rollup_rows(
+            rollups.aggregate(
+                DatePoint.objects.filter(task__project_id__in=projectphase_ids)
+            ),
+            HoursSnapshot,
+        )
+    )
+
+    prices = dict(
+        Profile.objects.filter(
+            user_id__in={row.worker_id for row in rows}
+        ).values_list("user_id", "price_per_hour")
+    )
+    snapshots = {
+        pk: PhaseSnapshot(
+            projectphase_id=pk, has_client=has_client, price_per_hour=price
+        )
+        for pk, has_client, price in ProjectPhase.objects.filter(
+            id__in=projectphase_ids
+        )
+        .annotate(
+            has_client=Exists(
+                Project.client.through.objects.filter(
+                    project_id=OuterRef("project_id")
+                )
+            )
+        )
+        .values_list("id", "has_client", "project__price_per_hour")
+    }
+
+    for row in rows:
+        row.price_per_hour = prices.get(row.worker_id)
+        snapshot = snapshots[row.projectphase_id]
+        snapshot.hours += row.hours
+        snapshot.hours_approved += row.hours_approved
+    for snapshot in snapshots.values():
+        if snapshot.price_per_hour is not None:
+            snapshot.amount = snapshot.hours_approved * snapshot.price_per_hour
+
+    with transaction.atomic():
+        drop(projectphase_ids)
+        PhaseSnapshot.objects.bulk_create(snapshots.values())
+        rollups.bulk_insert(rows, HoursSnapshot)
+
+    return len(rows)
+
+
+def drop(projectphase_ids):
+    """ Delete snapshots of the phases, e.g. when they are reopened. """
+
+    HoursSnapshot.objects.filter(projectphase_id__in=projectphase_ids).delete()
+    PhaseSnapshot.objects.filter(projectphase_id__in=projectphase_ids).delete()
+
+
+def get(projectphase):
+    """ Returns snapshot of the phase, None if it was not taken. """
+
+    return PhaseSnapshot.objects.filter(
+        projectphase_id=projectphase.id
+    ).first()
+
+
+def hours_by(field, group_by, **filters):
+    """ Like `rollups.hours_by` of rows matching the filters.
+
+    Hours of phases with a snapshot are read from the snapshot, hours of
+    other phases from rollups.
+    """
+
+    totals = rollups.hours_by(
+        HoursRollup.objects.filter(
+            projectphase__snapshot__isnull=True, **filters
+        ),
+        field,
+        group_by,
+    )
+    frozen = rollups.hours_by(
+        HoursSnapshot.objects.filter(**filters), field, group_by
+    )
+    for key, value in frozen.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def prices(projectphases):
+    """ Returns price per hour by phase id, frozen for closed phases. """
+
+    return {
+        pk: frozen if snapshot is not None else current
+        for pk, snapshot, frozen, current in projectphases.values_list(
+            "id",
+            "snapshot__id",
+            "snapshot__price_per_hour",
+            "project__price_per_hour",
+        )
+    }
+
+
+def approved_hours(group_by, **filters):
+    """ Yields hours approved by everyone who has to approve.
+
+    Rows matching the filters are grouped by `group_by` fields and price
+    per hour of the worker, `rate`. Hours are approved by client only if the
+    project has clients. Phases with a snapshot are read from the snapshot
+    with prices and clients at their close, other phases from rollups with
+    current ones. Yields dictionaries with `group_by` fields, `rate` and
+    `hours`.
+    """
+
+    live = (
+        HoursRollup.objects.filter(
+            projectphase__snapshot__isnull=True, **filters
+        )
+        .order_by()
+        .values(*group_by, rate=F("worker__profile__price_per_hour"))
+        .annotate(
+            has_client=Exists(
+                Project.client.through.objects.filter(
+                    project_id=OuterRef("projectphase__project_id")
+                )
+            ),
+            hours_manager=Sum("hours_manager"),
+            hours_approved=Sum("hours_approved"),
+        )
+    )
+    frozen = (
+        HoursSnapshot.objects.filter(**filters)
+        .order_by()
+        .values(
+            *group_by,
+            rate=F("price_per_hour"),
+            has_client=F("projectphase__snapshot__has_client"),
+        )
+        .annotate(
+            hours_manager=Sum("hours_manager"),
+            hours_approved=Sum("hours_approved"),
+        )
+    )
+
+    # Columns of both queries are in the same order, they are read at once.
+    for row in live.union(frozen, all=True):
+        hours = row[rollups.approved_field(row["has_client"])]
+        yield dict(
+            {field: row[field] for field in group_by},
+            rate=row["rate"],
+            hours=hours or 0,
+        )
+
+
+def worker_rate(projectphase, worker):
+    """ Returns price per hour of the worker, frozen for closed phases. """
+
+    if get(projectphase) is None:
+        return worker.profile.price_per_hour
+    return (
+        HoursSnapshot.objects.filter(
+            projectphase_id=projectphase.id, worker_id=worker.id
+        )
+        .values_list("price_per_hour", flat=True)
+        .first()
+    )
+
+
+def verify(projectphase_ids=None):
+    """ Recompute snapshots of closed phases and yield their drift.
+
+    Hours rows are compared with datepoints and totals of phases with their
+    rows. Phases are all closed phases or the given ones. Yields messages.
+    """
+
+    projectphases = ProjectPhase.objects.filter(ongoing=False)
+    if projectphase_ids is not None:
+        projectphases = projectphases.filter(id__in=projectphase_ids)
+    projectphases = projectphases.select_related("snapshot").order_by("id")
+
+    for projectphase in projectphases.iterator():
+        name = f"{projectphase.title} ({projectphase.id})"
+        try:
+            snapshot = projectphase.snapshot
+        except PhaseSnapshot.DoesNotExist:
+            yield f"{name}: snapshot is missing."
+            continue
+
+        expected = {
+            (row.task_id, row.worker_id, row.month): row
+            for row in rollups.rollup_rows(
+                rollups.aggregate(
+                    DatePoint.objects.filter(task__project=projectphase)
+                ),
+                HoursSnapshot,
+            )
+        }
+        rows = {
+            (row.task_id, row.worker_id, row.month): row
+            for row in HoursSnapshot.objects.filter(projectphase=projectphase)
+        }
+
+        for key in sorted(set(expected) | set(rows)):
+            task_id, worker_id, month = key
+            label = f"task {task_id}, worker {worker_id}, {month:%Y-%m}"
+            if key not in rows:
+                yield f"{name}: {label} is missing."
+            elif key not in expected:
+                yield f"{name}: {label} has no datepoints."
+            else:
+                for field in rollups.HOURS_FIELDS:
+                    found = getattr(rows[key], field)
+                    wanted = getattr(expected[key], field)
+                    if found != wanted:
+                        yield (
+                            f"{name}: {label} {field} is {found}, "
+                            f"datepoints have {wanted}."
+                        )
+
+        hours = sum(row.hours for row in rows.values())
+        hours_approved = sum(row.hours_approved for row in rows.values())
+        amount = None
+        if snapshot.price_per_hour is not None:
+            amount = hours_approved * snapshot.price_per_hour
+        for field, wanted in (
+            ("hours", hours),
+            ("hours_approved", hours_approved),
+            ("amount", amount),
+        ):
+            found = getattr(snapshot, field)
+            if found != wanted:
+                yield (
+                    f"{name}: total {field} is {found}, "
+                    f"rows have {wanted}."
+                )
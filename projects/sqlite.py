@@ -0,0 +1,68 @@
+import os
+
+from django.db.utils import OperationalError
+
+
+def set_pragmas(connection, pragmas):
+    """ Set the pragmas on the SQLite connection. """
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def get_pragmas(connection, names):
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = None if row is None else row[0]
+    return values
+
+
+def file_sizes(connection):
+    """ Returns sizes in bytes of the database file and its WAL file. """
+
+    name = connection.settings_dict["NAME"]
+    sizes = {}
+    for key, path in (("database", name), ("wal", f"{name}-wal")):
+        try:
+            sizes[key] = os.path.getsize(path)
+        except OSError:
+            sizes[key] = 0
+    return sizes
+
+
+def object_sizes(connection):
+    """ Returns (name, type, table, bytes) of tables and indexes.
+
+    Sizes are read from the dbstat table, None is returned if SQLite was
+    built without it.
+    """
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "SELECT m.name, m.type, m.tbl_name, SUM(s.pgsize) "
+                "FROM sqlite_master AS m JOIN dbstat AS s ON s.name = m.name "
+                "WHERE m.type IN ('table', 'index') "
+                "GROUP BY m.name ORDER BY SUM(s.pgsize) DESC"
+            )
+        except OperationalError:
+            return None
+        return cursor.fetchall()
+
+
+def maintain(connection, analyze=True, vacuum=False, optimize=True):
+    """ Run the maintenance statements, VACUUM rewrites the whole file. """
+
+    with connection.cursor() as cursor:
+        if analyze:
+            cursor.execute("ANALYZE")
+        if vacuum:
+            cursor.execute("VACUUM")
+        if optimize:
+            cursor.execute("PRAGMA optimize")
+        # Move pages of the WAL file back to the database.
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
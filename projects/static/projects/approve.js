@@ -0,0 +1,9 @@
+// Approve (approve = true) or disapprove datepoints with given ids
+// using a single request. Callback receives {"approved", "datepoints"}.
+function approveDatePoints(ids, approve, csrf_token, callback) {
+    $.post("/datepoints/approve/", {
+        csrfmiddlewaretoken: csrf_token,
+        datepoints: ids.join(","),
+        approve: approve ? "true" : "false",
+    }, callback);
+}
@@ -0,0 +1,68 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def encode_cursor(datepoint):
+    return f"{datepoint.worked_date.isoformat()}.{datepoint.id}"
+
+
+def decode_cursor(value):
+    """ Returns (worked_date, id) of the cursor, raises ValueError. """
+
+    worked_date, pk = value.split(".")
+    return datetime.date.fromisoformat(worked_date), int(pk)
+
+
+def filter_datepoints(queryset, data):
+    """ Narrow down datepoints to cleaned data of `DatePointTableForm`. """
+
+    if data.get("worker"):
+        queryset = queryset.filter(worker=data["worker"])
+    if data.get("task"):
+        queryset = queryset.filter(task=data["task"])
+    for field in ("approved_manager", "approved_client"):
+        if data.get(field) is not None:
+            queryset = queryset.filter(**{field: data[field]})
+    return queryset
+
+
+def datepoint_page(queryset, after=None, descending=True, size=None):
+    """ Returns page of datepoints following the cursor and next cursor.
+
+    Datepoints are ordered by (worked_date, id) and the page starts right
+    after the cursor, so no rows are skipped with OFFSET. Datepoints of a
+    phase, filtered on `projectphase`, are read in the order of its index.
+    Next cursor is None on the last page.
+    """
+
+    size = size or settings.DATEPOINT_PAGE_SIZE
+
+    if descending:
+        queryset = queryset.order_by("-worked_date", "-id")
+    else:
+        queryset = queryset.order_by("worked_date", "id")
+
+    if after is not None:
+        worked_date, pk = after
+        # The extra range on worked_date starts the index scan at the cursor.
+        if descending:
+            queryset = queryset.filter(worked_date__lte=worked_date).filter(
+                Q(worked_date__lt=worked_date)
+                | Q(worked_date=worked_date, id__lt=pk)
+            )
+        else:
+            queryset = queryset.filter(worked_date__gte=worked_date).filter(
+                Q(worked_date__gt=worked_date)
+                | Q(worked_date=worked_date, id__gt=pk)
+            )
+
+    datepoints = list(queryset.select_related("worker", "task")[: size + 1])
+
+    next_cursor = None
+    if len(datepoints) > size:
+        datepoints = datepoints[:size]
+        next_cursor = encode_cursor(datepoints[-1])
+
+    return datepoints, next_cursor
@@ -1,3 +1,2333 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import zipfile
+from contextlib import redirect_stdout
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import ApiToken
+
+from . import (
+    bills,
+    closing,
+    imports,
+    membership,
+    payroll,
+    rollups,
+    routers,
+    snapshots,
+    sqlite,
+    tables,
+    writes,
+)
+from .instrumentation import stats
+from .models import (
+    BillJob,
+    ClientDetail,
+    DatePoint,
+    HoursRollup,
+    HoursSnapshot,
+    PhaseEndedError,
+    PhaseSnapshot,
+    Project,
+    ProjectPhase,
+    Task,
+    check_ongoing,
+)
+
+
+class ProjectsTestCase(TestCase):
+    """ Creates roles and a single project with one phase and one task. """
+
+    def setUp(self):
+        # Cached fragments and memberships would outlive rolled back data.
+        cache.clear()
+
+        with redirect_stdout(io.StringIO()):
+            call_command("createroles")
+
+        self.manager = self.create_user("Manager1", "Manager")
+        self.client_user = self.create_user("Client1", "Client")
+
+        self.project = Project.objects.create(
+            title="Project", description="", manager=self.manager
+        )
+        self.project.client.add(self.client_user)
+        self.projectphase = ProjectPhase.objects.create(
+            title="Phase", project=self.project
+        )
+        self.task = Task.objects.create(
+            title="Task", project=self.projectphase
+        )
+
+    def create_user(self, username, group_name):
+        user = User.objects.create_user(username=username, password="pass")
+        user.groups.add(Group.objects.get(name=group_name))
+        return user
+
+    def create_workers(self, count):
+        workers = []
+        first = self.project.worker.count()
+        for i in range(first, first + count):
+            worker = self.create_user(f"Worker{i}", "Worker")
+            self.project.worker.add(worker)
+            workers.append(worker)
+        return workers
+
+    def create_datepoints(self, workers, days, year=2019, month=6):
+        for worker in workers:
+            for day in range(1, days + 1):
+                DatePoint.objects.create(
+                    task=self.task,
+                    worker=worker,
+                    title="Work",
+                    worked_time=2,
+                    worked_date=datetime.date(year, month, day),
+                )
+
+    def count_queries(self, url, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class ProjectPhaseJiraViewTest(ProjectsTestCase):
+    def jira_url(self):
+        return reverse(
+            "projectphase-jira-view",
+            kwargs={
+                "projectphase_pk": self.projectphase.id,
+                "month": 6,
+                "year": 2019,
+            },
+        )
+
+    def test_grid(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 3)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(self.jira_url())
+
+        self.assertEqual(response.context["worked_dates"], ["01", "02", "03"])
+        self.assertEqual(response.context["workers"], ["Worker0", "Worker1"])
+        for item in response.context["workers_list"]:
+            self.assertEqual([td["hours"] for td in item["td"]], [2, 2, 2])
+
+    def test_query_count_does_not_grow(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 2)
+        small = self.count_queries(self.jira_url(), self.manager)
+
+        workers += self.create_workers(8)
+        DatePoint.objects.all().delete()
+        self.create_datepoints(workers, 20)
+        large = self.count_queries(self.jira_url(), self.manager)
+
+        self.assertEqual(small, large)
+
+
+class MembershipTest(ProjectsTestCase):
+    def test_membership_is_invalidated(self):
+        worker = self.create_workers(1)[0]
+        url = reverse(
+            "worker-projectphase-table",
+            kwargs={
+                "projectphase_pk": self.projectphase.id,
+                "worker_pk": worker.id,
+            },
+        )
+        self.client.force_login(worker)
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.project.worker.remove(worker)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.project.worker.add(worker)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_roles_check_their_own_relation(self):
+        other = self.create_user("Manager2", "Manager")
+        url = reverse(
+            "projectphase-detail-all",
+            kwargs={"projectphase_pk": self.projectphase.id},
+        )
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_evicted_version_is_not_reused(self):
+        worker = self.create_workers(1)[0]
+        url = reverse(
+            "worker-projectphase-table",
+            args=[self.projectphase.id, worker.id],
+        )
+        self.client.force_login(worker)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.project.worker.remove(worker)
+        # Version is evicted, memberships of older versions are still there.
+        cache.delete(membership.VERSION_KEY)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_datepoint_is_loaded_once(self):
+        self.create_datepoints(self.create_workers(1), 1)
+        datepoint = DatePoint.objects.get()
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("datepoint-detail", args=[datepoint.id])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(
+                [
+                    query
+                    for query in queries
+                    if query["sql"].startswith(
+                        'SELECT "projects_datepoint"."id"'
+                    )
+                ]
+            ),
+            1,
+        )
+
+    def test_invalidation_reaches_other_processes(self):
+        # Each process has its own cache object, the database cache shares
+        # the cached data between them.
+        worker = self.create_workers(1)[0]
+        with override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                    "LOCATION": "membership_test",
+                }
+            }
+        ):
+            call_command("createcachetable", verbosity=0)
+        first, second = [
+            DatabaseCache("membership_test", {}) for _ in range(2)
+        ]
+
+        with patch.object(membership, "cache", first):
+            self.assertIn(
+                self.project.id, membership.Membership(worker).project_ids
+            )
+        with patch.object(membership, "cache", second):
+            self.project.worker.remove(worker)
+        with patch.object(membership, "cache", first):
+            self.assertNotIn(
+                self.project.id, membership.Membership(worker).project_ids
+            )
+
+
+class HoursRollupTest(ProjectsTestCase):
+    def summary(self, worker):
+        self.client.force_login(self.manager)
+        response = self.client.get(
+            reverse(
+                "projectphase-worker-summary",
+                kwargs={
+                    "projectphase_pk": self.projectphase.id,
+                    "worker_pk": worker.id,
+                },
+            )
+        )
+        return [service["hours"] for service in response.context["services"]]
+
+    def test_rollup_follows_datepoints(self):
+        worker = self.create_workers(1)[0]
+        self.create_datepoints([worker], 3)
+        self.assertEqual(self.summary(worker), [0])
+
+        datepoints = list(DatePoint.objects.all())
+        for datepoint in datepoints:
+            datepoint.approved_manager = True
+            datepoint.approved_client = True
+            datepoint.save()
+        self.assertEqual(self.summary(worker), [6])
+
+        other_task = Task.objects.create(
+            title="Other", project=self.projectphase
+        )
+        datepoints[0].task = other_task
+        datepoints[0].save()
+        datepoints[1].delete()
+        self.assertEqual(self.summary(worker), [2, 2])
+
+        rows = set(HoursRollup.objects.values_list("task", "hours_approved"))
+        rollups.rebuild()
+        self.assertEqual(
+            rows,
+            set(HoursRollup.objects.values_list("task", "hours_approved")),
+        )
+
+    def test_refresh_updates_rows_in_place(self):
+        worker = self.create_workers(1)[0]
+        self.create_datepoints([worker], 3)
+        row = HoursRollup.objects.get()
+
+        # Row inserted meanwhile by another refresh is kept and updated.
+        key = (self.task.id, worker.id, datetime.date(2019, 7, 1))
+        other = HoursRollup.objects.create(
+            projectphase=self.projectphase,
+            task=self.task,
+            worker=worker,
+            month=key[2],
+            hours=5,
+        )
+        DatePoint.objects.filter(worked_date__day=1).update(
+            worked_date=datetime.date(2019, 7, 1)
+        )
+        rollups.refresh([(self.task.id, worker.id, row.month), key])
+
+        self.assertEqual(
+            sorted(HoursRollup.objects.values_list("id", "hours")),
+            [(row.id, 4), (other.id, 2)],
+        )
+
+        DatePoint.objects.filter(worked_date__month=7).update(
+            worked_date=datetime.date(2019, 6, 1)
+        )
+        rollups.refresh([(self.task.id, worker.id, row.month), key])
+        self.assertEqual(
+            list(HoursRollup.objects.values_list("id", "hours")),
+            [(row.id, 6)],
+        )
+
+    def test_full_rebuild_invalidates_bills(self):
+        BillJob.objects.create(
+            key="bill", projectphase=self.projectphase, context="{}"
+        )
+        rollups.rebuild()
+        self.assertFalse(BillJob.objects.exists())
+
+
+class ApproveDatePointsViewTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 5)
+        self.create_datepoints([self.worker], 2, month=7)
+        self.url = reverse("datepoints-approve")
+
+    def test_approve_month_with_single_update(self):
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url,
+                {
+                    "projectphase": self.projectphase.id,
+                    "month": "2019-06",
+                    "approve": "true",
+                },
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["datepoints"]), 5)
+
+        updates = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "projects_datepoint"')
+        ]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(
+            DatePoint.objects.filter(approved_manager=True).count(), 5
+        )
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours_manager", flat=True)),
+            10,
+        )
+
+    def test_client_approves_ids(self):
+        pks = list(DatePoint.objects.values_list("id", flat=True)[:2])
+        self.client.force_login(self.client_user)
+        response = self.client.post(
+            self.url,
+            {"datepoints": ",".join(map(str, pks)), "approve": "true"},
+        )
+        self.assertEqual(sorted(response.json()["datepoints"]), sorted(pks))
+        self.assertEqual(
+            DatePoint.objects.filter(approved_client=True).count(), 2
+        )
+
+    def test_other_manager_and_ended_phase_are_skipped(self):
+        other = self.create_user("Manager2", "Manager")
+        self.client.force_login(other)
+        response = self.client.post(
+            self.url, {"projectphase": self.projectphase.id, "approve": "true"}
+        )
+        self.assertEqual(response.json()["datepoints"], [])
+
+        ProjectPhase.objects.update(ongoing=False)
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            self.url, {"projectphase": self.projectphase.id, "approve": "true"}
+        )
+        self.assertEqual(response.json()["datepoints"], [])
+
+    def test_worker_cannot_approve(self):
+        self.client.force_login(self.worker)
+        response = self.client.post(
+            self.url, {"projectphase": self.projectphase.id, "approve": "true"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_detail_approves_through_bulk_endpoint(self):
+        datepoint = DatePoint.objects.first()
+        self.client.force_login(self.manager)
+        response = self.client.get(
+            reverse("datepoint-detail", args=[datepoint.id])
+        )
+        self.assertContains(response, "projects/approve.js")
+        self.assertContains(response, "csrf_token")
+
+        response = self.client.get(f"/datepoint/{datepoint.id}/approve/")
+        self.assertEqual(response.status_code, 404)
+        datepoint.refresh_from_db()
+        self.assertFalse(datepoint.approved_manager)
+
+    def test_invalid_month_is_refused(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            self.url,
+            {
+                "projectphase": self.projectphase.id,
+                "month": "2019-13",
+                "approve": "true",
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("month", response.json()["errors"])
+
+        for name, args in [
+            ("projectphase-date-table", [self.projectphase.id, 13, 2019]),
+            ("projectphase-jira-view", [self.projectphase.id, 13, 2019]),
+        ]:
+            response = self.client.get(reverse(name, args=args))
+            self.assertEqual(response.status_code, 404)
+
+        self.client.force_login(self.worker)
+        response = self.client.get(
+            reverse("worker-summary-month", args=[self.worker.id, 13, 2019])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class WorkerSummaryTest(ProjectsTestCase):
+    def create_project(self, title, worker, client=None):
+        project = Project.objects.create(
+            title=title, description="", manager=self.manager
+        )
+        project.worker.add(worker)
+        if client is not None:
+            project.client.add(client)
+        projectphase = ProjectPhase.objects.create(
+            title="Phase", project=project
+        )
+        return Task.objects.create(title="Task", project=projectphase)
+
+    def summary(self, worker):
+        self.client.force_login(worker)
+        response = self.client.get(
+            reverse("worker-summary-month", args=[worker.id, 6, 2019])
+        )
+        return response.context
+
+    def test_totals(self):
+        worker = self.create_workers(1)[0]
+        worker.profile.price_per_hour = 10
+        worker.profile.save()
+        other = self.create_project("Other", worker)
+        self.create_project("Idle", worker)
+
+        for task, day, manager, client in [
+            (self.task, 1, True, True),
+            (self.task, 2, True, False),
+            (other, 1, True, False),
+            (other, 2, False, False),
+        ]:
+            DatePoint.objects.create(
+                task=task,
+                worker=worker,
+                title="Work",
+                worked_time=3,
+                worked_date=datetime.date(2019, 6, day),
+                approved_manager=manager,
+                approved_client=client,
+            )
+        # Other months are not counted.
+        DatePoint.objects.create(
+            task=other,
+            worker=worker,
+            title="Work",
+            worked_time=5,
+            worked_date=datetime.date(2019, 7, 1),
+            approved_manager=True,
+        )
+
+        context = self.summary(worker)
+        self.assertEqual(
+            context["services"],
+            [
+                {"title": "Project", "hours": 3},
+                {"title": "Other", "hours": 3},
+                {"title": "Idle", "hours": 0},
+            ],
+        )
+        self.assertEqual(context["total_hours"], 6)
+        self.assertEqual(context["pay"], 60)
+
+        # Hours of projects the worker was removed from are not paid.
+        other.project.project.worker.remove(worker)
+        context = self.summary(worker)
+        self.assertEqual(context["total_hours"], 3)
+        self.assertEqual(context["pay"], 30)
+
+    def test_query_count_does_not_grow(self):
+        worker = self.create_workers(1)[0]
+        self.create_datepoints([worker], 2)
+        url = reverse("worker-summary-month", args=[worker.id, 6, 2019])
+        small = self.count_queries(url, worker)
+
+        for i in range(5):
+            task = self.create_project(
+                f"Project {i}", worker, self.client_user
+            )
+            for day in range(1, 11):
+                DatePoint.objects.create(
+                    task=task,
+                    worker=worker,
+                    title="Work",
+                    worked_time=1,
+                    worked_date=datetime.date(2019, 6, day),
+                )
+        large = self.count_queries(url, worker)
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 9)
+
+
+class PayrollTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workers = self.create_workers(2)
+        self.workers[0].profile.price_per_hour = 10
+        self.workers[0].profile.save()
+        self.create_datepoints(self.workers, 2)
+        self.create_datepoints(self.workers, 1, month=8)
+        DatePoint.objects.exclude(
+            worker=self.workers[1], worked_date__month=8
+        ).update(approved_manager=True, approved_client=True)
+        rollups.rebuild()
+
+    def test_rows(self):
+        rows = list(
+            payroll.payroll_rows(
+                datetime.date(2019, 1, 1), datetime.date(2019, 12, 1)
+            )
+        )
+        pk = self.project.id
+        self.assertEqual(
+            rows,
+            [
+                ("Worker0", "2019-06", pk, "Project", 4, 10, 40),
+                ("Worker0", "2019-08", pk, "Project", 2, 10, 20),
+                ("Worker1", "2019-06", pk, "Project", 4, None, None),
+            ],
+        )
+
+        rows = list(
+            payroll.payroll_rows(
+                datetime.date(2019, 7, 1), datetime.date(2019, 12, 1)
+            )
+        )
+        self.assertEqual(len(rows), 1)
+
+    def test_report_and_command(self):
+        url = reverse("payroll")
+        params = {"start": "2019-01", "end": "2019-12"}
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url, params).status_code, 403)
+
+        self.manager.is_staff = True
+        self.manager.save()
+        response = self.client.get(url, params)
+        workers = response.context["workers"]
+        self.assertEqual(
+            [item["username"] for item in workers], ["Worker0", "Worker1"]
+        )
+        self.assertEqual(workers[0]["pay"], 60)
+        self.assertEqual(
+            [
+                [cell["hours"] for cell in row["cells"]]
+                for row in workers[0]["rows"]
+            ],
+            [[4], [2]],
+        )
+
+        response = self.client.get(reverse("payroll-csv"), params)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 1 + 3)
+
+        out = io.StringIO()
+        call_command("payroll", start="2019-06", end="2019-06", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 2)
+
+
+    def test_closed_and_open_phases_with_different_prices(self):
+        closing.close_phases(ProjectPhase.objects.all())
+        for worker, price in zip(self.workers, [20, 5]):
+            worker.profile.price_per_hour = price
+            worker.profile.save()
+
+        task = Task.objects.create(
+            title="Task",
+            project=ProjectPhase.objects.create(
+                title="Open", project=self.project
+            ),
+        )
+        for worker, month in zip(self.workers, [6, 8]):
+            DatePoint.objects.create(
+                task=task,
+                worker=worker,
+                title="Work",
+                worked_time=3,
+                worked_date=datetime.date(2019, month, 10),
+                approved_manager=True,
+                approved_client=True,
+            )
+
+        workers = payroll.payroll_matrix(
+            payroll.payroll_rows(
+                datetime.date(2019, 1, 1), datetime.date(2019, 12, 1)
+            )
+        )
+        self.assertEqual(
+            [row["cells"] for row in workers[0]["rows"]],
+            [
+                [{"hours": 7, "prices": [10, 20]}],
+                [{"hours": 2, "prices": [10]}],
+            ],
+        )
+        self.assertEqual(workers[0]["pay"], 4 * 10 + 3 * 20 + 2 * 10)
+
+        # Hours closed without price are not paid, whatever comes after.
+        self.assertEqual(
+            [row["cells"] for row in workers[1]["rows"]],
+            [
+                [{"hours": 4, "prices": [None]}],
+                [{"hours": 3, "prices": [5]}],
+            ],
+        )
+        self.assertIsNone(workers[1]["pay"])
+
+    def test_projects_sharing_title_get_own_columns(self):
+        project = Project.objects.create(title="Project", manager=self.manager)
+        project.worker.add(self.workers[0])
+        task = Task.objects.create(
+            title="Task",
+            project=ProjectPhase.objects.create(
+                title="Phase", project=project
+            ),
+        )
+        DatePoint.objects.create(
+            task=task,
+            worker=self.workers[0],
+            title="Work",
+            worked_time=3,
+            worked_date=datetime.date(2019, 6, 10),
+            approved_manager=True,
+        )
+
+        workers = payroll.payroll_matrix(
+            payroll.payroll_rows(
+                datetime.date(2019, 1, 1), datetime.date(2019, 12, 1)
+            )
+        )
+        self.assertEqual(
+            workers[0]["projects"],
+            [
+                {"id": self.project.id, "title": "Project"},
+                {"id": project.id, "title": "Project"},
+            ],
+        )
+        self.assertEqual(
+            [
+                [cell["hours"] for cell in row["cells"]]
+                for row in workers[0]["rows"]
+            ],
+            [[4, 3], [2, 0]],
+        )
+
+
+class MonthChoicesTest(ProjectsTestCase):
+    def test_months_come_from_rollups(self):
+        worker = self.create_workers(1)[0]
+        self.create_datepoints([worker], 1, month=7)
+        DatePoint.objects.create(
+            task=self.task,
+            worker=worker,
+            title="Work",
+            worked_time=1,
+            worked_date="2019-05-02",
+        )
+
+        self.client.force_login(self.manager)
+        response = self.client.get(self.projectphase.get_absolute_url())
+        self.assertEqual(
+            response.context["form"].fields["dates"].choices,
+            [("2019-05", "2019-05"), ("2019-07", "2019-07")],
+        )
+
+        self.client.force_login(worker)
+        response = self.client.get(
+            reverse("worker-summary", kwargs={"worker_pk": worker.id})
+        )
+        self.assertEqual(
+            response.context["form"].fields["dates"].choices,
+            [("2019-05", "2019-05"), ("2019-07", "2019-07")],
+        )
+
+
+class QueryPlanTest(ProjectsTestCase):
+    """ Datepoint and rollup queries of every view have to use an index. """
+
+    # Tables that grow with the amount of logged work.
+    tables = ("projects_datepoint", "projects_hoursrollup")
+
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 3)
+        self.datepoint = DatePoint.objects.first()
+
+    def plans(self, url, user):
+        """ Yields (detail, sql) of plans of queries of the tables. """
+
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or not any(
+                    table in sql for table in self.tables
+                ):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                for row in cursor.fetchall():
+                    yield row[-1], sql
+
+    def full_scans(self, url, user):
+        return [
+            f"{detail}: {sql}"
+            for detail, sql in self.plans(url, user)
+            if detail.startswith("SCAN")
+            and any(table in detail for table in self.tables)
+        ]
+
+    def test_views_use_indexes(self):
+        phase = self.projectphase.id
+        worker = self.worker.id
+        urls = [
+            (reverse("projectphase-detail", args=[phase]), self.manager),
+            (reverse("projectphase-detail-all", args=[phase]), self.manager),
+            (
+                reverse("projectphase-date-table", args=[phase, 6, 2019]),
+                self.manager,
+            ),
+            (
+                reverse("projectphase-jira-view", args=[phase, 6, 2019]),
+                self.manager,
+            ),
+            (
+                reverse("worker-projectphase-calendar", args=[phase, worker]),
+                self.manager,
+            ),
+            (
+                reverse("calendar-events", args=[phase, worker])
+                + "?start=2019-06-01&end=2019-07-01",
+                self.manager,
+            ),
+            (
+                reverse("worker-projectphase-table", args=[phase, worker]),
+                self.manager,
+            ),
+            (
+                reverse("task-projectphase-table", args=[phase, self.task.id]),
+                self.manager,
+            ),
+            (
+                reverse("projectphase-worker-summary", args=[phase, worker]),
+                self.manager,
+            ),
+            (
+                reverse("datepoint-list", args=[phase, worker, "2019-06-01"]),
+                self.manager,
+            ),
+            (
+                reverse("datepoint-detail", args=[self.datepoint.id]),
+                self.manager,
+            ),
+            (reverse("worker-projectphase-detail", args=[phase]), self.worker),
+            (reverse("worker-summary", args=[worker]), self.worker),
+            (
+                reverse("worker-summary-month", args=[worker, 6, 2019]),
+                self.worker,
+            ),
+        ]
+
+        for url, user in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.full_scans(url, user), [])
+
+    def test_tables_are_paged_in_index_order(self):
+        phase = self.projectphase.id
+        worker = self.worker.id
+        cursor = tables.encode_cursor(self.datepoint)
+        urls = [
+            reverse("projectphase-detail-all", args=[phase]),
+            reverse("projectphase-date-table", args=[phase, 6, 2019]),
+            reverse("worker-projectphase-table", args=[phase, worker]),
+            reverse("task-projectphase-table", args=[phase, self.task.id]),
+            reverse("datepoint-list", args=[phase, worker, "2019-06-01"]),
+        ]
+
+        for url in urls:
+            for query in ["", "?order=asc", f"?after={cursor}"]:
+                with self.subTest(url=url + query):
+                    plans = self.plans(url + query, self.manager)
+                    pages = [
+                        (detail, sql)
+                        for detail, sql in plans
+                        if 'ORDER BY "projects_datepoint"' in sql
+                    ]
+                    self.assertTrue(pages)
+                    self.assertEqual(
+                        [
+                            f"{detail}: {sql}"
+                            for detail, sql in pages
+                            if "TEMP B-TREE" in detail
+                        ],
+                        [],
+                    )
+
+
+@override_settings(BILL_WORKERS=0)
+class BillTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project.price_per_hour = 10
+        self.project.client_detail = ClientDetail.objects.create(
+            name="Client", street="", postal_code="", city="", nip=""
+        )
+        self.project.save()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 2)
+        DatePoint.objects.update(approved_manager=True, approved_client=True)
+        rollups.rebuild()
+        self.url = reverse("bill-for-phase", args=[self.projectphase.id])
+        self.client.force_login(self.manager)
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_bill_is_rendered_once(self, render_pdf):
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+
+        while bills.process_next_job():
+            pass
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"%PDF")
+        self.assertEqual(render_pdf.call_count, 1)
+
+        context = render_pdf.call_args[0][3]
+        self.assertEqual(context["total"], "40,00")
+
+    def test_approval_change_invalidates_bill(self):
+        self.client.get(self.url)
+        self.assertEqual(BillJob.objects.count(), 1)
+
+        datepoint = DatePoint.objects.first()
+        datepoint.approved_client = False
+        datepoint.save()
+        self.assertEqual(BillJob.objects.count(), 0)
+
+    @patch(
+        "projects.bills.render_pdf_from_template",
+        side_effect=OSError("wkhtmltopdf not found"),
+    )
+    def test_failed_job_is_queued_again(self, render_pdf):
+        self.client.get(self.url)
+        bills.process_next_job()
+        self.assertEqual(BillJob.objects.get().status, BillJob.FAILED)
+
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(BillJob.objects.get().status, BillJob.QUEUED)
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_job_of_dead_worker_is_taken_again(self, render_pdf):
+        self.client.get(self.url)
+        # Worker claimed the job and died before finishing it.
+        BillJob.objects.update(
+            status=BillJob.RUNNING, started_at=timezone.now()
+        )
+        self.assertFalse(bills.process_next_job())
+
+        BillJob.objects.update(
+            started_at=timezone.now()
+            - datetime.timedelta(seconds=settings.BILL_JOB_LEASE + 1)
+        )
+        self.assertTrue(bills.process_next_job())
+        self.assertEqual(BillJob.objects.get().status, BillJob.DONE)
+
+        BillJob.objects.update(
+            status=BillJob.RUNNING,
+            started_at=timezone.now()
+            - datetime.timedelta(seconds=settings.BILL_JOB_LEASE + 1),
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(BillJob.objects.get().status, BillJob.QUEUED)
+
+
+@override_settings(BILL_WORKERS=0)
+class PeriodBillsTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project.price_per_hour = 10
+        self.project.client_detail = ClientDetail.objects.create(
+            name="Client", street="", postal_code="", city="", nip=""
+        )
+        self.project.save()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 2)
+        self.create_datepoints([self.worker], 1, month=8)
+
+        # Project without client details is not billed.
+        other = Project.objects.create(
+            title="Other", description="", manager=self.manager
+        )
+        other.worker.add(self.worker)
+        other_phase = ProjectPhase.objects.create(
+            title="Phase", project=other
+        )
+        DatePoint.objects.create(
+            task=Task.objects.create(title="Task", project=other_phase),
+            worker=self.worker,
+            title="Work",
+            worked_time=2,
+            worked_date=datetime.date(2019, 6, 1),
+        )
+
+        DatePoint.objects.update(approved_manager=True, approved_client=True)
+        rollups.rebuild()
+
+    def bill_names(self, archive):
+        with zipfile.ZipFile(io.BytesIO(archive)) as f:
+            return f.namelist()
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_bills_are_rendered_once(self, render_pdf):
+        archive, count, errors = bills.period_bills(
+            datetime.date(2019, 6, 1),
+            datetime.date(2019, 7, 1),
+            Project.objects.all(),
+            threads=0,
+        )
+        self.assertEqual(count, 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            self.bill_names(archive), [f"bill-{self.project.id}-project.pdf"]
+        )
+        context = render_pdf.call_args[0][3]
+        self.assertEqual(context["total"], "40,00")
+        self.assertEqual(context["period"], "2019-06 - 2019-07")
+
+        bills.period_bills(
+            datetime.date(2019, 6, 1),
+            datetime.date(2019, 7, 1),
+            Project.objects.all(),
+            threads=0,
+        )
+        self.assertEqual(render_pdf.call_count, 1)
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_bills_are_rendered_by_threads(self, render_pdf):
+        phase = ProjectPhase.objects.create(
+            title="Second", project=self.project
+        )
+        second = Project.objects.create(
+            title="Second",
+            description="",
+            manager=self.manager,
+            price_per_hour=5,
+            client_detail=self.project.client_detail,
+        )
+        second.worker.add(self.worker)
+        for task in [
+            Task.objects.create(title="Task", project=phase),
+            Task.objects.create(
+                title="Task",
+                project=ProjectPhase.objects.create(
+                    title="Phase", project=second
+                ),
+            ),
+        ]:
+            DatePoint.objects.create(
+                task=task,
+                worker=self.worker,
+                title="Work",
+                worked_time=1,
+                worked_date=datetime.date(2019, 8, 2),
+                approved_manager=True,
+                approved_client=True,
+            )
+
+        archive, count, errors = bills.period_bills(
+            datetime.date(2019, 8, 1),
+            datetime.date(2019, 8, 1),
+            Project.objects.all(),
+            threads=2,
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            BillJob.objects.filter(status=BillJob.DONE).count(), 2
+        )
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_manager_downloads_zip(self, render_pdf):
+        url = reverse("period-bills")
+        self.client.force_login(self.manager)
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(
+            url, {"start": "2019-06", "end": "2019-06"}
+        )
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(len(self.bill_names(response.content)), 1)
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(DATEPOINT_PAGE_SIZE=5)
+class DatePointTableTest(ProjectsTestCase):
+    def table_url(self):
+        return reverse("projectphase-detail-all", args=[self.projectphase.id])
+
+    def test_pages_follow_cursor(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 6)
+        self.client.force_login(self.manager)
+
+        response = self.client.get(self.table_url())
+        seen = list(response.context["datepoint_ids"])
+        query = response.context["next_query"]
+        while query:
+            data = self.client.get(f"{self.table_url()}?{query}").json()
+            seen += data["datepoints"]
+            query = data["next"]
+
+        expected = DatePoint.objects.order_by("-worked_date", "-id")
+        self.assertEqual(seen, list(expected.values_list("id", flat=True)))
+
+    def test_filters(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 3)
+        DatePoint.objects.filter(worker=workers[0], worked_date__day=1).update(
+            approved_manager=True
+        )
+        self.client.force_login(self.manager)
+
+        response = self.client.get(
+            self.table_url(),
+            {"worker": workers[0].id, "approved_manager": "false"},
+        )
+        datepoints = DatePoint.objects.filter(
+            id__in=response.context["datepoint_ids"]
+        )
+        self.assertEqual(len(datepoints), 2)
+        self.assertTrue(all(item.worker == workers[0] for item in datepoints))
+
+        response = self.client.get(
+            self.table_url(), {"order": "asc", "fragment": "1"}
+        )
+        first = DatePoint.objects.get(id=response.json()["datepoints"][0])
+        self.assertEqual(first.worked_date, datetime.date(2019, 6, 1))
+
+        response = self.client.get(
+            self.table_url(), {"after": "broken", "fragment": "1"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 5)
+        small = self.count_queries(self.table_url(), self.manager)
+
+        workers += self.create_workers(3)
+        self.create_datepoints(workers[2:], 20)
+        large = self.count_queries(self.table_url(), self.manager)
+
+        self.assertEqual(small, large)
+
+
+class FragmentCacheTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workers = self.create_workers(2)
+        self.create_datepoints(self.workers, 3)
+        self.url = reverse(
+            "projectphase-detail-all", args=[self.projectphase.id]
+        )
+
+    def get_rows(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url).context["rows"]
+
+    def test_cached_page_skips_queries(self):
+        first = self.count_queries(self.url, self.manager)
+        second = self.count_queries(self.url, self.manager)
+        self.assertLess(second, first)
+
+        jira = reverse(
+            "projectphase-jira-view", args=[self.projectphase.id, 6, 2019]
+        )
+        first = self.count_queries(jira, self.manager)
+        second = self.count_queries(jira, self.manager)
+        self.assertLess(second, first)
+
+    def test_changes_invalidate_fragments(self):
+        self.assertEqual(self.get_rows(self.manager).count("Disapprove"), 0)
+
+        self.client.post(
+            reverse("datepoints-approve"),
+            {"projectphase": self.projectphase.id, "approve": "true"},
+        )
+        self.assertEqual(self.get_rows(self.manager).count("Disapprove"), 6)
+
+        self.task.title = "Renamed"
+        self.task.save()
+        self.assertIn("Renamed", self.get_rows(self.manager))
+
+        DatePoint.objects.first().delete()
+        self.assertEqual(self.get_rows(self.manager).count("Disapprove"), 5)
+
+    def test_fragments_are_cached_per_role(self):
+        self.client.force_login(self.manager)
+        self.client.post(
+            reverse("datepoints-approve"),
+            {"projectphase": self.projectphase.id, "approve": "true"},
+        )
+
+        self.assertEqual(self.get_rows(self.manager).count("Disapprove"), 6)
+        rows = self.get_rows(self.client_user)
+        self.assertEqual(rows.count("Disapprove"), 0)
+
+
+class CalendarEventsTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workers = self.create_workers(2)
+        self.create_datepoints(self.workers, 3)
+        self.create_datepoints(self.workers, 2, month=7)
+
+    def events_url(self, worker):
+        return reverse(
+            "calendar-events", args=[self.projectphase.id, worker.id]
+        )
+
+    def get_events(self, user, worker, **headers):
+        self.client.force_login(user)
+        return self.client.get(
+            self.events_url(worker),
+            {"start": "2019-06-01T00:00:00+02:00", "end": "2019-07-01"},
+            **headers,
+        )
+
+    def test_events_of_window(self):
+        DatePoint.objects.filter(worked_date__day=1).update(
+            approved_manager=True
+        )
+
+        response = self.get_events(self.manager, self.workers[0])
+        events = response.json()
+
+        self.assertEqual(
+            [event["start"] for event in events],
+            ["2019-06-01", "2019-06-02", "2019-06-03"],
+        )
+        self.assertEqual(
+            [event["color"] for event in events], ["green", "red", "red"]
+        )
+        self.assertEqual(events[0]["title"], "Task | 2h")
+        datepoint = DatePoint.objects.get(
+            worker=self.workers[0], worked_date=datetime.date(2019, 6, 1)
+        )
+        self.assertEqual(
+            events[0]["url"],
+            reverse("datepoint-detail", args=[datepoint.id]),
+        )
+
+    def test_unchanged_window_is_not_modified(self):
+        response = self.get_events(self.manager, self.workers[0])
+        etag = response["ETag"]
+
+        response = self.get_events(
+            self.manager, self.workers[0], HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(
+            reverse("datepoints-approve"),
+            {"projectphase": self.projectphase.id, "approve": "true"},
+        )
+        response = self.get_events(
+            self.manager, self.workers[0], HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_worker_reads_only_own_events(self):
+        response = self.get_events(self.workers[0], self.workers[0])
+        self.assertEqual(len(response.json()), 3)
+        self.assertNotIn("color", response.json()[0])
+
+        response = self.get_events(self.workers[0], self.workers[1])
+        self.assertEqual(response.status_code, 403)
+
+
+class DatePointExportTest(ProjectsTestCase):
+    def export(self, user, name, pk, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse(name, args=[pk]), params)
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content).decode()
+        return [line.split(",") for line in content.splitlines()]
+
+    def test_export_rows(self):
+        self.project.price_per_hour = 100
+        self.project.save()
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 3)
+        self.create_datepoints(workers, 1, month=7)
+        DatePoint.objects.filter(worker=workers[0]).update(
+            approved_manager=True
+        )
+
+        rows = self.export(
+            self.manager, "projectphase-export", self.projectphase.id
+        )
+        self.assertEqual(rows[0][0], "task")
+        self.assertEqual(len(rows), 1 + 8)
+        self.assertEqual(
+            rows[1],
+            ["Task", "Worker0", "2019-06-01", "2", "True", "False", "200"],
+        )
+
+        rows = self.export(
+            self.client_user,
+            "project-export",
+            self.project.id,
+            worker=workers[1].id,
+            month="2019-07",
+        )
+        self.assertEqual(len(rows), 1 + 1)
+        self.assertEqual(rows[1][1:3], ["Worker1", "2019-07-01"])
+
+    def test_worker_exports_own_datepoints(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 2)
+
+        rows = self.export(
+            workers[0], "projectphase-export", self.projectphase.id
+        )
+        self.assertEqual({row[1] for row in rows[1:]}, {"Worker0"})
+
+        rows = self.export(workers[0], "worker-export", workers[0].id)
+        self.assertEqual(len(rows), 1 + 2)
+        self.assertEqual(rows[1][6], "")
+
+        self.client.force_login(workers[0])
+        response = self.client.get(
+            reverse("worker-export", args=[workers[1].id])
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class RequestStatsTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        stats.clear()
+
+    def test_requests_are_recorded(self):
+        workers = self.create_workers(2)
+        self.create_datepoints(workers, 2)
+        url = reverse(
+            "projectphase-jira-view",
+            kwargs={
+                "projectphase_pk": self.projectphase.id,
+                "month": 6,
+                "year": 2019,
+            },
+        )
+        queries = self.count_queries(url, self.manager)
+        self.client.get(url)
+
+        report = stats.report()["projectphase-jira-view"]
+        self.assertEqual(report["requests"], 2)
+        self.assertEqual(report["queries"]["max"], queries)
+        self.assertGreater(report["render_ms"]["max"], 0)
+        self.assertGreaterEqual(
+            report["total_ms"]["p50"], report["sql_ms"]["p50"]
+        )
+
+    def test_render_and_streaming_are_recorded(self):
+        self.client.force_login(self.manager)
+        self.client.get(reverse("project-home"))
+        report = stats.report()["project-home"]
+        self.assertGreater(report["render_ms"]["max"], 0)
+
+        self.create_datepoints(self.create_workers(1), 2)
+        response = self.client.get(
+            reverse("projectphase-export", args=[self.projectphase.id])
+        )
+        self.assertNotIn("projectphase-export", stats.report())
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(response.streaming_content)
+
+        report = stats.report()["projectphase-export"]
+        self.assertGreaterEqual(report["queries"]["max"], len(queries))
+        self.assertGreater(len(queries), 0)
+
+    def test_report_is_for_staff_only(self):
+        url = reverse("request-stats")
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.manager.is_staff = True
+        self.manager.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("request-stats", response.json())
+
+
+class DatePointApiTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 3)
+        self.worker_key = ApiToken.create(self.worker)
+        self.manager_key = ApiToken.create(self.manager)
+
+    def api(self, method, name, key, body=None, **kwargs):
+        return getattr(self.client, method)(
+            reverse(name, kwargs=kwargs),
+            json.dumps(body) if body is not None else None,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {key}",
+        )
+
+    def item(self, day, **kwargs):
+        item = {
+            "task": self.task.id,
+            "title": "Api",
+            "worked_time": 3,
+            "worked_date": f"2019-06-{day:02}",
+        }
+        item.update(kwargs)
+        return item
+
+    def test_token_is_required(self):
+        response = self.client.get(reverse("api-datepoints"))
+        self.assertEqual(response.status_code, 401)
+        response = self.api("get", "api-datepoints", "wrong")
+        self.assertEqual(response.status_code, 401)
+
+    def test_list_and_detail(self):
+        response = self.client.get(
+            reverse("api-datepoints"),
+            {"order": "asc"},
+            HTTP_AUTHORIZATION=f"Token {self.manager_key}",
+        )
+        datepoints = response.json()["datepoints"]
+        self.assertEqual(
+            [item["worked_date"] for item in datepoints],
+            ["2019-06-01", "2019-06-02", "2019-06-03"],
+        )
+
+        other = self.create_user("Manager2", "Manager")
+        response = self.api(
+            "get",
+            "api-datepoint",
+            ApiToken.create(other),
+            datepoint_pk=datepoints[0]["id"],
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_create(self):
+        items = [self.item(day) for day in range(10, 20)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api(
+                "post", "api-datepoints-bulk", self.worker_key, items
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": 10})
+
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "projects_datepoint"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours", flat=True)), 36
+        )
+
+    def test_bulk_create_is_all_or_nothing(self):
+        other_task = Task.objects.create(
+            title="Other",
+            project=ProjectPhase.objects.create(
+                title="Other",
+                project=Project.objects.create(title="Other", description=""),
+            ),
+        )
+        items = [
+            self.item(10),
+            self.item(11, worked_time=20),
+            self.item(12, task=other_task.id),
+            "not an object",
+        ]
+        response = self.api(
+            "post", "api-datepoints-bulk", self.worker_key, items
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()["errors"]), ["1", "2", "3"])
+        self.assertEqual(DatePoint.objects.count(), 3)
+
+        response = self.api(
+            "post", "api-datepoints-bulk", self.manager_key, [self.item(10)]
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_and_update(self):
+        response = self.api(
+            "post", "api-datepoints", self.worker_key, self.item(10)
+        )
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()["id"]
+
+        DatePoint.objects.filter(id=pk).update(approved_manager=True)
+        response = self.api(
+            "patch",
+            "api-datepoint",
+            self.worker_key,
+            {"worked_time": 5},
+            datepoint_pk=pk,
+        )
+        self.assertEqual(response.json()["worked_time"], 5)
+        self.assertFalse(response.json()["approved_manager"])
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours", flat=True)), 11
+        )
+
+    def test_approve(self):
+        pks = list(DatePoint.objects.values_list("id", flat=True)[:2])
+        response = self.api(
+            "post",
+            "api-datepoints-approve",
+            self.manager_key,
+            {"datepoints": pks, "approve": True},
+        )
+        self.assertEqual(sorted(response.json()["datepoints"]), sorted(pks))
+        self.assertEqual(
+            DatePoint.objects.filter(approved_manager=True).count(), 2
+        )
+
+        response = self.api(
+            "post",
+            "api-datepoints-approve",
+            self.worker_key,
+            {"datepoints": pks, "approve": True},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_approve_has_to_be_boolean(self):
+        DatePoint.objects.update(approved_manager=True)
+        pks = list(DatePoint.objects.values_list("id", flat=True))
+
+        for body in [
+            {"datepoints": pks},
+            {"datepoints": pks, "approve": "true"},
+            {"datepoints": pks, "approve": 1},
+            {"datepoints": pks, "approve": None},
+        ]:
+            response = self.api(
+                "post", "api-datepoints-approve", self.manager_key, body
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            DatePoint.objects.filter(approved_manager=True).count(), 3
+        )
+
+
+class TimesheetImportTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.url = reverse(
+            "datepoint-import",
+            kwargs={"projectphase_pk": self.projectphase.id},
+        )
+
+    def test_command_reports_rejected_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timesheet.csv")
+            errors_path = os.path.join(directory, "errors.csv")
+            with open(path, "w") as f:
+                f.write(
+                    "task,worker,date,hours,title\n"
+                    "Task,Worker0,2019-06-01,3,Work\n"
+                    f"{self.task.id},Worker0,2019-06-02,4,\n"
+                    "Task,Manager1,2019-06-03,3,Work\n"
+                    "Task,Worker0,2019-06-31,3,Work\n"
+                    "Task,Worker0,2019-06-04,13,Work\n"
+                    "Other,Worker0,2019-06-05,3,Work\n"
+                )
+
+            out = io.StringIO()
+            call_command(
+                "importtimesheet",
+                path,
+                projectphase=self.projectphase.id,
+                errors=errors_path,
+                stdout=out,
+            )
+            self.assertIn("Imported 2 datepoints, rejected 4", out.getvalue())
+
+            with open(errors_path) as f:
+                lines = [row[0] for row in csv.reader(f)]
+            self.assertEqual(lines, ["line", "4", "5", "6", "7"])
+
+        self.assertEqual(
+            list(DatePoint.objects.values_list("title", flat=True)),
+            ["Work", "Task"],
+        )
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours", flat=True)), 7
+        )
+
+    @override_settings(IMPORT_CHUNK_SIZE=50)
+    def test_rows_are_inserted_in_chunks(self):
+        rows = (
+            (
+                number,
+                {
+                    "task": "Task",
+                    "worker": "Worker0",
+                    "date": f"2019-06-{number % 30 + 1:02}",
+                    "hours": "1",
+                },
+            )
+            for number in range(1000)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            created = imports.Importer(self.projectphase).run(
+                rows, lambda *args: self.fail(args)
+            )
+        self.assertEqual(created, 1000)
+
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "projects_datepoint"')
+        ]
+        self.assertEqual(len(inserts), 20)
+
+    def test_worker_uploads_calendar(self):
+        calendar = (
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\n"
+            "SUMMARY:Long\r\n"
+            "  meeting\r\n"
+            "CATEGORIES:Task\r\n"
+            "DTSTART:20190603T090000\r\n"
+            "DTEND:20190603T120000\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "SUMMARY:Review\r\n"
+            "CATEGORIES:Task\r\n"
+            "DTSTART;VALUE=DATE:20190604\r\n"
+            "DURATION:PT2H\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "SUMMARY:Unknown\r\n"
+            "DTSTART:20190605T090000\r\n"
+            "DURATION:PT2H\r\n"
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        )
+        upload = io.BytesIO(calendar.encode())
+        upload.name = "calendar.ics"
+
+        self.client.force_login(self.worker)
+        response = self.client.post(self.url, {"file": upload})
+        self.assertEqual(response.context["created"], 2)
+        self.assertEqual(response.context["errors"][0]["line"], 15)
+        self.assertEqual(
+            sorted(
+                DatePoint.objects.values_list(
+                    "title", "worker__username", "worked_time"
+                )
+            ),
+            [("Long meeting", "Worker0", 3), ("Review", "Worker0", 2)],
+        )
+
+    def test_worker_outside_project_and_broken_csv_are_refused(self):
+        other = self.create_user("Worker9", "Worker")
+        with self.assertRaisesMessage(ValueError, "not a worker"):
+            imports.Importer(self.projectphase, other)
+
+        # Field over the limit of the csv module.
+        size = csv.field_size_limit() + 1
+        upload = io.BytesIO(b"task,worker,date,hours\nTask," + b"x" * size)
+        upload.name = "timesheet.csv"
+        self.client.force_login(self.manager)
+        response = self.client.post(self.url, {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "Invalid csv file", str(response.context["form"].errors)
+        )
+        self.assertFalse(DatePoint.objects.exists())
+
+    def test_client_and_ended_phase_are_refused(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        ProjectPhase.objects.update(ongoing=False)
+        upload = io.BytesIO(b"task,worker,date,hours\n")
+        upload.name = "timesheet.csv"
+        self.client.force_login(self.manager)
+        response = self.client.post(self.url, {"file": upload})
+        self.assertIn("has ended", str(response.context["form"].errors))
+
+
+class DatabaseTest(ProjectsTestCase):
+    def test_reads_in_replica_block_are_routed(self):
+        router = routers.ReplicaRouter()
+        with patch.dict(settings.DATABASES, replica={}):
+            self.assertIsNone(router.db_for_read(DatePoint))
+            with routers.replica():
+                with routers.replica():
+                    self.assertEqual(router.db_for_read(DatePoint), "replica")
+                self.assertEqual(router.db_for_read(DatePoint), "replica")
+                self.assertIsNone(router.db_for_read(BillJob))
+                cache_model = DatabaseCache("cache", {}).cache_model_class
+                self.assertIsNone(router.db_for_read(cache_model))
+                self.assertEqual(router.db_for_write(DatePoint), "default")
+            self.assertIsNone(router.db_for_read(DatePoint))
+
+        # Without a replica reads stay on the default database.
+        with routers.replica():
+            self.assertIsNone(router.db_for_read(DatePoint))
+
+    def test_streamed_report_reads_from_replica(self):
+        self.create_datepoints(self.create_workers(1), 2)
+        depths = []
+
+        def db_for_read(router, model, **hints):
+            if model is DatePoint:
+                depths.append(getattr(routers.state, "depth", 0))
+
+        self.client.force_login(self.manager)
+        with patch.object(
+            routers.ReplicaRouter, "db_for_read", autospec=True
+        ) as mock:
+            mock.side_effect = db_for_read
+            response = self.client.get(
+                reverse(
+                    "projectphase-export",
+                    kwargs={"projectphase_pk": self.projectphase.id},
+                )
+            )
+            content = b"".join(response.streaming_content)
+
+        self.assertEqual(len(content.splitlines()), 3)
+        self.assertTrue(depths)
+        self.assertTrue(all(depths))
+
+    def test_permissions_and_caches_are_not_read_from_replica(self):
+        worker = self.create_workers(1)[0]
+        self.create_datepoints([worker], 2)
+        reads = []
+
+        def db_for_read(router, model, **hints):
+            reads.append((model, routers.reading_replica()))
+
+        self.client.force_login(self.manager)
+        with patch.dict(settings.DATABASES, replica={}), patch.object(
+            routers.ReplicaRouter, "db_for_read", autospec=True
+        ) as mock, patch.object(cache, "set", wraps=cache.set) as cache_set:
+            mock.side_effect = db_for_read
+            response = self.client.get(
+                reverse(
+                    "projectphase-worker-summary",
+                    kwargs={
+                        "projectphase_pk": self.projectphase.id,
+                        "worker_pk": worker.id,
+                    },
+                )
+            )
+        self.assertEqual(response.status_code, 200)
+
+        replica_models = {model for model, replica in reads if replica}
+        self.assertIn(HoursRollup, replica_models)
+        # Memberships are built from the primary.
+        self.assertNotIn(Project, replica_models)
+        self.assertNotIn(Group, replica_models)
+        # Fragments read from the replica are not cached.
+        self.assertFalse(
+            [
+                call
+                for call in cache_set.call_args_list
+                if ":worker-summary:" in call[0][0]
+            ]
+        )
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only.")
+        pragmas = sqlite.get_pragmas(
+            connection, ["synchronous", "cache_size", "busy_timeout"]
+        )
+        # Synchronous NORMAL.
+        self.assertEqual(pragmas["synchronous"], 1)
+        self.assertEqual(
+            pragmas["cache_size"], settings.SQLITE_PRAGMAS["cache_size"]
+        )
+        self.assertEqual(
+            pragmas["busy_timeout"], settings.SQLITE_PRAGMAS["busy_timeout"]
+        )
+
+    def test_maintenance_report(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only.")
+        # Maintenance cannot run within the transaction of the test.
+        out = io.StringIO()
+        call_command(
+            "sqlitemaintenance",
+            report_only=True,
+            stdout=out,
+            stderr=io.StringIO(),
+        )
+        self.assertIn("journal_mode=", out.getvalue())
+        if sqlite.object_sizes(connection) is not None:
+            self.assertIn("projects_datepoint", out.getvalue())
+
+
+class WriteServiceTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.ended_phase = ProjectPhase.objects.create(
+            title="Ended", project=self.project
+        )
+        self.ended_task = Task.objects.create(
+            title="Ended", project=self.ended_phase
+        )
+        self.create_datepoints([self.worker], 2)
+        ProjectPhase.objects.filter(id=self.ended_phase.id).update(
+            ongoing=False
+        )
+
+    def datepoint(self, task, day=10):
+        return DatePoint(
+            task=task,
+            worker=self.worker,
+            title="Work",
+            worked_time=2,
+            worked_date=datetime.date(2019, 6, day),
+        )
+
+    def test_phases_are_checked_with_one_query(self):
+        with self.assertNumQueries(1):
+            check_ongoing([self.task.id] * 3)
+        with self.assertNumQueries(1):
+            with self.assertRaises(PhaseEndedError):
+                check_ongoing([self.task.id, self.ended_task.id])
+
+    def test_create(self):
+        self.assertEqual(
+            writes.create([self.datepoint(self.task, day) for day in (3, 4)]),
+            2,
+        )
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours", flat=True)), 8
+        )
+
+        with self.assertRaises(PhaseEndedError):
+            writes.create(
+                [self.datepoint(self.task), self.datepoint(self.ended_task)]
+            )
+        self.assertEqual(DatePoint.objects.count(), 4)
+
+    def test_database_refuses_ended_phase(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("No triggers.")
+
+        with self.assertRaises(PhaseEndedError):
+            with writes.phase_ended_errors(), transaction.atomic():
+                DatePoint.objects.bulk_create(
+                    [self.datepoint(self.ended_task)]
+                )
+
+        # Datepoints of the phase cannot be changed after it ends.
+        ProjectPhase.objects.update(ongoing=False)
+        with self.assertRaises(PhaseEndedError):
+            with writes.phase_ended_errors(), transaction.atomic():
+                DatePoint.objects.update(worked_time=3)
+
+    def test_database_keeps_phase_of_task(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("No triggers.")
+
+        writes.create([self.datepoint(self.task, day) for day in (3, 4)])
+        datepoint = DatePoint.objects.first()
+        datepoint.worked_time = 3
+        datepoint.save()
+        self.assertEqual(
+            set(DatePoint.objects.values_list("projectphase_id", flat=True)),
+            {self.projectphase.id},
+        )
+
+        other_phase = ProjectPhase.objects.create(
+            title="Other", project=self.project
+        )
+        other_task = Task.objects.create(title="Other", project=other_phase)
+        writes.update(
+            DatePoint.objects.filter(id=datepoint.id), task=other_task
+        )
+        self.assertEqual(
+            DatePoint.objects.get(id=datepoint.id).projectphase_id,
+            other_phase.id,
+        )
+
+        self.task.project = other_phase
+        self.task.save()
+        self.assertEqual(
+            set(DatePoint.objects.values_list("projectphase_id", flat=True)),
+            {other_phase.id},
+        )
+
+    def test_update_skips_ended_phase_and_moves_rollups(self):
+        other_task = Task.objects.create(
+            title="Other", project=self.projectphase
+        )
+        pks = writes.update(
+            DatePoint.objects.filter(worker=self.worker), task=other_task
+        )
+        self.assertEqual(len(pks), 2)
+        self.assertEqual(
+            list(
+                HoursRollup.objects.filter(hours__gt=0).values_list(
+                    "task_id", "hours"
+                )
+            ),
+            [(other_task.id, 4)],
+        )
+
+        ProjectPhase.objects.update(ongoing=False)
+        self.assertEqual(
+            writes.update(DatePoint.objects.all(), approved_manager=True), []
+        )
+
+
+class ClosingTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 3)
+        DatePoint.objects.update(approved_manager=True, approved_client=True)
+        rollups.rebuild()
+        self.other_phase = ProjectPhase.objects.create(
+            title="Other", project=self.project
+        )
+
+    def test_end_project(self):
+        url = reverse("project-end", args=[self.project.id])
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Project.objects.get(id=self.project.id).ongoing)
+        self.assertFalse(ProjectPhase.objects.filter(ongoing=True).exists())
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.assertEqual(
+            list(
+                HoursSnapshot.objects.values_list(
+                    "projectphase_id", "hours", "hours_approved"
+                )
+            ),
+            [(self.projectphase.id, 6, 6)],
+        )
+
+    def test_caches_are_dropped_after_commit(self):
+        with patch.object(closing, "invalidate") as invalidate:
+            closing.close_projects(Project.objects.all())
+            invalidate.assert_not_called()
+
+            # Test case never commits, callbacks are run like on commit.
+            for sids, callback in connection.run_on_commit:
+                callback()
+        invalidate.assert_called_once()
+        self.assertEqual(
+            sorted(invalidate.call_args[0][0]),
+            [self.projectphase.id, self.other_phase.id],
+        )
+
+    def test_closing_is_set_based(self):
+        projects = [self.project]
+        for i in range(3):
+            project = Project.objects.create(
+                title=f"Project{i}", description="", manager=self.manager
+            )
+            for j in range(3):
+                ProjectPhase.objects.create(title=f"Phase{j}", project=project)
+            projects.append(project)
+
+        queryset = Project.objects.filter(id__in=[p.id for p in projects])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(closing.close_projects(queryset), (4, 11))
+        closed = len(queries)
+
+        for project in Project.objects.all():
+            ProjectPhase.objects.create(title="Phase", project=project)
+        ProjectPhase.objects.update(ongoing=True)
+        Project.objects.update(ongoing=True)
+        with self.assertNumQueries(closed):
+            self.assertEqual(closing.close_projects(queryset), (4, 15))
+
+    @patch("projects.bills.render_pdf_from_template", return_value=b"%PDF")
+    def test_closed_phase_reads_snapshot(self, render_pdf):
+        self.project.price_per_hour = 10
+        self.project.client_detail = ClientDetail.objects.create(
+            name="Client", street="", postal_code="", city="", nip=""
+        )
+        self.project.save()
+        self.client.force_login(self.manager)
+        self.client.post(
+            reverse("projectphase-end", args=[self.projectphase.id])
+        )
+
+        # Frozen hours are billed even if rollups are rebuilt differently.
+        HoursRollup.objects.update(hours_approved=0)
+        context = bills.projectphase_bill_context(self.projectphase)
+        self.assertEqual(context["total"], "60,00")
+        context = bills.project_bill_context(self.project)
+        self.assertEqual(context["total"], "60,00")
+
+        url = reverse(
+            "projectphase-worker-summary",
+            args=[self.projectphase.id, self.worker.id],
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.context["services"][0]["hours"], 6)
+
+    def test_admin_actions(self):
+        User.objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.login(username="admin", password="pass")
+
+        response = self.client.post(
+            reverse("admin:projects_projectphase_changelist"),
+            {
+                "action": "close_phases",
+                "_selected_action": [self.projectphase.id],
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Ended 1 phases.")
+        self.assertTrue(HoursSnapshot.objects.exists())
+
+        response = self.client.post(
+            reverse("admin:projects_project_changelist"),
+            {
+                "action": "close_projects",
+                "_selected_action": [self.project.id],
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Ended 1 projects and 1 phases.")
+
+    def test_reopened_phase_drops_snapshot(self):
+        self.projectphase.ongoing = False
+        self.projectphase.save()
+        self.assertTrue(HoursSnapshot.objects.exists())
+
+        self.projectphase.ongoing = True
+        self.projectphase.save()
+        self.assertFalse(HoursSnapshot.objects.exists())
+
+    def test_saves_keeping_state_leave_snapshot(self):
+        for ongoing in (True, False):
+            phases = ProjectPhase.objects.filter(id=self.projectphase.id)
+            phases.update(ongoing=ongoing)
+            projectphase = phases.get()
+            projectphase.title = "Renamed"
+            with CaptureQueriesContext(connection) as queries:
+                projectphase.save()
+            self.assertFalse(
+                [query for query in queries if "snapshot" in query["sql"]]
+            )
+
+
+class SnapshotTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project.price_per_hour = 10
+        self.project.client_detail = ClientDetail.objects.create(
+            name="Client", street="", postal_code="", city="", nip=""
+        )
+        self.project.save()
+        self.worker = self.create_workers(1)[0]
+        self.worker.profile.price_per_hour = 5
+        self.worker.profile.save()
+        self.create_datepoints([self.worker], 3)
+        DatePoint.objects.filter(worked_date__day__lte=2).update(
+            approved_manager=True, approved_client=True
+        )
+        rollups.rebuild()
+        closing.close_phases(ProjectPhase.objects.all())
+
+    def test_snapshot_keeps_rates_and_totals(self):
+        snapshot = PhaseSnapshot.objects.get()
+        self.assertEqual(
+            (snapshot.has_client, snapshot.price_per_hour),
+            (True, 10),
+        )
+        self.assertEqual(
+            (snapshot.hours, snapshot.hours_approved, snapshot.amount),
+            (6, 4, 40),
+        )
+        self.assertEqual(
+            list(HoursSnapshot.objects.values_list("price_per_hour")), [(5,)]
+        )
+
+    def test_closed_phase_reads_frozen_rates(self):
+        # Prices and clients changed after the close are not used.
+        self.project.price_per_hour = 20
+        self.project.save()
+        self.project.client.clear()
+        self.worker.profile.price_per_hour = 7
+        self.worker.profile.save()
+
+        context = bills.projectphase_bill_context(self.projectphase)
+        self.assertEqual(context["total"], "40,00")
+        context = bills.project_bill_context(self.project)
+        self.assertEqual(context["total"], "40,00")
+        contexts = bills.period_bill_contexts(
+            datetime.date(2019, 6, 1),
+            datetime.date(2019, 6, 1),
+            Project.objects.all(),
+        )
+        self.assertEqual(contexts[0][1]["total"], "40,00")
+
+        self.assertEqual(
+            list(
+                payroll.payroll_rows(
+                    datetime.date(2019, 1, 1), datetime.date(2019, 12, 1)
+                )
+            ),
+            [("Worker0", "2019-06", self.project.id, "Project", 4, 5, 20)],
+        )
+
+        self.client.force_login(self.worker)
+        response = self.client.get(
+            reverse("worker-summary-month", args=[self.worker.id, 6, 2019])
+        )
+        self.assertEqual(response.context["pay"], 20)
+
+        response = self.client.get(
+            reverse(
+                "projectphase-worker-summary",
+                args=[self.projectphase.id, self.worker.id],
+            )
+        )
+        self.assertEqual(response.context["pay"], 20)
+
+    def test_open_and_closed_phases_are_summed(self):
+        projectphase = ProjectPhase.objects.create(
+            title="Open", project=self.project
+        )
+        task = Task.objects.create(title="Open", project=projectphase)
+        DatePoint.objects.create(
+            task=task,
+            worker=self.worker,
+            title="Work",
+            worked_time=1,
+            worked_date=datetime.date(2019, 6, 10),
+            approved_manager=True,
+            approved_client=True,
+        )
+        self.worker.profile.price_per_hour = 7
+        self.worker.profile.save()
+
+        pk = self.project.id
+        self.assertEqual(
+            list(
+                payroll.payroll_rows(
+                    datetime.date(2019, 1, 1), datetime.date(2019, 12, 1)
+                )
+            ),
+            [
+                ("Worker0", "2019-06", pk, "Project", 4, 5, 20),
+                ("Worker0", "2019-06", pk, "Project", 1, 7, 7),
+            ],
+        )
+        context = bills.project_bill_context(self.project)
+        self.assertEqual(context["total"], "50,00")
+
+    def test_snapshot_cannot_change(self):
+        snapshot = PhaseSnapshot.objects.get()
+        with self.assertRaises(ValueError):
+            snapshot.save()
+
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("No triggers.")
+        for model in (PhaseSnapshot, HoursSnapshot):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                model.objects.update(hours=0)
+
+    def test_verify(self):
+        self.assertEqual(list(snapshots.verify()), [])
+        out = io.StringIO()
+        call_command("verifysnapshots", stdout=out)
+        self.assertIn("match", out.getvalue())
+
+        HoursSnapshot.objects.all().delete()
+        self.assertEqual(
+            list(snapshots.verify([self.projectphase.id])),
+            [
+                f"Phase ({self.projectphase.id}): task {self.task.id}, "
+                f"worker {self.worker.id}, 2019-06 is missing.",
+                f"Phase ({self.projectphase.id}): total hours is 6, "
+                "rows have 0.",
+                f"Phase ({self.projectphase.id}): total hours_approved is 4, "
+                "rows have 0.",
+                f"Phase ({self.projectphase.id}): total amount is 40, "
+                "rows have 0.",
+            ],
+        )
+        with self.assertRaises(CommandError):
+            call_command("verifysnapshots", stdout=io.StringIO())
+
+
+class AdminTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "pass"
+        )
+        self.workers = self.create_workers(2)
+        self.create_datepoints(self.workers, 2)
+
+    def test_query_count_does_not_grow(self):
+        urls = [
+            reverse(f"admin:projects_{name}_changelist")
+            for name in ("datepoint", "task", "projectphase", "project")
+        ]
+        small = [self.count_queries(url, self.admin) for url in urls]
+
+        for i in range(5):
+            manager = self.create_user(f"Manager{i + 2}", "Manager")
+            project = Project.objects.create(
+                title=f"Project {i}", description="", manager=manager
+            )
+            projectphase = ProjectPhase.objects.create(
+                title="Phase", project=project
+            )
+            self.task = Task.objects.create(title="Task", project=projectphase)
+            self.create_datepoints(self.create_workers(2), 3)
+        large = [self.count_queries(url, self.admin) for url in urls]
+
+        self.assertEqual(small, large)
+
+    def test_date_hierarchy_and_filters(self):
+        self.create_datepoints(self.workers[:1], 1, year=2017)
+        self.client.force_login(self.admin)
+        url = reverse("admin:projects_datepoint_changelist")
+
+        response = self.client.get(url)
+        self.assertContains(response, "?worked_date__year=2017")
+        self.assertContains(response, "?worked_date__year=2019")
+        self.assertNotContains(response, "?worked_date__year=2018")
+
+        response = self.client.get(
+            url,
+            {
+                "project": self.project.id,
+                "worker": self.workers[0].id,
+                "approved_manager__exact": 0,
+                "worked_date__year": 2019,
+            },
+        )
+        self.assertEqual(len(response.context["cl"].result_list), 2)
+
+
+class AdminActionsTest(ProjectsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "pass"
+        )
+        self.client.force_login(self.admin)
+        self.worker = self.create_workers(1)[0]
+        self.create_datepoints([self.worker], 2)
+        self.url = reverse("admin:projects_datepoint_changelist")
+
+    def run_action(self, action, pks, url=None, **data):
+        return self.client.post(
+            url or self.url,
+            dict(data, action=action, _selected_action=pks),
+            follow=True,
+        )
+
+    def test_approve_filtered_datepoints(self):
+        pks = list(DatePoint.objects.values_list("id", flat=True))
+        # Selection filtered on the approval changes with the update.
+        response = self.run_action(
+            "approve_approved_manager",
+            pks,
+            url=f"{self.url}?approved_manager__exact=0",
+        )
+        self.assertContains(response, "Approve for manager: changed 2.")
+        self.assertEqual(HoursRollup.objects.get().hours_manager, 4)
+
+        response = self.run_action("approve_approved_manager", pks)
+        self.assertContains(response, "Approve for manager: changed 0.")
+
+        ProjectPhase.objects.update(ongoing=False)
+        response = self.run_action("unapprove_approved_manager", pks)
+        self.assertContains(response, "Unapprove for manager: changed 0.")
+        self.assertEqual(
+            DatePoint.objects.filter(approved_manager=True).count(), 2
+        )
+
+    def test_move_to_task(self):
+        other_task = Task.objects.create(
+            title="Other", project=self.projectphase
+        )
+        pks = list(DatePoint.objects.values_list("id", flat=True))
+
+        response = self.run_action("move_to_task", pks)
+        self.assertTemplateUsed(
+            response, "admin/projects/datepoint/move_to_task.html"
+        )
+
+        response = self.run_action(
+            "move_to_task", pks, apply="Move", task=other_task.id
+        )
+        self.assertContains(response, "Moved 2 datepoints to Other.")
+        self.assertEqual(
+            list(
+                HoursRollup.objects.filter(hours__gt=0).values_list(
+                    "task_id", "hours"
+                )
+            ),
+            [(other_task.id, 4)],
+        )
+
+        other_phase = ProjectPhase.objects.create(
+            title="Other", project=self.project
+        )
+        self.task = Task.objects.create(title="Task", project=other_phase)
+        self.create_datepoints([self.worker], 1)
+        response = self.run_action(
+            "move_to_task",
+            list(DatePoint.objects.values_list("id", flat=True)),
+        )
+        self.assertContains(response, "Select datepoints of a single phase.")
+
+    def test_recompute_hours(self):
+        HoursRollup.objects.update(hours=0)
+        response = self.run_action(
+            "recompute_hours",
+            [self.projectphase.id],
+            url=reverse("admin:projects_projectphase_changelist"),
+        )
+        self.assertContains(
+            response, "Recomputed 1 monthly hours rows of 1 phases."
+        )
+        self.assertEqual(HoursRollup.objects.get().hours, 4)
+
+
+@override_settings(BILL_WORKERS=0)
+class SeedDataTest(TestCase):
+    def test_seed_and_benchmark(self):
+        out = io.StringIO()
+        call_command(
+            "seeddata",
+            clients=1,
+            managers=1,
+            workers=3,
+            projects=2,
+            phases=1,
+            tasks=2,
+            datepoints=50,
+            stdout=out,
+        )
+        self.assertEqual(DatePoint.objects.count(), 50)
+        self.assertEqual(
+            sum(HoursRollup.objects.values_list("hours", flat=True)),
+            sum(DatePoint.objects.values_list("worked_time", flat=True)),
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command(
+                "benchmark",
+                output=output,
+                repeat=1,
+                host="testserver",
+                stdout=out,
+            )
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual(
+            {item["role"] for item in report["results"]},
+            {"Worker", "Manager", "Client"},
+        )
+        names = {item["name"] for item in report["results"]}
+        self.assertIn("project-export", names)
+        self.assertFalse(
+            names & {"datepoints-approve", "projectphase-end", "project-end"}
+        )
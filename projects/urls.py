@@ -1,8 +1,17 @@
 from django.urls import path
 
+from .api import (
+    ApproveDatePointsApi,
+    DatePointApi,
+    DatePointBulkApi,
+    DatePointListApi,
+)
 from .views import (  # TaskDetailView,; WorkerDatePointListView,
-    ApproveDatePointView,
+    ApproveDatePointsView,
+    CalendarEventsView,
     DatePointCreateView,
+    DatePointExportView,
+    DatePointImportView,
     DatePointDetailView,
     DatePointUpdateView,
     ManagerEndProject,
@@ -22,7 +31,10 @@ from .views import (  # TaskDetailView,; WorkerDatePointListView,
     ProjectPhaseCalendarView,
     ProjectPhaseTableDatePointView,
     ProjectPhaseUpdateView,
+    PayrollView,
+    PeriodBillsView,
     ProjectUpdateView,
+    RequestStatsView,
     TaskCreateView,
     TaskUpdateView,
     WorkerProjectPhaseDetail,
@@ -65,6 +77,12 @@ urlpatterns = [
         ProjectPhaseCalendarView.as_view(),
         name="worker-projectphase-calendar",
     ),
+    # Calendar events of the worker within start and end.
+    path(
+        "projects/<int:projectphase_pk>/calendar/<int:worker_pk>/events/",
+        CalendarEventsView.as_view(),
+        name="calendar-events",
+    ),
     path(
         "projectphase/<int:projectphase_pk>/table/<int:worker_pk>/",
         ProjectPhaseWorkerView.as_view(),
@@ -137,11 +155,11 @@ urlpatterns = [
         ProjectPhaseTableDatePointView.as_view(),
         name="datepoint-list",
     ),
-    # Approve DatePoint.
+    # Approve many DatePoints at once.
     path(
-        "datepoint/<int:datepoint_pk>/approve/",
-        ApproveDatePointView.as_view(),
-        name="datepoint-approve",
+        "datepoints/approve/",
+        ApproveDatePointsView.as_view(),
+        name="datepoints-approve",
     ),
     path(
         "worker/projectphase/<int:projectphase_pk>/",
@@ -158,6 +176,8 @@ urlpatterns = [
         ProjectBill.as_view(),
         name="bill-for-project",
     ),
+    # Bills of all projects of the manager for a range of months.
+    path("bills/", PeriodBillsView.as_view(), name="period-bills"),
     path(
         "projectphase/<int:projectphase_pk>/end/",
         ManagerEndProjectPhase.as_view(),
@@ -179,4 +199,53 @@ urlpatterns = [
         {"worker_summary_view": True},
         name="worker-summary-month",
     ),
+    # Export DatePoints as csv.
+    path(
+        "export/project/<int:project_pk>/",
+        DatePointExportView.as_view(),
+        name="project-export",
+    ),
+    path(
+        "export/projectphase/<int:projectphase_pk>/",
+        DatePointExportView.as_view(),
+        name="projectphase-export",
+    ),
+    path(
+        "export/worker/<int:worker_pk>/",
+        DatePointExportView.as_view(),
+        name="worker-export",
+    ),
+    # Import DatePoints from csv or iCalendar timesheets.
+    path(
+        "import/projectphase/<int:projectphase_pk>/",
+        DatePointImportView.as_view(),
+        name="datepoint-import",
+    ),
+    # Payroll of all workers.
+    path("payroll/", PayrollView.as_view(), name="payroll"),
+    path(
+        "payroll/csv/",
+        PayrollView.as_view(),
+        {"csv_view": True},
+        name="payroll-csv",
+    ),
+    # Json api authenticated with tokens.
+    path("api/datepoints/", DatePointListApi.as_view(), name="api-datepoints"),
+    path(
+        "api/datepoints/<int:datepoint_pk>/",
+        DatePointApi.as_view(),
+        name="api-datepoint",
+    ),
+    path(
+        "api/datepoints/bulk/",
+        DatePointBulkApi.as_view(),
+        name="api-datepoints-bulk",
+    ),
+    path(
+        "api/datepoints/approve/",
+        ApproveDatePointsApi.as_view(),
+        name="api-datepoints-approve",
+    ),
+    # Query and timing statistics of recent requests.
+    path("stats/requests/", RequestStatsView.as_view(), name="request-stats"),
 ]
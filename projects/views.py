@@ -1,6 +1,9 @@
 import datetime
+import hashlib
+import io
 import json
 
+from django.conf import settings
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
     PermissionRequiredMixin,
@@ -8,9 +11,12 @@ from django.contrib.auth.mixins import (
 )
 from django.contrib.auth.models import User
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.generic import (
     CreateView,
     DetailView,
@@ -19,20 +25,52 @@ from django.views.generic import (
     View,
 )
 from django.views.generic.edit import FormMixin
-from wkhtmltopdf.views import PDFTemplateView
 
 from .forms import (
+    BulkApproveForm,
+    CalendarRangeForm,
     DatePointCreateForm2,
+    DatePointTableForm,
+    ExportForm,
+    MonthRangeForm,
     ProjectCreateForm,
     QueryDatepointsForm,
+    TimesheetImportForm,
     WorkerMonthForm,
 )
 from .mixins import (
+    ReplicaMixin,
     UserBelongsToProjectMixin,
     UserBelongsToTaskMixin,
     WorkerCanChangeDatePointDetail,
+    url_datepoint,
 )
+from .membership import get_membership
+from . import (
+    approvals,
+    bills,
+    closing,
+    export,
+    feeds,
+    fragments,
+    imports,
+    payroll,
+    rollups,
+    snapshots,
+    tables,
+)
+from .instrumentation import stats
 from .models import DatePoint, Project, ProjectPhase, Task
+from .pivot import jira_grid
+
+
+def month_or_404(year, month):
+    """ Returns first day of the month given by the url, 404 if invalid. """
+
+    try:
+        return datetime.date(int(year), int(month), 1)
+    except ValueError:
+        raise Http404("No such month.")
 
 ###############################################################################
 ###############################################################################
@@ -97,26 +135,15 @@ class MyProjectsListView(
     context_object_name = "projects"
 
     def get_queryset(self):
-        user = get_object_or_404(User, id=self.request.user.id)
+        membership = get_membership(self.request)
 
-        if user.groups.exists():
-            group_name = user.groups.all()[0].name.lower()
-            if group_name == "worker":
-                queryset = Project.objects.filter(worker=user).order_by(
-                    "-ongoing"
-                )
-            elif group_name == "manager":
-                queryset = Project.objects.filter(manager=user).order_by(
-                    "-ongoing"
-                )
-            elif group_name == "client":
-                queryset = Project.objects.filter(client=user).order_by(
-                    "-ongoing"
-                )
-            return queryset
-        else:
+        if membership.role is None:
             raise Http404("Cannot view projects.")
 
+        return Project.objects.filter(id__in=membership.project_ids).order_by(
+            "-ongoing"
+        )
+
     permission_required = "projects.view_project"
 
 
@@ -174,21 +201,29 @@ class ProjectPhaseDetailView(
     model = ProjectPhase
     form_class = QueryDatepointsForm
     pk_url_kwarg = "projectphase_pk"
+    queryset = ProjectPhase.objects.select_related("project")
 
     def get_form_kwargs(self):
         kwargs = super(ProjectPhaseDetailView, self).get_form_kwargs()
 
-        projectphase = ProjectPhase.objects.get(
-            id=self.kwargs["projectphase_pk"]
+        projectphase_pk = self.kwargs["projectphase_pk"]
+        kwargs["dates"] = fragments.cached(
+            projectphase_pk,
+            "months",
+            [],
+            lambda: rollups.month_choices(projectphase_id=projectphase_pk),
         )
-
-        kwargs["dates"] = projectphase.get_dates()
         kwargs["initial"] = datetime.datetime.strftime(
             datetime.datetime.now(), "%Y-%m"
         )
 
         return kwargs
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["role"] = get_membership(self.request).role
+        return context
+
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         form = self.get_form()
@@ -221,75 +256,153 @@ class ProjectPhaseDetailView(
     permission_required = "projects.view_projectphase"
 
 
-class ProjectPhaseTableAllView(ProjectPhaseDetailView):
+class DatePointTableMixin:
+    """ Keyset paginated table of datepoints of the phase.
+
+    Shows all datepoints of the phase, subclasses narrow them down with
+    `get_datepoints`. The table is filtered and ordered by
+    `DatePointTableForm` from query parameters.
+    With the `fragment` parameter only rows of the page are returned as
+    json, which is used to load further pages. """
+
     template_name = "projects/projectphase_detail_table.html"
 
-    def get_context_data(self, **kwargs):
-        # Get context.
-        context = super().get_context_data(**kwargs)
+    def get_datepoints(self):
+        return DatePoint.objects.filter(
+            projectphase_id=self.kwargs["projectphase_pk"]
+        )
 
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"]
-        ).order_by("-worked_date")
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        self.table_form = DatePointTableForm(
+            request.GET, projectphase=self.object
+        )
+        valid = self.table_form.is_valid()
 
-        context["datepoint_list"] = queryset
+        if "fragment" not in request.GET:
+            context = self.get_context_data(object=self.object)
+            return self.render_to_response(context)
 
-        datepoints_pks = [item.pk for item in queryset]
+        if not valid:
+            return JsonResponse({"errors": self.table_form.errors}, status=400)
 
-        context["datepoints_pks"] = json.dumps(datepoints_pks)
+        table = self.get_table()
+        return JsonResponse(
+            {
+                "html": table["rows"],
+                "datepoints": table["datepoints"],
+                "next": table["next_query"],
+            }
+        )
 
-        return context
+    def get_table(self):
+        """ Returns rendered rows of the page, cached per phase and role. """
 
+        role = get_membership(self.request).role
+        query = sorted(
+            (key, value)
+            for key, value in self.request.GET.lists()
+            if key != "fragment"
+        )
 
-class ProjectPhaseTableDatePointView(ProjectPhaseDetailView):
-    template_name = "projects/projectphase_detail_table.html"
+        return fragments.cached(
+            self.object.id,
+            "table",
+            [type(self).__name__, self.kwargs, role, query],
+            lambda: self.render_table(role),
+        )
 
-    def get_context_data(self, **kwargs):
-        # Get context.
-        context = super().get_context_data(**kwargs)
+    def render_table(self, role):
+        # Invalid filters are ignored, only valid ones are in cleaned_data.
+        data = self.table_form.cleaned_data
 
-        worker = get_object_or_404(User, id=self.kwargs["worker_pk"])
+        datepoints, next_cursor = tables.datepoint_page(
+            tables.filter_datepoints(self.get_datepoints(), data),
+            after=data.get("after"),
+            descending=data.get("order") != "asc",
+        )
 
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"],
-            worker=worker,
-            worked_date=self.kwargs["date"],
+        next_query = None
+        if next_cursor is not None:
+            query = self.request.GET.copy()
+            query["after"] = next_cursor
+            query["fragment"] = "1"
+            next_query = query.urlencode()
+
+        client_exists = self.object.project.client.exists()
+        rows = render_to_string(
+            "projects/datepoint_rows.html",
+            {
+                "object": self.object,
+                "role": role,
+                "client_exists": client_exists,
+                "show_task": "task_pk" not in self.kwargs,
+                "datepoint_list": datepoints,
+            },
         )
 
-        context["datepoint_list"] = queryset
+        return {
+            "rows": rows,
+            "datepoints": [item.id for item in datepoints],
+            "next_query": next_query,
+            "client_exists": client_exists,
+        }
 
-        datepoints_pks = [item.pk for item in queryset]
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        table = self.get_table()
 
-        context["datepoints_pks"] = json.dumps(datepoints_pks)
+        context["table_form"] = self.table_form
+        context["show_task"] = "task_pk" not in self.kwargs
+        context["client_exists"] = table["client_exists"]
+        context["rows"] = table["rows"]
+        context["datepoint_ids"] = table["datepoints"]
+        context["datepoints_pks"] = json.dumps(table["datepoints"])
+        context["next_query"] = table["next_query"]
 
         return context
 
 
-class ProjectPhaseWorkerView(ProjectPhaseDetailView):
-    template_name = "projects/projectphase_detail_table.html"
+class ProjectPhaseTableAllView(DatePointTableMixin, ProjectPhaseDetailView):
+    pass
+
+
+class ProjectPhaseTableDatePointView(
+    DatePointTableMixin, ProjectPhaseDetailView
+):
+    def get_datepoints(self):
+        date = self.kwargs["date"]
+        # A range rather than equality, SQLite sorts the page in a temporary
+        # b-tree when equality meets the range of the cursor.
+        return (
+            super()
+            .get_datepoints()
+            .filter(
+                worker_id=self.kwargs["worker_pk"],
+                worked_date__range=(date, date),
+            )
+        )
+
+
+class ProjectPhaseWorkerView(DatePointTableMixin, ProjectPhaseDetailView):
+    def get_datepoints(self):
+        return (
+            super()
+            .get_datepoints()
+            .filter(worker_id=self.kwargs["worker_pk"])
+        )
 
     def get_context_data(self, **kwargs):
         # Get context.
         context = super().get_context_data(**kwargs)
 
         worker = get_object_or_404(User, id=self.kwargs["worker_pk"])
-
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"], worker=worker
-        ).order_by("-worked_date")
-
         context["worker_name"] = worker.username
 
-        context["datepoint_list"] = queryset
-
-        datepoints_pks = [item.pk for item in queryset]
-
-        context["datepoints_pks"] = json.dumps(datepoints_pks)
-
         return context
 
 
-class ProjectPhaseWorkerSummaryView(ProjectPhaseDetailView):
+class ProjectPhaseWorkerSummaryView(ReplicaMixin, ProjectPhaseDetailView):
     template_name = "projects/projectphase_detail_worker_summary.html"
 
     def get_context_data(self, **kwargs):
@@ -298,86 +411,65 @@ class ProjectPhaseWorkerSummaryView(ProjectPhaseDetailView):
 
         worker = get_object_or_404(User, id=self.kwargs["worker_pk"])
 
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"], worker=worker
-        ).order_by("-worked_date")
-
-        tasks = Task.objects.filter(project_id=self.kwargs["projectphase_pk"])
+        def compute():
+            tasks = Task.objects.filter(project=self.object)
 
-        if tasks.exists():
-            client_exists = tasks[0].project.project.client.exists()
+            tasks_dict = {
+                row["task_id"]: row["hours"]
+                for row in snapshots.approved_hours(
+                    ["task_id"], projectphase_id=self.object.id, worker=worker
+                )
+            }
 
-        tasks_dict = {}
-        total_hours = 0
+            services = []
+            total_hours = 0
+            for task in tasks:
+                hours = tasks_dict.get(task.id, 0)
+                services.append({"title": task.title, "hours": hours})
+                total_hours += hours
 
-        for task in tasks:
-            tasks_dict[f"{task.id}"] = 0
+            return services, total_hours
 
-        for datepoint in queryset:
-            if client_exists:
-                if datepoint.approved_manager and datepoint.approved_client:
-                    tasks_dict[f"{datepoint.task.id}"] += datepoint.worked_time
-                    total_hours += datepoint.worked_time
-            else:
-                if datepoint.approved_manager:
-                    tasks_dict[f"{datepoint.task.id}"] += datepoint.worked_time
-                    total_hours += datepoint.worked_time
-
-        services = []
-        for task in tasks:
-            services.append(
-                {"title": task.title, "hours": tasks_dict[f"{task.id}"]}
-            )
+        services, total_hours = fragments.cached(
+            self.object.id, "worker-summary", [worker.id], compute
+        )
 
-        if worker.profile.price_per_hour:
+        price_per_hour = snapshots.worker_rate(self.object, worker)
+        if price_per_hour:
             context["total_hours"] = total_hours
-            context["pay"] = total_hours * worker.profile.price_per_hour
+            context["pay"] = total_hours * price_per_hour
 
         context["services"] = services
 
         return context
 
 
-class ProjectPhaseTaskView(ProjectPhaseDetailView):
-    template_name = "projects/projectphase_detail_table.html"
+class ProjectPhaseTaskView(DatePointTableMixin, ProjectPhaseDetailView):
+    def get_datepoints(self):
+        return super().get_datepoints().filter(task_id=self.kwargs["task_pk"])
 
     def get_context_data(self, **kwargs):
         # Get context.
         context = super().get_context_data(**kwargs)
 
-        task = get_object_or_404(Task, id=self.kwargs["task_pk"])
+        task = get_object_or_404(
+            Task,
+            id=self.kwargs["task_pk"],
+            project_id=self.kwargs["projectphase_pk"],
+        )
         context["task_title"] = task.title
-        queryset = DatePoint.objects.filter(task=task).order_by("-worked_date")
-
-        context["datepoint_list"] = queryset
-
-        datepoints_pks = [item.pk for item in queryset]
-
-        context["datepoints_pks"] = json.dumps(datepoints_pks)
 
         return context
 
 
-class ProjectPhaseTableDateView(ProjectPhaseDetailView):
-    template_name = "projects/projectphase_detail_table.html"
-
-    def get_context_data(self, **kwargs):
-        # Get context.
-        context = super().get_context_data(**kwargs)
-
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"],
-            worked_date__month=self.kwargs["month"],
-            worked_date__year=self.kwargs["year"],
-        ).order_by("-worked_date")
-
-        context["datepoint_list"] = queryset
-
-        datepoints_pks = [item.pk for item in queryset]
-
-        context["datepoints_pks"] = json.dumps(datepoints_pks)
-
-        return context
+class ProjectPhaseTableDateView(DatePointTableMixin, ProjectPhaseDetailView):
+    def get_datepoints(self):
+        month = month_or_404(self.kwargs["year"], self.kwargs["month"])
+        return (
+            super()
+            .get_datepoints()
+            .filter(**rollups.month_range(month.year, month.month))
+        )
 
 
 class ProjectPhaseJiraView(ProjectPhaseDetailView):
@@ -388,94 +480,30 @@ class ProjectPhaseJiraView(ProjectPhaseDetailView):
         # Get context.
         context = super().get_context_data(**kwargs)
 
-        group_name = self.request.user.groups.all()[0].name
-
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"],
-            worked_date__month=self.kwargs["month"],
-            worked_date__year=self.kwargs["year"],
-        ).order_by("-worked_date")
-
-        worked_dates = set()
-        workers = set()
-
-        for item in queryset:
-            worked_dates.add(
-                datetime.datetime.strftime(item.worked_date, "%Y-%m-%d")
+        group_name = get_membership(self.request).role
+        month_or_404(self.kwargs["year"], self.kwargs["month"])
+
+        def compute():
+            client_exists = self.object.project.client.exists()
+            return jira_grid(
+                self.object.id,
+                self.kwargs["month"],
+                self.kwargs["year"],
+                group_name,
+                client_exists,
             )
-            workers.add(item.worker.username)
-
-        worked_dates = sorted(list(worked_dates))
-        workers = sorted(list(workers))
 
-        context["worked_dates"] = [item[8:10] for item in worked_dates]
-
-        client_exists = Project.objects.get(
-            projectphase__id=self.kwargs["projectphase_pk"]
-        ).client.exists()
-
-        workers_list = []
-        td_list_js = []
-
-        i = 0
-        for worker in workers:
-            td_list = []
-            for worked_date in worked_dates:
-                hours = 0
-                queryset = DatePoint.objects.filter(
-                    task__project_id=self.kwargs["projectphase_pk"],
-                    worked_date=worked_date,
-                    worker__username=worker,
-                )
-
-                content = ""
-
-                j_change = []
-                for datepoint in queryset:
-                    hours += datepoint.worked_time
-                    content += f"<a href='{reverse('datepoint-detail', kwargs={'datepoint_pk': datepoint.id})}'>"
-                    content += (
-                        f"<p> {datepoint.title} | {datepoint.worked_time}h "
-                    )
-                    content += "</a>"
-                    if datepoint.approved_manager:
-                        content += f"| M: <span id='approved_manager_{datepoint.id}'>✓</span>"
-                    else:
-                        content += f"| M: <span id='approved_manager_{datepoint.id}'>❌</span>"
-                    if client_exists and datepoint.approved_client:
-                        content += f"| C: <span id='approved_client_{datepoint.id}'>✓</span>"
-                    elif client_exists and not datepoint.approved_client:
-                        content += f"| C: <span id='approved_client_{datepoint.id}'>❌</span>"
-
-                    if group_name == "Manager" and datepoint.approved_manager:
-                        content += f"<button class='btn btn-danger btn-sm ml-1' id='btn_{datepoint.id}'>-</button></p>"
-                    elif (
-                        group_name == "Manager"
-                        and not datepoint.approved_manager
-                    ):
-                        content += f"<button class='btn btn-success btn-sm ml-1' id='btn_{datepoint.id}'>+</button></p>"
-
-                    if group_name == "Client" and datepoint.approved_client:
-                        content += f"<button class='btn btn-danger btn-sm ml-1' id='btn_{datepoint.id}'>-</button></p>"
-                    elif (
-                        group_name == "Client"
-                        and not datepoint.approved_client
-                    ):
-                        content += f"<button class='btn btn-success btn-sm ml-1' id='btn_{datepoint.id}'>+</button></p>"
-
-                    j_change.append(datepoint.id)
-
-                td_list.append({"id": f"td_{i}", "hours": hours})
-                td_list_js.append(
-                    {"id": f"td_{i}", "content": content, "jds": j_change}
-                )
-                i += 1
-
-            workers_list.append({"username": worker, "td": td_list})
+        grid = fragments.cached(
+            self.object.id,
+            "jira",
+            [group_name, self.kwargs["month"], self.kwargs["year"]],
+            compute,
+        )
 
-        context["workers"] = workers
-        context["workers_list"] = workers_list
-        context["td_list_js"] = json.dumps(td_list_js)
+        context["worked_dates"] = grid["worked_dates"]
+        context["workers"] = grid["workers"]
+        context["workers_list"] = grid["workers_list"]
+        context["td_list_js"] = json.dumps(grid["td_list_js"])
 
         return context
 
@@ -487,63 +515,13 @@ class ProjectPhaseCalendarView(ProjectPhaseDetailView):
         # Get context.
         context = super().get_context_data(**kwargs)
 
-        worker = get_object_or_404(User, id=self.kwargs["worker_pk"])
-
-        queryset = DatePoint.objects.filter(
-            task__project_id=self.kwargs["projectphase_pk"], worker=worker
-        ).order_by("-worked_date")
-
-        if self.request.user.groups.all().exists():
-
-            if self.request.user.groups.all()[0].name == "Worker":
-                # Create list of dictionaries that is used to populate calendar events.
-                datepoints = [
-                    {
-                        "title": f"{item.task.title} | {item.worked_time}h",
-                        # "title": item.worker.username,
-                        "start": item.worked_date.strftime("%Y-%m-%d"),
-                        "url": reverse(
-                            "datepoint-detail",
-                            kwargs={"datepoint_pk": item.id},
-                        ),
-                        # "color": tasks_color[item.task.id],
-                    }
-                    for item in queryset
-                ]
-            elif self.request.user.groups.all()[0].name == "Manager":
-
-                datepoints = [
-                    {
-                        "title": f"{item.task.title} | {item.worked_time}h",
-                        # "title": item.worker.username,
-                        "start": item.worked_date.strftime("%Y-%m-%d"),
-                        "url": reverse(
-                            "datepoint-detail",
-                            kwargs={"datepoint_pk": item.id},
-                        ),
-                        "color": "green" if item.approved_manager else "red",
-                    }
-                    for item in queryset
-                ]
-
-            elif self.request.user.groups.all()[0].name == "Client":
-
-                datepoints = [
-                    {
-                        "title": f"{item.task.title} | {item.worked_time}h",
-                        # "title": item.worker.username,
-                        "start": item.worked_date.strftime("%Y-%m-%d"),
-                        "url": reverse(
-                            "datepoint-detail",
-                            kwargs={"datepoint_pk": item.id},
-                        ),
-                        "color": "green" if item.approved_client else "red",
-                    }
-                    for item in queryset
-                ]
-
-        # Create json and add it to context.
-        context["datepoints"] = json.dumps(datepoints)
+        context["events_url"] = reverse(
+            "calendar-events",
+            kwargs={
+                "projectphase_pk": self.kwargs["projectphase_pk"],
+                "worker_pk": self.kwargs["worker_pk"],
+            },
+        )
 
         return context
 
@@ -552,42 +530,93 @@ class WorkerProjectPhaseDetail(ProjectPhaseDetailView):
     template_name = "projects/projectphase_detail_calendar.html"
 
     def test_func(self):
-        if self.request.user.groups.filter(name="Worker").exists():
+        if get_membership(self.request).role == "Worker":
             return super(WorkerProjectPhaseDetail, self).test_func()
         else:
             return False
 
     def get_context_data(self, **kwargs):
-        """ Populate fullcalendar with datepoints. """
+        """ Populate fullcalendar with datepoints of the current worker. """
 
         # Get context.
         context = super().get_context_data(**kwargs)
 
-        # Get DatePoints that belong to current worker.
-        queryset = DatePoint.objects.filter(
-            worker=self.request.user.id,
-            task__project_id=self.kwargs["projectphase_pk"],
+        context["events_url"] = reverse(
+            "calendar-events",
+            kwargs={
+                "projectphase_pk": self.kwargs["projectphase_pk"],
+                "worker_pk": self.request.user.id,
+            },
         )
-
-        # List of datepoints used to populate fullcallendar.
-        datepoints = [
-            {
-                "title": f"{datepoint.task.title} | {datepoint.worked_time}h",
-                "start": datepoint.worked_date.strftime("%Y-%m-%d"),
-                "url": reverse(
-                    "datepoint-detail", kwargs={"datepoint_pk": datepoint.id}
-                ),
-            }
-            for datepoint in queryset
-        ]
-
-        # Create json and add it to the context.
-        context["datepoints"] = json.dumps(datepoints)
         context["calendar_view"] = True
 
         return context
 
 
+class CalendarEventsView(
+    LoginRequiredMixin,
+    PermissionRequiredMixin,
+    UserBelongsToProjectMixin,
+    View,
+):
+    """ Fullcalendar events of the worker in the phase between start and end.
+
+    Responses carry ETag and Last-Modified, so unchanged windows are
+    answered with 304. Workers see only their own datepoints. """
+
+    permission_required = "projects.view_datepoint"
+
+    def test_func(self):
+        if get_membership(self.request).role == "Worker":
+            if self.request.user.id != self.kwargs["worker_pk"]:
+                return False
+        return super(CalendarEventsView, self).test_func()
+
+    def get(self, request, *args, **kwargs):
+        form = CalendarRangeForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        role = get_membership(request).role
+        start = form.cleaned_data["start"]
+        end = form.cleaned_data["end"]
+
+        def compute():
+            queryset = DatePoint.objects.filter(
+                task__project_id=kwargs["projectphase_pk"],
+                worker_id=kwargs["worker_pk"],
+                worked_date__gte=start,
+                worked_date__lt=end,
+            )
+            return feeds.calendar_events(queryset, role)
+
+        events, last_modified = fragments.cached(
+            kwargs["projectphase_pk"],
+            "calendar",
+            [kwargs["worker_pk"], role, start, end],
+            compute,
+        )
+
+        content = json.dumps(events)
+        etag = quote_etag(hashlib.md5(content.encode()).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(content, content_type="application/json")
+
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # Browser has to revalidate, approvals may change any time.
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+
 ###############################################################################
 ###############################################################################
 ###############################################################################
@@ -753,14 +782,23 @@ class DatePointDetailView(
     permission_required = "projects.view_datepoint"
 
     def test_func(self):
-        # If current user is worker check wheter datepoints is his.
-        if self.request.user.groups.filter(name="Worker").exists():
-            return DatePoint.objects.filter(
-                worker=self.request.user, id=self.kwargs["datepoint_pk"]
-            ).exists()
+        # If current user is worker check wheter datepoints is theirs.
+        if get_membership(self.request).role == "Worker":
+            datepoint = url_datepoint(self)
+            return (
+                datepoint is not None
+                and datepoint.worker_id == self.request.user.id
+            )
         else:
             return super(DatePointDetailView, self).test_func()
 
+    def get_object(self, queryset=None):
+        # Loaded by the permission check.
+        datepoint = url_datepoint(self)
+        if datepoint is None:
+            raise Http404("No such datepoint.")
+        return datepoint
+
 
 class DatePointUpdateView(
     LoginRequiredMixin,
@@ -830,33 +868,161 @@ class DatePointListView(
     permission_required = "projects.view_datepoint"
 
 
-class ApproveDatePointView(
+class ApproveDatePointsView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """ Approve or disapprove many datepoints with a single update.
+
+    Manager changes approval of the manager and client approval of the
+    client. Only datepoints of ongoing phases of the user's projects are
+    changed. """
+
+    permission_required = "projects.change_datepoint"
+
+    def post(self, request, *args, **kwargs):
+        membership = get_membership(request)
+
+        field = approvals.approval_field(membership.role)
+        if field is None:
+            return HttpResponse(status=403)
+
+        form = BulkApproveForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        data = form.cleaned_data
+        datepoints_pks = approvals.set_approval(
+            approvals.approvable_datepoints(membership, data),
+            field,
+            data["approve"],
+        )
+
+        return JsonResponse(
+            {"approved": data["approve"], "datepoints": datepoints_pks}
+        )
+
+
+class DatePointExportView(
+    ReplicaMixin,
     LoginRequiredMixin,
     PermissionRequiredMixin,
     UserBelongsToProjectMixin,
     View,
 ):
+    """ Stream datepoints of the project, phase or worker as csv.
 
-    permission_required = "projects.change_datepoint"
+    Can be narrowed down with `worker` and `month` ('Y-m') query parameters.
+    Workers export only their own datepoints. """
 
-    def get(self, *args, **kwargs):
+    permission_required = "projects.view_datepoint"
 
-        user = get_object_or_404(User, id=self.request.user.id)
+    def test_func(self):
+        try:
+            worker_pk = self.kwargs["worker_pk"]
+        except KeyError:
+            return super().test_func()
+        else:
+            return self.request.user.id == worker_pk
 
-        datepoint_pk = kwargs["datepoint_pk"]
-        datepoint = get_object_or_404(DatePoint, id=datepoint_pk)
+    def get(self, request, *args, **kwargs):
+        form = ExportForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
 
-        if user.groups.count() > 0:
-            if user.groups.all()[0].name == "Manager":
-                datepoint.approved_manager = not datepoint.approved_manager
-                datepoint.save()
-                return HttpResponse(datepoint.approved_manager)
-            elif user.groups.all()[0].name == "Client":
-                datepoint.approved_client = not datepoint.approved_client
-                datepoint.save()
-                return HttpResponse(datepoint.approved_client)
+        if "project_pk" in kwargs:
+            name = f"project-{kwargs['project_pk']}"
+            queryset = DatePoint.objects.filter(
+                task__project__project_id=kwargs["project_pk"]
+            )
+        elif "projectphase_pk" in kwargs:
+            name = f"projectphase-{kwargs['projectphase_pk']}"
+            queryset = DatePoint.objects.filter(
+                task__project_id=kwargs["projectphase_pk"]
+            )
+        else:
+            name = f"worker-{kwargs['worker_pk']}"
+            queryset = DatePoint.objects.filter(worker_id=kwargs["worker_pk"])
 
-        return HttpResponse(status=403)
+        if get_membership(request).role == "Worker":
+            queryset = queryset.filter(worker=request.user)
+
+        month = form.cleaned_data["month"]
+        queryset = export.filter_datepoints(
+            queryset, form.cleaned_data["worker"], month
+        )
+        if month:
+            name += f"-{month}"
+
+        return export.csv_response(queryset, f"{name}.csv")
+
+
+class DatePointImportView(
+    LoginRequiredMixin, UserBelongsToProjectMixin, FormMixin, View
+):
+    """ Import datepoints of the phase from an uploaded timesheet.
+
+    Managers import rows of any worker of the project, workers only their
+    own rows. The file is read as a stream, so large files do not have to
+    fit in memory. """
+
+    form_class = TimesheetImportForm
+    template_name = "projects/datepoint_import.html"
+
+    def test_func(self):
+        return super().test_func() and get_membership(self.request).role in (
+            "Manager",
+            "Worker",
+        )
+
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, self.get_context_data())
+
+    def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if not form.is_valid():
+            return render(
+                request, self.template_name, self.get_context_data(form=form)
+            )
+
+        projectphase = get_object_or_404(
+            ProjectPhase.objects.select_related("project"),
+            id=kwargs["projectphase_pk"],
+        )
+        worker = None
+        if get_membership(request).role == "Worker":
+            worker = request.user
+
+        errors = []
+        rejected = 0
+
+        def on_error(number, message, row):
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < settings.IMPORT_ERRORS_SHOWN:
+                errors.append({"line": number, "error": message})
+
+        upload = form.cleaned_data["file"]
+        f = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            created = imports.Importer(projectphase, worker).run(
+                imports.file_rows(f, form.cleaned_data["format"]), on_error
+            )
+        except ValueError as error:
+            form.add_error("file", str(error))
+            return render(
+                request, self.template_name, self.get_context_data(form=form)
+            )
+        finally:
+            f.detach()
+
+        return render(
+            request,
+            self.template_name,
+            self.get_context_data(
+                imported=True,
+                created=created,
+                rejected=rejected,
+                errors=errors,
+            ),
+        )
 
 
 class ManagerEndProjectPhase(
@@ -868,9 +1034,9 @@ class ManagerEndProjectPhase(
 
     permission_required = "projects.change_projectphase"
 
-    def get(self, *args, **kwargs):
+    def post(self, *args, **kwargs):
 
-        user = self.request.user
+        group_name = get_membership(self.request).role
 
         projectphase_pk = kwargs["projectphase_pk"]
         projectphase = get_object_or_404(ProjectPhase, id=projectphase_pk)
@@ -878,11 +1044,11 @@ class ManagerEndProjectPhase(
         if projectphase.ongoing is False:
             raise Http404("Cannot change phase to ongoing.")
 
-        if user.groups.exists():
-            if user.groups.all()[0].name == "Manager":
-                projectphase.ongoing = False
-                projectphase.save()
-                return HttpResponse(f"{projectphase.title} has ended.")
+        if group_name == "Manager":
+            closing.close_phases(
+                ProjectPhase.objects.filter(id=projectphase.id)
+            )
+            return HttpResponse(f"{projectphase.title} has ended.")
         return HttpResponse(status=403)
 
 
@@ -895,9 +1061,9 @@ class ManagerEndProject(
 
     permission_required = "projects.change_project"
 
-    def get(self, *args, **kwargs):
+    def post(self, *args, **kwargs):
 
-        user = self.request.user
+        group_name = get_membership(self.request).role
 
         project_pk = kwargs["project_pk"]
         project = get_object_or_404(Project, id=project_pk)
@@ -905,15 +1071,10 @@ class ManagerEndProject(
         if project.ongoing is False:
             raise Http404("Cannot change phase to ongoing.")
 
-        if user.groups.count() > 0:
-            if user.groups.all()[0].name == "Manager":
-                for phase in project.projectphase_set.all():
-                    phase.ongoing = False
-                    phase.save()
-
-                project.ongoing = False
-                project.save()
-                return HttpResponse(f"{project.title} has ended.")
+        if group_name == "Manager":
+            closing.close_projects(Project.objects.filter(id=project.id))
+            return HttpResponse(f"{project.title} has ended.")
+        return HttpResponse(status=403)
 
 
 # class WorkerDatePointListView(
@@ -966,157 +1127,103 @@ def home(request):
 
 
 class ProjectPhaseBill(
+    ReplicaMixin,
     LoginRequiredMixin,
     PermissionRequiredMixin,
     UserBelongsToProjectMixin,
-    PDFTemplateView,
+    View,
 ):
+    """ Download bill of the phase, rendered in the background. """
+
     permission_required = "projects.view_projectphase"
-    filename = "bill.pdf"
-    template_name = "projects/bill.html"
 
     def test_func(self):
-        if self.request.user.groups.filter(
-            name="Manager"
-        ) or self.request.user.groups.filter(name="Client"):
+        if get_membership(self.request).role in ("Manager", "Client"):
             return super(ProjectPhaseBill, self).test_func()
         else:
             return False
 
-    def get_context_data(self, **kwargs):
-        context = super(ProjectPhaseBill, self).get_context_data(**kwargs)
-
+    def get(self, request, *args, **kwargs):
         projectphase = get_object_or_404(
             ProjectPhase, id=self.kwargs["projectphase_pk"]
         )
-        price_per_hour = projectphase.project.price_per_hour
-
-        client_detail = {
-            "name": projectphase.project.client_detail.name,
-            "street": projectphase.project.client_detail.street,
-            "postal_code": projectphase.project.client_detail.postal_code,
-            "city": projectphase.project.client_detail.city,
-            "nip": projectphase.project.client_detail.nip,
-        }
+        job = bills.request_bill(projectphase=projectphase)
 
-        context["client_detail"] = client_detail
-
-        if price_per_hour is None:
-            raise Http404(
-                "Price is not set, please contact the administrator."
-            )
-
-        tasks = Task.objects.filter(project_id=self.kwargs["projectphase_pk"])
-
-        services = []
-        total_hours = 0
-
-        for task in tasks:
-            datepoints = DatePoint.objects.filter(task=task)
-
-            hours = 0
-            for datepoint in datepoints:
-                if datepoint.approved_client and datepoint.approved_manager:
-                    hours += datepoint.worked_time
-                    total_hours += datepoint.worked_time
-
-            service = {
-                "title": task.title,
-                "count": hours,
-                "price": f"{price_per_hour:.2f}".replace(".", ","),
-                "brutto": f"{price_per_hour * hours:.2f}".replace(".", ","),
-                "netto": f"{price_per_hour * hours:.2f}".replace(".", ","),
-            }
-
-            if hours != 0:
-                services.append(service)
-
-        context["services"] = services
-
-        total = 0
-        total = total_hours * price_per_hour
-        context["total"] = f"{total:.2f}".replace(".", ",")
-        context["data"] = datetime.datetime.today()
-
-        return context
+        return bills.bill_response(request, job)
 
 
 class ProjectBill(
+    ReplicaMixin,
     LoginRequiredMixin,
     PermissionRequiredMixin,
     UserBelongsToProjectMixin,
-    PDFTemplateView,
+    View,
 ):
+    """ Download bill of the project, rendered in the background. """
+
     permission_required = "projects.view_projectphase"
-    filename = "bill.pdf"
-    template_name = "projects/bill.html"
 
     def test_func(self):
-        if self.request.user.groups.filter(
-            name="Manager"
-        ) or self.request.user.groups.filter(name="Client"):
+        if get_membership(self.request).role in ("Manager", "Client"):
             return super(ProjectBill, self).test_func()
         else:
             return False
 
-    def get_context_data(self, **kwargs):
-        context = super(ProjectBill, self).get_context_data(**kwargs)
-
+    def get(self, request, *args, **kwargs):
         project = get_object_or_404(Project, id=self.kwargs["project_pk"])
-        price_per_hour = project.price_per_hour
-
-        client_detail = {
-            "name": project.client_detail.name,
-            "street": project.client_detail.street,
-            "postal_code": project.client_detail.postal_code,
-            "city": project.client_detail.city,
-            "nip": project.client_detail.nip,
-        }
+        job = bills.request_bill(project=project)
 
-        context["client_detail"] = client_detail
+        return bills.bill_response(request, job)
 
-        if price_per_hour is None:
-            raise Http404(
-                "Price is not set, please contact the administrator."
-            )
-
-        projectphases = project.projectphase_set.all()
-
-        services = []
-        total_hours = 0
 
-        for projectphase in projectphases:
-            queryset = DatePoint.objects.filter(task__project=projectphase)
-
-            hours = 0
+class PeriodBillsView(
+    ReplicaMixin, LoginRequiredMixin, PermissionRequiredMixin, View
+):
+    """ Download ZIP with bills of the manager's projects for the months.
 
-            for datepoint in queryset:
-                if datepoint.approved_client and datepoint.approved_manager:
-                    hours += datepoint.worked_time
-                    total_hours += datepoint.worked_time
+    Without `start` and `end` ('Y-m') parameters the form is shown. """
 
-            service = {
-                "title": projectphase.title,
-                "count": hours,
-                "price": f"{price_per_hour:.2f}".replace(".", ","),
-                "brutto": f"{price_per_hour * hours:.2f}".replace(".", ","),
-                "netto": f"{price_per_hour * hours:.2f}".replace(".", ","),
-            }
+    permission_required = "projects.view_projectphase"
 
-            if hours != 0:
-                services.append(service)
+    def get(self, request, *args, **kwargs):
+        membership = get_membership(request)
+        if membership.role != "Manager":
+            return HttpResponse(status=403)
+
+        if not request.GET:
+            return render(
+                request,
+                "projects/period_bills.html",
+                context={"form": MonthRangeForm()},
+            )
 
-        context["services"] = services
+        form = MonthRangeForm(request.GET)
+        if not form.is_valid():
+            return render(
+                request, "projects/period_bills.html", context={"form": form}
+            )
 
-        total = total_hours * price_per_hour
-        context["total"] = f"{total:.2f}".replace(".", ",")
-        context["data"] = datetime.datetime.today()
+        start = form.cleaned_data["start"]
+        end = form.cleaned_data["end"]
+        archive, count, errors = bills.period_bills(
+            start,
+            end,
+            Project.objects.filter(id__in=membership.project_ids),
+        )
 
-        return context
+        response = HttpResponse(archive, content_type="application/zip")
+        response["Content-Disposition"] = (
+            f'attachment; filename="bills-{start:%Y-%m}-{end:%Y-%m}.zip"'
+        )
+        return response
 
 
 class WorkerSummaryView(
-    LoginRequiredMixin, UserPassesTestMixin, FormMixin, DetailView
+    ReplicaMixin,
+    LoginRequiredMixin,
+    UserPassesTestMixin,
+    FormMixin,
+    DetailView,
 ):
     model = User
     pk_url_kwarg = "worker_pk"
@@ -1124,16 +1231,17 @@ class WorkerSummaryView(
     template_name = "projects/user_detail.html"
 
     def test_func(self):
-        return self.request.user == User.objects.get(
-            id=self.kwargs["worker_pk"]
-        )
+        return self.request.user.id == self.kwargs["worker_pk"]
+
+    def get_queryset(self):
+        return User.objects.select_related("profile")
 
     def get_form_kwargs(self):
         kwargs = super(WorkerSummaryView, self).get_form_kwargs()
 
-        worker = User.objects.get(id=self.kwargs["worker_pk"])
-
-        kwargs["dates"] = worker.profile.get_dates()
+        kwargs["dates"] = rollups.month_choices(
+            worker_id=self.kwargs["worker_pk"]
+        )
 
         return kwargs
 
@@ -1148,62 +1256,48 @@ class WorkerSummaryView(
         except KeyError:
             pass
         else:
-            worker = get_object_or_404(User, id=self.kwargs["worker_pk"])
+            worker = self.object
             month = self.kwargs["month"]
             year = self.kwargs["year"]
-            queryset = DatePoint.objects.filter(
-                worker=worker, worked_date__month=month, worked_date__year=year
-            ).order_by("-worked_date")
             worker_summary_view = True
             context["worker_summary_view"] = True
 
         if worker_summary_view:
-            projects = Project.objects.filter(worker=worker)
-
-            projects_dict = {}
-            total_hours = 0
-
-            for project in projects:
-                projects_dict[f"{project.id}"] = 0
-
-            for project in projects:
-                for phase in project.projectphase_set.all():
-                    queryset = DatePoint.objects.filter(
-                        task__project=phase,
-                        worker=worker,
-                        worked_date__month=month,
-                        worked_date__year=year,
-                    )
-
-                    for datepoint in queryset:
-                        if datepoint.task.project.project.client.exists():
-                            if (
-                                datepoint.approved_manager
-                                and datepoint.approved_client
-                            ):
-                                projects_dict[
-                                    f"{datepoint.task.project.project.id}"
-                                ] += datepoint.worked_time
-                                total_hours += datepoint.worked_time
-                        else:
-                            if datepoint.approved_manager:
-                                projects_dict[
-                                    f"{datepoint.task.project.project.id}"
-                                ] += datepoint.worked_time
-                                total_hours += datepoint.worked_time
-
-            services = []
-            for project in projects:
-                services.append(
-                    {
-                        "title": project.title,
-                        "hours": projects_dict[f"{project.id}"],
-                    }
+            # Hours of projects the worker is assigned to, closed phases are
+            # paid with the price frozen in their snapshots.
+            hours_dict = {}
+            pay = 0
+            for row in snapshots.approved_hours(
+                ["projectphase__project_id"],
+                worker=worker,
+                month=month_or_404(year, month),
+                projectphase__project__worker=worker,
+            ):
+                project_id = row["projectphase__project_id"]
+                hours_dict[project_id] = (
+                    hours_dict.get(project_id, 0) + row["hours"]
                 )
+                if not row["hours"]:
+                    continue
+                if row["rate"] is None or pay is None:
+                    pay = None
+                else:
+                    pay += row["hours"] * row["rate"]
 
-            if worker.profile.price_per_hour:
+            services = []
+            total_hours = 0
+            for project in Project.objects.filter(worker=worker).order_by(
+                "id"
+            ):
+                hours = hours_dict.get(project.id, 0)
+                services.append({"title": project.title, "hours": hours})
+                total_hours += hours
+
+            if pay is not None and (
+                total_hours or worker.profile.price_per_hour
+            ):
                 context["total_hours"] = total_hours
-                context["pay"] = total_hours * worker.profile.price_per_hour
+                context["pay"] = pay
 
             context["services"] = services
 
@@ -1223,3 +1317,55 @@ class WorkerSummaryView(
                 },
             )
             return redirect(tmp_url)
+
+
+class PayrollView(ReplicaMixin, LoginRequiredMixin, UserPassesTestMixin, View):
+    """ Approved hours and pay of all workers per month and project.
+
+    Months are selected with `start` and `end` ('Y-m') parameters and
+    default to the year to date. """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        today = datetime.date.today()
+        form = MonthRangeForm(
+            request.GET
+            or {"start": f"{today:%Y}-01", "end": f"{today:%Y-%m}"}
+        )
+        if not form.is_valid():
+            return render(
+                request, "projects/payroll.html", context={"form": form}
+            )
+
+        start = form.cleaned_data["start"]
+        end = form.cleaned_data["end"]
+        rows = payroll.payroll_rows(start, end)
+
+        if kwargs.get("csv_view"):
+            return export.stream_csv(
+                payroll.HEADER,
+                rows,
+                f"payroll-{start:%Y-%m}-{end:%Y-%m}.csv",
+            )
+
+        return render(
+            request,
+            "projects/payroll.html",
+            context={
+                "form": form,
+                "workers": payroll.payroll_matrix(rows),
+                "query": f"start={start:%Y-%m}&end={end:%Y-%m}",
+            },
+        )
+
+
+class RequestStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """ Percentiles of queries and timings of recent requests per url. """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(stats.report())
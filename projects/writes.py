@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import (
+    ENDED_MESSAGE,
+    DatePoint,
+    PhaseEndedError,
+    check_ongoing,
+    month_start,
+    rollup_key,
+)
+
+# Fields which decide the rollup row a datepoint is summed under.
+ROLLUP_FIELDS = {"task", "task_id", "worker", "worker_id", "worked_date"}
+
+
+@contextmanager
+def phase_ended_errors():
+    """ Raise PhaseEndedError for datepoints refused by the database.
+
+    Triggers of migration 0006 refuse datepoints of ended phases, also when
+    a phase ends between the check and the write.
+    """
+
+    try:
+        yield
+    except IntegrityError as error:
+        if ENDED_MESSAGE in str(error):
+            raise PhaseEndedError(ENDED_MESSAGE) from error
+        raise
+
+
+def save(datepoint):
+    """ Save a single datepoint, its rollup is refreshed by the signal. """
+
+    with phase_ended_errors(), transaction.atomic():
+        datepoint.save()
+
+
+def create(datepoints, refresh=True):
+    """ Insert datepoints with bulk_create, returns their number.
+
+    Phases of all the datepoints are checked with one query. Signals are
+    not sent, so rollups are refreshed here unless `refresh` is False.
+    """
+
+    datepoints = list(datepoints)
+    check_ongoing(datepoint.task_id for datepoint in datepoints)
+
+    with phase_ended_errors(), transaction.atomic():
+        DatePoint.objects.bulk_create(
+            datepoints, batch_size=rollups.BATCH_SIZE
+        )
+        if refresh:
+            rollups.refresh({rollup_key(item) for item in datepoints})
+
+    return len(datepoints)
+
+
+def filtered_fields(where):
+    """ Yields names of fields the WHERE clause of a query filters on. """
+
+    for child in where.children:
+        if hasattr(child, "children"):
+            yield from filtered_fields(child)
+        else:
+            target = getattr(getattr(child, "lhs", None), "target", None)
+            if target is not None:
+                yield target.name
+
+
+def update(queryset, **values):
+    """ Update datepoints of ongoing phases with a single UPDATE.
+
+    Phase is checked by the WHERE clause of the UPDATE, datepoints of ended
+    phases are left unchanged. Returns ids of the updated datepoints.
+    """
+
+    queryset = queryset.filter(task__project__ongoing=True)
+    # Set date_created like auto_now does on save, so calendar feeds report
+    # the change in Last-Modified.
+    values.setdefault("date_created", timezone.now())
+
+    # Datepoints filtered on the updated fields, e.g. approvals of only
+    # unapproved ones, may not match the queryset after the update.
+    unchanged = ROLLUP_FIELDS.isdisjoint(values) and set(
+        filtered_fields(queryset.query.where)
+    ).isdisjoint(values)
+
+    with phase_ended_errors(), transaction.atomic():
+        if unchanged:
+            # Update comes first, so the transaction takes the write lock at
+            # once. SQLite fails a transaction which read before writing
+            # when another one wrote in between, instead of waiting.
+            queryset.update(**values)
+            datepoints_pks = list(queryset.values_list("id", flat=True))
+            rollups.refresh_datepoints(queryset)
+        else:
+            datepoints_pks = list(queryset.values_list("id", flat=True))
+            keys = rollups.datepoint_keys(queryset)
+            queryset.update(**values)
+            rollups.refresh(
+                keys + [moved_key(key, values) for key in keys]
+            )
+
+    return datepoints_pks
+
+
+def moved_key(key, values):
+    """ Returns rollup key of datepoints of the key after the update. """
+
+    task_id, worker_id, month = key
+    for name in ("task", "task_id"):
+        if name in values:
+            task_id = getattr(values[name], "pk", values[name])
+    for name in ("worker", "worker_id"):
+        if name in values:
+            worker_id = getattr(values[name], "pk", values[name])
+    if "worked_date" in values:
+        month = month_start(values["worked_date"])
+    return task_id, worker_id, month
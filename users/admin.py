@@ -1,7 +1,7 @@
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User, Group
 from django.contrib import admin
-from .models import Profile
+from .models import ApiToken, Profile
 
 
 UserAdmin.add_fieldsets = (
@@ -24,6 +24,20 @@ class ProfileAdmin(admin.ModelAdmin):
         return queryset.filter(user__groups__name="Worker")
 
 
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    """ Tokens are created with the `createapitoken` command, since only
+    digests of their keys are stored. """
+
+    list_display = ("user", "name", "date_created")
+    list_select_related = ("user",)
+    fields = ("user", "name", "date_created")
+    readonly_fields = ("user", "date_created")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 admin.site.unregister(Group)
@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates token of the user for the json api and prints its key. "
+        "The key is not stored and cannot be shown again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--name", default="", help="What it is used for.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist.")
+
+        self.stdout.write(ApiToken.create(user, options["name"]))
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile',
+            name='dates',
+        ),
+    ]
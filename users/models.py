@@ -1,4 +1,5 @@
-import json
+import hashlib
+import secrets
 
 from django.db import models
 from django.contrib.auth.models import User
@@ -8,11 +9,34 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     price_per_hour = models.PositiveIntegerField(null=True)
 
-    # Dates in format '[("m-Y", "m-Y"), ("m-Y", "m-Y")]'
-    dates = models.TextField(default="[]")
 
-    def set_dates(self, dates):
-        self.dates = json.dumps(dates)
+class ApiToken(models.Model):
+    """ Token authenticating requests to the json api.
 
-    def get_dates(self):
-        return json.loads(self.dates)
+    Only sha256 digest of the key is stored, the key is shown once when the
+    token is created. """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    # Sha256 hex digest of the key.
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+
+    # What the token is used for.
+    name = models.CharField(max_length=100, blank=True)
+
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def hash(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def create(cls, user, name=""):
+        """ Create token of the user and return its key. """
+
+        key = secrets.token_hex(20)
+        cls.objects.create(user=user, digest=cls.hash(key), name=name)
+        return key
+
+    def __str__(self):
+        return f"{self.user}, {self.name}"